@@ -0,0 +1,152 @@
+"""Measure the scanner, parser and resolver phases separately
+
+Each phase is timed on its own, then run again under tracemalloc to
+record its peak memory, since tracing slows everything down.
+
+Usage
+-----
+python3 benchmarks/bench_frontend.py [--scanner {char,regex,compact}]
+                                     [--scale N] [--lazy] [--json] [file.lox]
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import lox  # noqa: E402  (resolves the scanner <-> lox import cycle)
+import expr  # noqa: E402
+import parser  # noqa: E402
+import stmt  # noqa: E402
+from generate import ProgramGenerator  # noqa: E402
+from resolver import Resolver  # noqa: E402
+
+
+def count_nodes(statements):
+    """Count every Expr and Stmt node reachable from a statement list"""
+    count = 0
+    stack = list(statements)
+    while stack:
+        item = stack.pop()
+        if isinstance(item, list):
+            stack.extend(item)
+        elif isinstance(item, (expr.Expr, stmt.Stmt)):
+            count += 1
+            names = getattr(item, "__slots__", None) or vars(item)
+            stack.extend(getattr(item, name) for name in names)
+    return count
+
+
+def scan(source, scanner_cls):
+    return scanner_cls(source).scan_tokens()
+
+
+def parse(tokens, lazy):
+    return parser.Parser(tokens, lazy).parse()
+
+
+def resolve(statements):
+    Resolver().resolve(statements)
+
+
+def measure(phase, *args):
+    """Time one phase, then rerun it under tracemalloc for its peak
+
+    :return: (result, seconds, peak bytes)
+    """
+    start = time.perf_counter()
+    result = phase(*args)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    phase(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def run(source, scanner_name, lazy=False):
+    megabytes = len(source.encode("utf-8")) / 2**20
+    tokens, scan_time, scan_peak = measure(
+        scan, source, lox.Lox.scanners[scanner_name])
+    statements, parse_time, parse_peak = measure(parse, tokens, lazy)
+    if lox.Lox.had_error:
+        sys.exit("benchmark program has errors")
+    _, resolve_time, resolve_peak = measure(resolve, statements)
+    nodes = count_nodes(statements)
+
+    return {
+        "python": platform.python_version(),
+        "scanner": scanner_name,
+        "lazy": lazy,
+        "source": {"bytes": len(source.encode("utf-8")),
+                   "lines": source.count("\n"),
+                   "tokens": len(tokens),
+                   "nodes": nodes},
+        "phases": {
+            "scan": {"seconds": scan_time,
+                     "tokens_per_sec": len(tokens) / scan_time,
+                     "mb_per_sec": megabytes / scan_time,
+                     "peak_bytes": scan_peak},
+            "parse": {"seconds": parse_time,
+                      "tokens_per_sec": len(tokens) / parse_time,
+                      "nodes_per_sec": nodes / parse_time,
+                      "mb_per_sec": megabytes / parse_time,
+                      "peak_bytes": parse_peak},
+            "resolve": {"seconds": resolve_time,
+                        "nodes_per_sec": nodes / resolve_time,
+                        "mb_per_sec": megabytes / resolve_time,
+                        "peak_bytes": resolve_peak},
+        },
+    }
+
+
+def report(results):
+    source = results["source"]
+    print(f"{source['bytes'] / 2**20:.2f} MB, {source['lines']} lines, "
+          f"{source['tokens']} tokens, {source['nodes']} nodes "
+          f"({results['scanner']} scanner{', lazy' if results['lazy'] else ''})")
+    for name, phase in results["phases"].items():
+        rate = phase.get("nodes_per_sec", phase.get("tokens_per_sec"))
+        unit = "nodes/s" if "nodes_per_sec" in phase else "tokens/s"
+        print(f"{name:>8}: {phase['seconds']:7.3f}s {rate:11.0f} {unit:<8} "
+              f"{phase['mb_per_sec']:6.2f} MB/s "
+              f"peak {phase['peak_bytes'] / 2**20:7.1f} MB")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("file", nargs="?",
+                            help="Lox file to measure instead of a generated one")
+    arg_parser.add_argument("--scanner", choices=lox.Lox.scanners,
+                            default="char")
+    arg_parser.add_argument("--scale", type=int, default=1,
+                            help="multiplier for the generated program size")
+    arg_parser.add_argument("--lazy", action="store_true",
+                            help="only brace-match function bodies")
+    arg_parser.add_argument("--json", action="store_true",
+                            help="print machine-readable results")
+    options = arg_parser.parse_args()
+
+    if options.file:
+        with open(options.file, encoding="utf-8") as f:
+            source = f.read()
+    else:
+        source = ProgramGenerator(functions=1000 * options.scale,
+                                  classes=200 * options.scale).generate()
+
+    results = run(source, options.scanner, options.lazy)
+    if options.json:
+        print(json.dumps(results, indent=2))
+    else:
+        report(results)
+
+
+if __name__ == "__main__":
+    main()
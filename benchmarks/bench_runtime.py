@@ -0,0 +1,104 @@
+"""Time the interpreter on the programs in benchmarks/programs
+
+Only execution is timed; every program is scanned, parsed and resolved
+beforehand, and optimized too with --optimize. --engine picks the
+execution engine, as it does for lox.py. Each program is compiled again
+for every repeat so it starts from fresh globals, and the best time is
+reported.
+
+Usage
+-----
+python3 benchmarks/bench_runtime.py [--repeat N] [--optimize] [--engine E] [--json] [program.lox ...]
+"""
+
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import platform
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROGRAMS = os.path.join(ROOT, "benchmarks", "programs")
+sys.path.insert(0, ROOT)
+
+import lox  # noqa: E402  (resolves the scanner <-> lox import cycle)
+from hoister import Hoister  # noqa: E402
+from inliner import Inliner  # noqa: E402
+from optimizer import Optimizer  # noqa: E402
+from typeinference import TypeInference  # noqa: E402
+
+
+def run_once(source, optimize, engine):
+    """Compile a program with a fresh interpreter and time running it
+
+    :return: (seconds, printed output)
+    """
+    lox.Lox.interpreter = lox.Lox.engines[engine]()
+    statements = lox.Lox.compile(source)
+    if statements is None:
+        sys.exit("benchmark program has errors")
+    if optimize:
+        statements = Optimizer().optimize(statements)
+        Inliner(lox.Lox.inline_threshold).inline(statements)
+        Hoister().hoist(statements)
+        TypeInference().infer(statements)
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        start = time.perf_counter()
+        lox.Lox.interpreter.interpret(statements)
+        elapsed = time.perf_counter() - start
+    return elapsed, output.getvalue()
+
+
+def run(paths, repeat, optimize, engine):
+    results = {"python": platform.python_version(), "optimize": optimize,
+               "engine": engine, "programs": {}}
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            source = f.read()
+        times = []
+        for _ in range(repeat):
+            elapsed, output = run_once(source, optimize, engine)
+            times.append(elapsed)
+        results["programs"][os.path.basename(path)] = {
+            "best_seconds": min(times),
+            "seconds": times,
+            "output": output.split(),
+        }
+    return results
+
+
+def report(results):
+    for name, program in results["programs"].items():
+        print(f"{name:>14}: {program['best_seconds']:7.3f}s  "
+              f"-> {' '.join(program['output'])}")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("programs", nargs="*",
+                            help="Lox files to run instead of the bundled ones")
+    arg_parser.add_argument("--repeat", type=int, default=3,
+                            help="number of runs per program")
+    arg_parser.add_argument("--optimize", action="store_true",
+                            help="run the optimizer before timing")
+    arg_parser.add_argument("--engine", choices=lox.Lox.engines, default="tree",
+                            help="execution engine to time")
+    arg_parser.add_argument("--json", action="store_true",
+                            help="print machine-readable results")
+    options = arg_parser.parse_args()
+
+    paths = options.programs or sorted(glob.glob(os.path.join(PROGRAMS, "*.lox")))
+    results = run(paths, options.repeat, options.optimize, options.engine)
+    if options.json:
+        print(json.dumps(results, indent=2))
+    else:
+        report(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Compare scanning throughput of Scanner and RegexScanner
+
+Usage
+-----
+python3 benchmarks/bench_scanner.py [megabytes]
+"""
+
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import lox  # noqa: E402  (resolves the scanner <-> lox import cycle)
+from regexscanner import RegexScanner  # noqa: E402
+from scanner import Scanner  # noqa: E402
+
+
+def build_source(megabytes):
+    """Repeat the sample programs in tests/ until we reach the
+    requested size
+    """
+    tests = os.path.join(ROOT, "tests")
+    samples = []
+    for name in sorted(os.listdir(tests)):
+        if name.endswith(".lox"):
+            with open(os.path.join(tests, name), encoding="utf-8") as f:
+                samples.append(f.read())
+    chunk = "\n".join(samples) + "\n"
+    return chunk * (megabytes * 1024 * 1024 // len(chunk) + 1)
+
+
+def measure(scanner_cls, source):
+    start = time.perf_counter()
+    tokens = scanner_cls(source).scan_tokens()
+    return tokens, time.perf_counter() - start
+
+
+def main():
+    megabytes = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    source = build_source(megabytes)
+    size = len(source.encode("utf-8")) / (1024 * 1024)
+
+    results = {}
+    for scanner_cls in (Scanner, RegexScanner):
+        tokens, elapsed = measure(scanner_cls, source)
+        results[scanner_cls.__name__] = tokens
+        print(f"{scanner_cls.__name__:>12}: {len(tokens):>9} tokens "
+              f"{elapsed:7.3f}s {size / elapsed:7.2f} MB/s "
+              f"{len(tokens) / elapsed:11.0f} tokens/s")
+
+    expected = [(t.tokentype, t.lexeme, t.line) for t in results["Scanner"]]
+    actual = [(t.tokentype, t.lexeme, t.line) for t in results["RegexScanner"]]
+    if expected != actual:
+        print("token streams differ")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
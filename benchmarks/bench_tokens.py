@@ -0,0 +1,56 @@
+"""Compare the memory held by a scan_tokens() list with a TokenArray
+
+Usage
+-----
+python3 benchmarks/bench_tokens.py [megabytes]
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import lox  # noqa: E402  (resolves the scanner <-> lox import cycle)
+import parser  # noqa: E402
+from bench_scanner import build_source  # noqa: E402
+from compactscanner import CompactScanner  # noqa: E402
+from scanner import Scanner  # noqa: E402
+
+
+def measure(scanner_cls, source):
+    """Scan and parse the source, reporting the memory still held by
+    the tokens once scanning is done and the time taken to parse them
+    """
+    tracemalloc.start()
+    tokens = scanner_cls(source).scan_tokens()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    parser.Parser(tokens).parse()
+    elapsed = time.perf_counter() - start
+    return len(tokens), retained, peak, elapsed
+
+
+def main():
+    megabytes = int(sys.argv[1]) if len(sys.argv) > 1 else 2
+    source = build_source(megabytes)
+
+    results = {}
+    for scanner_cls in (Scanner, CompactScanner):
+        count, retained, peak, elapsed = measure(scanner_cls, source)
+        results[scanner_cls.__name__] = retained
+        print(f"{scanner_cls.__name__:>14}: {count:>9} tokens "
+              f"retained {retained / 2**20:8.1f} MB "
+              f"peak {peak / 2**20:8.1f} MB "
+              f"({retained / count:6.1f} B/token) "
+              f"parse {elapsed:6.2f}s")
+    print(f"{'reduction':>14}: "
+          f"{results['Scanner'] / results['CompactScanner']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Deterministic generator for large Lox programs
+
+Usage
+-----
+python3 benchmarks/generate.py [--functions N] [--classes N] [--depth N]
+                               [--chain N] [--seed N] > program.lox
+"""
+
+import argparse
+import random
+
+
+class ProgramGenerator:
+    """Builds a syntactically valid, resolvable Lox program out of
+    functions, classes, deeply nested blocks and long expression
+    chains. The same settings always produce the same program.
+    """
+
+    operators = ["+", "-", "*", "<", "<=", ">", ">=", "==", "!="]
+
+    def __init__(self, functions=1000, classes=200, depth=20, chain=50, seed=0):
+        self.functions = functions
+        self.classes = classes
+        self.depth = depth
+        self.chain = chain
+        self.random = random.Random(seed)
+        self.lines = []
+
+    def generate(self):
+        """Return the program source
+
+        :return: str
+        """
+        self.lines = ["var counter = 0;", 'var label = "lox";']
+        for i in range(self.functions):
+            self.function(i)
+        for i in range(self.classes):
+            self.klass(i)
+        self.nested(self.depth)
+        return "\n".join(self.lines) + "\n"
+
+    def emit(self, indent, line):
+        self.lines.append("  " * indent + line)
+
+    def expression(self, names, length):
+        """Left-to-right chain of binary operators over the given
+        names and number literals
+        """
+        rand = self.random
+        terms = []
+        for _ in range(length):
+            if rand.random() < 0.5:
+                terms.append(rand.choice(names))
+            else:
+                terms.append(str(rand.randint(0, 1000)))
+        out = terms[0]
+        for term in terms[1:]:
+            out += f" {rand.choice(self.operators[:3])} {term}"
+        return out
+
+    def condition(self, names):
+        rand = self.random
+        return f"{rand.choice(names)} {rand.choice(self.operators[3:])} {rand.randint(0, 100)}"
+
+    def function(self, i):
+        params = ["a", "b", "c"][: 1 + i % 3]
+        names = params + ["counter"]
+        self.emit(0, f"fun f{i}({', '.join(params)}) {{")
+        self.emit(1, f"var x = {self.expression(names, self.chain)};")
+        self.emit(1, f"if ({self.condition(names)}) {{")
+        self.emit(2, f"x = x + {self.expression(names, 5)};")
+        self.emit(1, "} else {")
+        self.emit(2, f'print label + "{i}";')
+        self.emit(1, "}")
+        self.emit(1, f"for (var i = 0; i < {i % 10 + 1}; i = i + 1) {{")
+        self.emit(2, "counter = counter + i;")
+        self.emit(1, "}")
+        if i > 0:
+            callee = self.random.randrange(i)
+            args = ", ".join(self.random.choice(params) for _ in range(1 + callee % 3))
+            self.emit(1, f"return x + f{callee}({args});")
+        else:
+            self.emit(1, "return x;")
+        self.emit(0, "}")
+
+    def klass(self, i):
+        superclass = f" < C{self.random.randrange(i)}" if i > 0 and i % 2 else ""
+        self.emit(0, f"class C{i}{superclass} {{")
+        self.emit(1, "init(value) {")
+        self.emit(2, "this.value = value;")
+        self.emit(2, "this.total = 0;")
+        self.emit(1, "}")
+        self.emit(1, f"m{i}(n) {{")
+        self.emit(2, f"this.total = this.total + {self.expression(['n', 'counter'], 10)};")
+        self.emit(2, "return this.value;")
+        self.emit(1, "}")
+        if superclass:
+            self.emit(1, "describe() {")
+            self.emit(2, f"return super.m{superclass.split('C')[1]}(this.value);")
+            self.emit(1, "}")
+        self.emit(0, "}")
+
+    def nested(self, depth):
+        """Blocks, ifs and whiles nested inside each other"""
+        names = ["counter"]
+        for level in range(depth):
+            kind = level % 3
+            if kind == 0:
+                self.emit(level, "{")
+            elif kind == 1:
+                self.emit(level, f"if ({self.condition(names)}) {{")
+            else:
+                # Every while body bumps counter, so the loops terminate.
+                self.emit(level, f"while (counter < {self.random.randint(0, 5000)}) {{")
+            self.emit(level + 1, f"var v{level} = {self.expression(names, 5)};")
+            names = names + [f"v{level}"]
+        for level in range(depth - 1, -1, -1):
+            if level % 3 == 2:
+                self.emit(level + 1, "counter = counter + 1000;")
+            self.emit(level, "}")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--functions", type=int, default=1000)
+    arg_parser.add_argument("--classes", type=int, default=200)
+    arg_parser.add_argument("--depth", type=int, default=20)
+    arg_parser.add_argument("--chain", type=int, default=50)
+    arg_parser.add_argument("--seed", type=int, default=0)
+    options = arg_parser.parse_args()
+    print(ProgramGenerator(
+        options.functions, options.classes, options.depth,
+        options.chain, options.seed).generate(), end="")
+
+
+if __name__ == "__main__":
+    main()
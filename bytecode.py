@@ -0,0 +1,117 @@
+"""Bytecode instruction set and code objects"""
+
+from array import array
+
+# Opcodes, each followed by the operands listed. Operands are slots,
+# indexes into the code object's constants, or jump targets. Numbered
+# roughly by how often programs run them, which is the order the VM
+# tests for them.
+GET_LOCAL = 0           # slot
+CONSTANT = 1            # constant
+GET_GLOBAL = 2          # symbol, name token
+SET_LOCAL = 3           # slot
+ADD = 4                 # operator token
+SUBTRACT = 5            # operator token
+LESS = 6                # operator token
+UNCHECKED = 7           # operator; operands proven to be right
+JUMP_IF_FALSE = 8       # target; pops the condition
+JUMP = 9                # target
+POP = 10
+CALL = 11               # argument count, paren token
+RETURN = 12
+GET_PROPERTY = 13       # symbol, name token
+GET_CELL = 14           # slot holding a Cell
+SET_CELL = 15           # slot holding a Cell
+GET_UPVALUE = 16        # upvalue
+SET_UPVALUE = 17        # upvalue
+HOISTED = 18            # slot, Code of the loop invariant it holds
+MULTIPLY = 19           # operator token
+DIVIDE = 20             # operator token
+GREATER = 21            # operator token
+GREATER_EQUAL = 22      # operator token
+LESS_EQUAL = 23         # operator token
+EQUAL = 24
+NOT_EQUAL = 25
+NOT = 26
+NEGATE = 27             # operator token
+NEGATE_UNCHECKED = 28
+JUMP_IF_FALSE_OR_POP = 29   # target; keeps a falsey value
+JUMP_IF_TRUE_OR_POP = 30    # target; keeps a truthy value
+SET_GLOBAL = 31         # symbol, name token
+DEFINE_GLOBAL = 32      # symbol
+CHECK_INSTANCE = 33     # name token; object of a property assignment
+SET_PROPERTY = 34       # symbol
+GET_SUPER = 35          # method token
+NIL = 36
+TRUE = 37
+FALSE = 38
+PRINT = 39
+BOX = 40                # puts the value on top in a Cell
+TRUNCATE = 41           # frame size; drops the locals of a block
+CLOSURE = 42            # Code of the function
+CHECK_SUPERCLASS = 43   # name token
+CLASS = 44              # (name, method symbols, whether it has a superclass)
+HOIST = 45              # Code of a loop invariant
+
+NAMES = {value: name for name, value in globals().items()
+         if name.isupper() and isinstance(value, int)}
+OPERANDS = {
+    GET_LOCAL: 1, CONSTANT: 1, GET_GLOBAL: 2, SET_LOCAL: 1, ADD: 1,
+    SUBTRACT: 1, LESS: 1, JUMP_IF_FALSE: 1, JUMP: 1, POP: 0, CALL: 2,
+    RETURN: 0, GET_PROPERTY: 2, GET_CELL: 1, SET_CELL: 1, GET_UPVALUE: 1,
+    SET_UPVALUE: 1, MULTIPLY: 1, DIVIDE: 1, GREATER: 1, GREATER_EQUAL: 1,
+    LESS_EQUAL: 1, UNCHECKED: 1, EQUAL: 0, NOT_EQUAL: 0, NOT: 0, NEGATE: 1,
+    NEGATE_UNCHECKED: 0, JUMP_IF_FALSE_OR_POP: 1, JUMP_IF_TRUE_OR_POP: 1,
+    SET_GLOBAL: 2, DEFINE_GLOBAL: 1, CHECK_INSTANCE: 1, SET_PROPERTY: 1,
+    GET_SUPER: 1, NIL: 0, TRUE: 0, FALSE: 0, PRINT: 0, BOX: 0, TRUNCATE: 1,
+    CLOSURE: 1, CHECK_SUPERCLASS: 1, CLASS: 1, HOIST: 1, HOISTED: 2,
+}
+
+
+class Code:
+    """Compiled body of a function, of the top-level script, or of a
+    loop invariant. Instructions are packed into an array of ints,
+    with the source line of every word in a parallel array.
+
+    A function's Code is made when its declaration is compiled, along
+    with what its closures need to be created; the instructions of a
+    lazily parsed body are only filled in on its first call.
+    """
+
+    def __init__(self, name, declaration=None, arity=0, size=0):
+        self.name = name
+        self.declaration = declaration  # stmt.Function, None for scripts and invariants
+        self.arity = arity
+        self.size = size                # slots the caller fills, 'this' and the parameters
+        self.is_initializer = False
+        self.upvalues = ()              # (depth, slot) of each cell closures capture
+        self.cells = ()                 # slots of captured parameters
+        self.code = None                # array of opcodes and operands
+        self.lines = None               # array of the line of each word
+        self.constants = []
+        self.ops = None                 # code as a list, which the VM indexes faster
+
+    def finish(self, words, lines, constants):
+        """Store the instructions once they are all emitted"""
+        self.code = array("i", words)
+        self.lines = array("i", lines)
+        self.constants = constants
+        self.ops = self.code.tolist()
+
+    def disassemble(self):
+        """Listing of the instructions, for debugging
+
+        :return: str
+        """
+        out = [f"== {self.name} =="]
+        ip = 0
+        while ip < len(self.code):
+            op = self.code[ip]
+            operands = self.code[ip + 1:ip + 1 + OPERANDS[op]].tolist()
+            out.append(f"{ip:04d} {self.lines[ip]:4d} {NAMES[op]:<20} "
+                       f"{' '.join(str(operand) for operand in operands)}")
+            ip += 1 + OPERANDS[op]
+        for constant in self.constants:
+            if isinstance(constant, Code) and constant.code is not None:
+                out.append(constant.disassemble())
+        return "\n".join(out)
@@ -0,0 +1,442 @@
+"""Class that compiles the syntax tree into bytecode"""
+
+import bytecode as op
+import expr
+import stmt
+from bytecode import Code
+from symboltable import INIT
+from tokentypes import TokenType
+
+# Opcodes of the operators that check their operands, by token type
+CHECKED = {
+    TokenType.PLUS: op.ADD,
+    TokenType.MINUS: op.SUBTRACT,
+    TokenType.SLASH: op.DIVIDE,
+    TokenType.STAR: op.MULTIPLY,
+    TokenType.GREATER: op.GREATER,
+    TokenType.GREATER_EQUAL: op.GREATER_EQUAL,
+    TokenType.LESS: op.LESS,
+    TokenType.LESS_EQUAL: op.LESS_EQUAL,
+}
+
+# Operand of UNCHECKED, which names the operator, by token type
+UNCHECKED = {
+    TokenType.PLUS: 0,
+    TokenType.MINUS: 1,
+    TokenType.SLASH: 2,
+    TokenType.STAR: 3,
+    TokenType.GREATER: 4,
+    TokenType.GREATER_EQUAL: 5,
+    TokenType.LESS: 6,
+    TokenType.LESS_EQUAL: 7,
+}
+
+
+class BytecodeCompiler(expr.Visitor, stmt.Visitor):
+    """Compiles a resolved program into Code objects for the VM, one
+    for the script and one for each function declaration, in a single
+    pass over the tree.
+
+    Locals live on the VM's value stack, in the slots the resolver gave
+    them, above the base of their function's frame; the expression
+    temporaries sit above the locals. Declarations therefore simply
+    leave their value on the stack, and a block drops its locals when
+    it ends. The compiler follows the frame layout as it goes, so it
+    knows which slots hold a Cell.
+    """
+
+    def __init__(self):
+        self.words = None           # instructions of the Code being compiled
+        self.lines = None           # line of each word
+        self.constants = None
+        self.indexes = None         # constant key -> index in constants
+        self.frame = None           # captured flag of each slot in use, None outside any frame
+        self.initializer = False    # whether the Code is an initializer's
+        self.line = 0
+        self.expr_dispatch = expr.dispatch_table(self)
+        self.stmt_dispatch = stmt.dispatch_table(self)
+
+    def compile(self, statements):
+        """Compile a resolved program
+
+        :param statements: list of statements
+        :return: Code of the script
+        """
+        script = Code("script")
+
+        def body():
+            self.sequence(statements)
+            self.emit(op.NIL)
+            self.emit(op.RETURN)
+        self.assemble(script, None, False, body)
+        return script
+
+    def body(self, code):
+        """Compile the body of a function, which must have been parsed
+
+        :param code: Code made for the declaration by function()
+        """
+        fn = code.declaration
+
+        def body():
+            self.sequence(fn.body)
+            self.implicit_return()
+        frame = [slot in fn.cells for slot in range(code.size)]
+        self.assemble(code, frame, code.is_initializer, body)
+
+    def visit_block_stmt(self, s):
+        if s.frame:
+            self.frame = []
+            self.sequence(s.statements)
+            self.emit(op.TRUNCATE, 0)
+            self.frame = None
+            return
+
+        base = len(self.frame)
+        self.sequence(s.statements)
+        if len(self.frame) != base:
+            self.emit(op.TRUNCATE, base)
+            del self.frame[base:]
+
+    def visit_class_stmt(self, s):
+        is_global = self.frame is None
+        captured = bool(s.captured)
+        if not is_global:
+            # The class's slot is taken before the one holding 'super'
+            self.emit(op.NIL)
+            if captured:
+                self.emit(op.BOX)
+            self.frame.append(captured)
+        if s.superclass is not None:
+            self.expression(s.superclass)
+            self.emit(op.CHECK_SUPERCLASS, self.constant(s.superclass.name))
+            self.emit(op.BOX)
+        for method in s.methods:
+            code = self.function(method, len(method.params) + 1,   # 'this' first
+                                 method.name.symbol == INIT)
+            self.emit(op.CLOSURE, self.constant(code))
+        symbols = tuple(method.name.symbol for method in s.methods)
+        self.emit(op.CLASS, self.constant((s.name.lexeme, symbols, s.superclass is not None)))
+        if is_global:
+            if captured:
+                self.emit(op.BOX)
+            self.emit(op.DEFINE_GLOBAL, s.name.symbol)
+        else:
+            self.store(0, len(self.frame) - 1)
+            self.emit(op.POP)
+
+    def visit_expression_stmt(self, s):
+        self.expression(s.expression)
+        self.emit(op.POP)
+
+    def visit_function_stmt(self, s):
+        closure = self.constant(self.function(s, len(s.params)))
+        if self.frame is None:
+            self.emit(op.CLOSURE, closure)
+            self.emit(op.DEFINE_GLOBAL, s.name.symbol)
+            return
+
+        self.frame.append(bool(s.captured))
+        if s.captured:
+            # The function may capture itself, so its cell must exist
+            # before the closure is made
+            self.emit(op.NIL)
+            self.emit(op.BOX)
+            self.emit(op.CLOSURE, closure)
+            self.emit(op.SET_CELL, len(self.frame) - 1)
+            self.emit(op.POP)
+            return
+        self.emit(op.CLOSURE, closure)
+
+    def visit_if_stmt(self, s):
+        self.expression(s.condition)
+        skip_then = self.jump(op.JUMP_IF_FALSE)
+        self.statement(s.then_branch)
+        if s.else_branch is None:
+            self.patch(skip_then)
+            return
+        skip_else = self.jump(op.JUMP)
+        self.patch(skip_then)
+        self.statement(s.else_branch)
+        self.patch(skip_else)
+
+    def visit_print_stmt(self, s):
+        self.expression(s.expression)
+        self.emit(op.PRINT)
+
+    def visit_return_stmt(self, s):
+        if s.value is None:
+            self.implicit_return()
+            return
+        self.expression(s.value)
+        self.emit(op.RETURN)
+
+    def visit_var_stmt(self, s):
+        if s.initializer is None:
+            self.emit(op.NIL)
+        else:
+            self.expression(s.initializer)
+        if s.captured:
+            self.emit(op.BOX)
+        if self.frame is None:
+            self.emit(op.DEFINE_GLOBAL, s.name.symbol)
+        else:
+            self.frame.append(bool(s.captured))
+
+    def visit_while_stmt(self, s):
+        base = None
+        if s.hoisted is not None:
+            # Loop invariants go in temporaries at the top of the frame
+            base = len(self.frame)
+            for e in s.hoisted:
+                self.emit(op.HOIST, self.constant(self.invariant(e)))
+                self.frame.append(False)
+        start = len(self.words)
+        self.expression(s.condition)
+        exit = self.jump(op.JUMP_IF_FALSE)
+        self.statement(s.body)
+        self.emit(op.JUMP, start)
+        self.patch(exit)
+        if base is not None:
+            self.emit(op.TRUNCATE, base)
+            del self.frame[base:]
+
+    def visit_assign_expr(self, e):
+        self.expression(e.value)
+        if e.depth is None:
+            self.emit(op.SET_GLOBAL, e.name.symbol, self.constant(e.name))
+        else:
+            self.store(e.depth, e.slot)
+
+    def visit_binary_expr(self, e):
+        # Chains such as a + b + c are walked down their left operands
+        # in a loop, so that their length isn't bound by the Python stack
+        chain = []
+        while type(e) is expr.Binary:
+            chain.append(e)
+            e = e.left
+        self.expression(e)
+        for e in reversed(chain):
+            self.expression(e.right)
+            tokentype = e.operator.tokentype
+            if tokentype == TokenType.EQUAL_EQUAL:
+                self.emit(op.EQUAL)
+            elif tokentype == TokenType.BANG_EQUAL:
+                self.emit(op.NOT_EQUAL)
+            elif e.proven:
+                self.emit(op.UNCHECKED, UNCHECKED[tokentype])
+            else:
+                self.emit(CHECKED[tokentype], self.constant(e.operator))
+
+    def visit_call_expr(self, e):
+        self.expression(e.callee)
+        for argument in e.arguments:
+            self.expression(argument)
+        self.emit(op.CALL, len(e.arguments), self.constant(e.paren))
+
+    def visit_conditional_expr(self, e):
+        self.expression(e.condition)
+        skip_then = self.jump(op.JUMP_IF_FALSE)
+        self.expression(e.then_branch)
+        skip_else = self.jump(op.JUMP)
+        self.patch(skip_then)
+        self.expression(e.else_branch)
+        self.patch(skip_else)
+
+    def visit_get_expr(self, e):
+        self.expression(e.object)
+        self.emit(op.GET_PROPERTY, e.name.symbol, self.constant(e.name))
+
+    def visit_grouping_expr(self, e):
+        self.expression(e.expression)
+
+    def visit_hoisted_expr(self, e):
+        self.emit(op.HOISTED, e.slot, self.constant(self.invariant(e.expression)))
+
+    def visit_inline_expr(self, e):
+        """Make the call. Calls are cheap in the VM, which needs no
+        Python frame for them, so the inlined body is not used.
+        """
+
+        self.expression(e.call)
+
+    def visit_literal_expr(self, e):
+        if e.value is None:
+            self.emit(op.NIL)
+        elif e.value is True:
+            self.emit(op.TRUE)
+        elif e.value is False:
+            self.emit(op.FALSE)
+        else:
+            self.emit(op.CONSTANT, self.constant(e.value))
+
+    def visit_logical_expr(self, e):
+        chain = []
+        while type(e) is expr.Logical:
+            chain.append(e)
+            e = e.left
+        self.expression(e)
+        for e in reversed(chain):
+            if e.operator.tokentype == TokenType.OR:
+                end = self.jump(op.JUMP_IF_TRUE_OR_POP)
+            else:
+                end = self.jump(op.JUMP_IF_FALSE_OR_POP)
+            self.expression(e.right)
+            self.patch(end)
+
+    def visit_set_expr(self, e):
+        self.expression(e.object)
+        self.emit(op.CHECK_INSTANCE, self.constant(e.name))
+        self.expression(e.value)
+        self.emit(op.SET_PROPERTY, e.name.symbol)
+
+    def visit_super_expr(self, e):
+        self.read(e.depth, e.slot, e.keyword)
+        self.read(e.this_depth, e.this_slot, e.keyword)
+        self.emit(op.GET_SUPER, self.constant(e.method))
+
+    def visit_this_expr(self, e):
+        self.read(e.depth, e.slot, e.keyword)
+
+    def visit_unary_expr(self, e):
+        self.expression(e.right)
+        if e.operator.tokentype == TokenType.BANG:
+            self.emit(op.NOT)
+        elif e.proven:
+            self.emit(op.NEGATE_UNCHECKED)
+        else:
+            self.emit(op.NEGATE, self.constant(e.operator))
+
+    def visit_variable_expr(self, e):
+        self.read(e.depth, e.slot, e.name)
+
+    def expression(self, e):
+        if e.line is not None:
+            self.line = e.line
+        self.expr_dispatch[e.kind](e)
+
+    def statement(self, s):
+        if s.line is not None:
+            self.line = s.line
+        self.stmt_dispatch[s.kind](s)
+
+    def sequence(self, statements):
+        for s in statements:
+            self.statement(s)
+
+    def emit(self, *words):
+        self.words.extend(words)
+        self.lines.extend(self.line for _ in words)
+
+    def jump(self, opcode):
+        """Emit a jump whose target is patched in later
+
+        :return: index of the target operand
+        """
+        self.emit(opcode, -1)
+        return len(self.words) - 1
+
+    def patch(self, operand):
+        """Make a jump go to the next instruction emitted"""
+        self.words[operand] = len(self.words)
+
+    def constant(self, value):
+        """Index of a value in the constants of the Code being compiled.
+        Literals are shared, anything else is added once per object.
+        """
+
+        if isinstance(value, (float, str)):
+            key = (type(value), repr(value))    # keeps 0 and -0 apart
+        else:
+            key = id(value)
+        index = self.indexes.get(key)
+        if index is None:
+            index = self.indexes[key] = len(self.constants)
+            self.constants.append(value)
+        return index
+
+    def read(self, depth, slot, name):
+        """Emit a read of the variable the resolver found at depth, slot
+
+        :param name: token reported if a global is undefined
+        """
+        if depth is None:
+            self.emit(op.GET_GLOBAL, name.symbol, self.constant(name))
+        elif depth < 0:
+            self.emit(op.GET_UPVALUE, slot)
+        elif self.frame[slot]:
+            self.emit(op.GET_CELL, slot)
+        else:
+            self.emit(op.GET_LOCAL, slot)
+
+    def store(self, depth, slot):
+        """Emit an assignment of the value on top of the stack, which
+        stays there, to the local or upvalue at depth, slot
+        """
+        if depth < 0:
+            self.emit(op.SET_UPVALUE, slot)
+        elif self.frame[slot]:
+            self.emit(op.SET_CELL, slot)
+        else:
+            self.emit(op.SET_LOCAL, slot)
+
+    def implicit_return(self):
+        """Return nil, or 'this' from an initializer"""
+        if self.initializer:
+            self.read(0, 0, None)
+        else:
+            self.emit(op.NIL)
+        self.emit(op.RETURN)
+
+    def function(self, fn, size, is_initializer=False):
+        """Make the Code of a function declaration, compiling its body
+        unless it hasn't been parsed yet
+
+        :param fn: stmt.Function
+        :param size: slots the caller fills, 'this' and the parameters
+        :param is_initializer: whether fn is a class's init method
+        :return: Code
+        """
+        code = Code(fn.name.lexeme, fn, len(fn.params), size)
+        code.upvalues = tuple(fn.upvalues)
+        code.cells = tuple(fn.cells)
+        code.is_initializer = is_initializer
+        if fn.body is not None:
+            self.body(code)
+        return code
+
+    def invariant(self, e):
+        """Make the Code evaluating a loop invariant. It runs in the
+        frame of the loop, on top of its temporaries.
+
+        :param e: Expr
+        :return: Code
+        """
+        code = Code("invariant")
+        frame = self.frame
+
+        def body():
+            self.expression(e)
+            self.emit(op.RETURN)
+        self.assemble(code, list(frame), False, body)
+        return code
+
+    def assemble(self, code, frame, initializer, body):
+        """Compile into code what body emits, in a frame of its own
+
+        :param code: Code to fill in
+        :param frame: captured flags of the slots in use at the start
+        :param initializer: whether 'return;' returns 'this'
+        :param body: function emitting the instructions
+        """
+        line = self.line
+        enclosing = (self.words, self.lines, self.constants, self.indexes,
+                     self.frame, self.initializer)
+        self.words, self.lines, self.constants, self.indexes = [], [], [], {}
+        self.frame = frame
+        self.initializer = initializer
+        body()
+        code.finish(self.words, self.lines, self.constants)
+        (self.words, self.lines, self.constants, self.indexes,
+         self.frame, self.initializer) = enclosing
+        self.line = line
@@ -0,0 +1,14 @@
+"""Box for captured variables"""
+
+
+class Cell:
+    """Holds a local variable that a closure captures. The variable's
+    slot in its scope holds the Cell instead of the value, and every
+    closure that uses it holds the same Cell as an upvalue, so they all
+    see each other's assignments. Cells never escape as Lox values.
+    """
+
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
@@ -0,0 +1,893 @@
+"""Class that compiles the syntax tree into Python closures"""
+
+import operator
+
+import expr
+import stmt
+from cell import Cell
+from compiledfunction import NIL, CompiledFunction
+from globalenvironment import UNDEFINED
+from hoister import NOT_COMPUTED
+from interpreter import CACHE_SIZE
+from loxcallable import LoxCallable
+from loxclass import LoxClass
+from loxinstance import LoxInstance
+from runtimeexception import RuntimeException
+from symboltable import INIT
+from tokentypes import TokenType
+
+# Operators on two numbers, by token type
+NUMERIC = {
+    TokenType.MINUS: operator.sub,
+    TokenType.SLASH: operator.truediv,
+    TokenType.STAR: operator.mul,
+    TokenType.GREATER: operator.gt,
+    TokenType.GREATER_EQUAL: operator.ge,
+    TokenType.LESS: operator.lt,
+    TokenType.LESS_EQUAL: operator.le,
+}
+
+# Operators in a chain, as in a + b + c, past which it is compiled into
+# a loop rather than into closures calling each other, one per operator
+CHAIN = 32
+
+# Operators whose result is always a boolean
+TESTS = (TokenType.GREATER, TokenType.GREATER_EQUAL, TokenType.LESS,
+         TokenType.LESS_EQUAL, TokenType.EQUAL_EQUAL, TokenType.BANG_EQUAL)
+
+
+def nothing(values, upvalues):
+    return None
+
+
+def no_arguments(values, upvalues):
+    return []
+
+
+class ClosureCompiler(expr.Visitor, stmt.Visitor):
+    """Compiles each node of a resolved program, once, into a Python
+    closure that does that node's work. Everything the tree walker looks
+    up on the node every time it runs, the operator, the depth and slot
+    of a variable, a literal's value, whether a check is needed, is
+    decided here and bound into the closure, and the closures of a
+    node's children are called directly, without any dispatch.
+
+    Every closure takes the values of the running frame and the cells
+    the running function closed over. Expression closures return the
+    expression's value. Statement closures return None, or, when a
+    return statement ran, the value returned, NIL standing for nil, so
+    that returning unwinds through plain returns instead of an
+    exception.
+
+    The frame layout is the one the tree walker uses. The compiler
+    follows it as it goes, so it knows which slots hold a Cell.
+    """
+
+    def __init__(self, interpreter):
+        self.interpreter = interpreter      # owns the globals and the top-level frame
+        self.frame = None                   # captured flag of each slot in use, None outside any frame
+        self.inlined = {}                   # stmt.Function -> its compiled inlined body
+        self.expr_dispatch = expr.dispatch_table(self)
+        self.stmt_dispatch = stmt.dispatch_table(self)
+
+    def compile(self, statements):
+        """Compile a resolved program
+
+        :param statements: list of statements
+        :return: closure that runs them, given the top-level frame's
+            values and no upvalues
+        """
+        return self.sequence(statements)
+
+    def visit_block_stmt(self, s):
+        if s.frame:
+            self.frame = []
+            body = self.sequence(s.statements)
+            self.frame = None
+
+            def run(values, upvalues):
+                try:
+                    return body(values, upvalues)
+                finally:
+                    values.clear()
+            return run
+
+        base = len(self.frame)
+        body = self.sequence(s.statements)
+        if len(self.frame) == base:
+            return body     # declares nothing, so there is nothing to drop
+        del self.frame[base:]
+
+        def run(values, upvalues):
+            result = body(values, upvalues)
+            del values[base:]
+            return result
+        return run
+
+    def visit_class_stmt(self, s):
+        superclass = None
+        if s.superclass is not None:
+            superclass = self.expression(s.superclass)
+        superclass_name = s.superclass.name if s.superclass is not None else None
+        symbol = s.name.symbol
+        name = s.name.lexeme
+        captured = bool(s.captured)
+        is_global = self.frame is None
+        methods = []
+        for method in s.methods:
+            code = self.function(method, len(method.params) + 1)   # 'this' first
+            methods.append((method.name.symbol, method, self.capture(method), code,
+                            method.name.symbol == INIT))
+        if not is_global:
+            self.frame.append(captured)
+        define = self.interpreter.globals.define
+
+        def run(values, upvalues):
+            klass = None
+            if superclass is not None:
+                klass = superclass(values, upvalues)
+                if not isinstance(klass, LoxClass):
+                    raise RuntimeException(superclass_name, "Superclass must be a class.")
+            # The class's slot is taken before the one holding 'super'
+            cell = Cell(None) if captured else None
+            if is_global:
+                define(symbol, cell)
+            else:
+                slot = len(values)
+                values.append(cell)
+            if klass is not None:
+                values.append(Cell(klass))
+            table = {}
+            for method_symbol, method, capture, code, is_initializer in methods:
+                table[method_symbol] = CompiledFunction(
+                    method, capture(values, upvalues), is_initializer, code)
+            lox_class = LoxClass(name, klass, table)
+            if klass is not None:
+                values.pop()
+            if cell is not None:
+                cell.value = lox_class
+            elif is_global:
+                define(symbol, lox_class)
+            else:
+                values[slot] = lox_class
+            return None
+        return run
+
+    def visit_expression_stmt(self, s):
+        expression = self.expression(s.expression)
+
+        def run(values, upvalues):
+            expression(values, upvalues)
+        return run
+
+    def visit_function_stmt(self, s):
+        code = self.function(s, len(s.params))
+        capture = self.capture(s)
+        if self.frame is None:
+            define = self.interpreter.globals.define
+            symbol = s.name.symbol
+
+            def run(values, upvalues):
+                define(symbol, CompiledFunction(s, capture(values, upvalues), False, code))
+            return run
+
+        self.frame.append(bool(s.captured))
+        if s.captured:
+            def run(values, upvalues):
+                # The function may capture itself, so its cell must
+                # exist before the closure is made
+                cell = Cell(None)
+                values.append(cell)
+                cell.value = CompiledFunction(s, capture(values, upvalues), False, code)
+            return run
+
+        def run(values, upvalues):
+            values.append(CompiledFunction(s, capture(values, upvalues), False, code))
+        return run
+
+    def visit_if_stmt(self, s):
+        condition = self.test(s.condition)
+        then_branch = self.statement(s.then_branch)
+        if s.else_branch is None:
+            def run(values, upvalues):
+                if condition(values, upvalues):
+                    return then_branch(values, upvalues)
+                return None
+            return run
+
+        else_branch = self.statement(s.else_branch)
+
+        def run(values, upvalues):
+            if condition(values, upvalues):
+                return then_branch(values, upvalues)
+            return else_branch(values, upvalues)
+        return run
+
+    def visit_print_stmt(self, s):
+        expression = self.expression(s.expression)
+        stringify = self.interpreter.stringify
+
+        def run(values, upvalues):
+            print(stringify(expression(values, upvalues)))
+        return run
+
+    def visit_return_stmt(self, s):
+        if s.value is None:
+            def run(values, upvalues):
+                return NIL
+            return run
+
+        value = self.expression(s.value)
+
+        def run(values, upvalues):
+            result = value(values, upvalues)
+            if result is None:
+                return NIL
+            return result
+        return run
+
+    def visit_var_stmt(self, s):
+        initializer = nothing
+        if s.initializer is not None:
+            initializer = self.expression(s.initializer)
+        captured = bool(s.captured)
+        if self.frame is None:
+            define = self.interpreter.globals.define
+            symbol = s.name.symbol
+
+            def run(values, upvalues):
+                value = initializer(values, upvalues)
+                define(symbol, Cell(value) if captured else value)
+            return run
+
+        self.frame.append(captured)
+        if captured:
+            def run(values, upvalues):
+                values.append(Cell(initializer(values, upvalues)))
+            return run
+
+        def run(values, upvalues):
+            values.append(initializer(values, upvalues))
+        return run
+
+    def visit_while_stmt(self, s):
+        if s.hoisted is None:
+            condition = self.test(s.condition)
+            body = self.statement(s.body)
+
+            def run(values, upvalues):
+                while condition(values, upvalues):
+                    result = body(values, upvalues)
+                    if result is not None:
+                        return result
+                return None
+            return run
+
+        # Loop invariants go in temporaries at the top of the frame
+        hoisted = tuple(self.expression(e) for e in s.hoisted)
+        base = len(self.frame)
+        self.frame.extend(False for _ in hoisted)
+        condition = self.test(s.condition)
+        body = self.statement(s.body)
+        del self.frame[base:]
+
+        def run(values, upvalues):
+            for expression in hoisted:
+                try:
+                    values.append(expression(values, upvalues))
+                except (RuntimeException, ArithmeticError):
+                    # Raised again by the loop, if it gets that far
+                    values.append(NOT_COMPUTED)
+            while condition(values, upvalues):
+                result = body(values, upvalues)
+                if result is not None:
+                    return result
+            del values[base:]
+            return None
+        return run
+
+    def loop(self, s, frame):
+        """Compile a while loop that takes over from the tree walker
+        while it is running, its loop invariants already computed
+
+        :param s: stmt.While
+        :param frame: captured flag of each slot in use, None outside
+            any frame
+        :return: closure that runs the remaining iterations and returns
+            like a statement closure
+        """
+        enclosing = self.frame
+        self.frame = frame
+        condition = self.test(s.condition)
+        body = self.statement(s.body)
+        self.frame = enclosing
+
+        def run(values, upvalues):
+            while condition(values, upvalues):
+                result = body(values, upvalues)
+                if result is not None:
+                    return result
+            return None
+        return run
+
+    def visit_assign_expr(self, e):
+        value = self.expression(e.value)
+        depth = e.depth
+        slot = e.slot
+        if depth is None:
+            globals_values = self.interpreter.globals.values
+            assign = self.interpreter.globals.assign
+            name = e.name
+            symbol = name.symbol
+
+            def run(values, upvalues):
+                result = value(values, upvalues)
+                if symbol < len(globals_values) and globals_values[symbol] is not UNDEFINED:
+                    globals_values[symbol] = result
+                else:
+                    assign(name, result)    # raises the undefined variable error
+                return result
+        elif depth < 0:
+            def run(values, upvalues):
+                result = value(values, upvalues)
+                upvalues[slot].value = result
+                return result
+        elif self.frame[slot]:
+            def run(values, upvalues):
+                result = value(values, upvalues)
+                values[slot].value = result
+                return result
+        else:
+            def run(values, upvalues):
+                result = value(values, upvalues)
+                values[slot] = result
+                return result
+        return run
+
+    def visit_binary_expr(self, e):
+        if type(e.left) is expr.Binary:
+            chain, first = self.chain(e)
+            if len(chain) > CHAIN:
+                return self.binary_chain(chain, first)
+        left = self.expression(e.left)
+        right = self.expression(e.right)
+        token = e.operator
+        tokentype = token.tokentype
+
+        if tokentype == TokenType.EQUAL_EQUAL:
+            def run(values, upvalues):
+                a = left(values, upvalues)
+                b = right(values, upvalues)
+                if a is None:
+                    return b is None
+                return a == b
+            return run
+
+        if tokentype == TokenType.BANG_EQUAL:
+            def run(values, upvalues):
+                a = left(values, upvalues)
+                b = right(values, upvalues)
+                if a is None:
+                    return b is not None
+                return a != b
+            return run
+
+        if tokentype == TokenType.PLUS:
+            if e.proven:
+                def run(values, upvalues):
+                    return left(values, upvalues) + right(values, upvalues)
+                return run
+
+            def run(values, upvalues):
+                a = left(values, upvalues)
+                b = right(values, upvalues)
+                kind = type(a)
+                if kind is type(b) and (kind is float or kind is str):
+                    return a + b
+                raise RuntimeException(
+                    token, "Operators must be two numbers or two strings")
+            return run
+
+        function = NUMERIC[tokentype]
+        if isinstance(e.right, expr.Literal) and type(e.right.value) is float:
+            # The right operand is known to be a number
+            constant = e.right.value
+            if e.proven:
+                def run(values, upvalues):
+                    return function(left(values, upvalues), constant)
+                return run
+
+            def run(values, upvalues):
+                a = left(values, upvalues)
+                if type(a) is float:
+                    return function(a, constant)
+                raise RuntimeException(token, "Operands must be a numbers")
+            return run
+
+        if e.proven:
+            def run(values, upvalues):
+                return function(left(values, upvalues), right(values, upvalues))
+            return run
+
+        def run(values, upvalues):
+            a = left(values, upvalues)
+            b = right(values, upvalues)
+            if type(a) is float and type(b) is float:
+                return function(a, b)
+            raise RuntimeException(token, "Operands must be a numbers")
+        return run
+
+    def binary_chain(self, chain, first):
+        """Compile a long chain of binary operators
+
+        :param chain: Binary nodes, innermost first
+        :param first: the chain's leftmost operand
+        :return: closure applying the operators in a loop
+        """
+        first = self.expression(first)
+        steps = [(self.operation(e), self.expression(e.right)) for e in chain]
+
+        def run(values, upvalues):
+            value = first(values, upvalues)
+            for operation, right in steps:
+                value = operation(value, right(values, upvalues))
+            return value
+        return run
+
+    def operation(self, e):
+        """Function of the values of a Binary node's operands that
+        applies its operator, checking them unless types were proven
+        """
+        token = e.operator
+        tokentype = token.tokentype
+        if tokentype == TokenType.EQUAL_EQUAL:
+            def run(a, b):
+                if a is None:
+                    return b is None
+                return a == b
+            return run
+
+        if tokentype == TokenType.BANG_EQUAL:
+            def run(a, b):
+                if a is None:
+                    return b is not None
+                return a != b
+            return run
+
+        if tokentype == TokenType.PLUS:
+            if e.proven:
+                return operator.add
+
+            def run(a, b):
+                kind = type(a)
+                if kind is type(b) and (kind is float or kind is str):
+                    return a + b
+                raise RuntimeException(
+                    token, "Operators must be two numbers or two strings")
+            return run
+
+        function = NUMERIC[tokentype]
+        if e.proven:
+            return function
+
+        def run(a, b):
+            if type(a) is float and type(b) is float:
+                return function(a, b)
+            raise RuntimeException(token, "Operands must be a numbers")
+        return run
+
+    def visit_call_expr(self, e):
+        callee = self.expression(e.callee)
+        arguments = self.arguments(e.arguments)
+        count = len(e.arguments)
+        paren = e.paren
+        call = self.call
+
+        def run(values, upvalues):
+            function = callee(values, upvalues)
+            frame = arguments(values, upvalues)
+            if type(function) is CompiledFunction and function.instance is None:
+                # The common case, a plain function, is called right here
+                if function.count != count:
+                    raise RuntimeException(
+                        paren, f"Expected {function.count} arguments but got {count}.")
+                result = function.code(frame, function.upvalues)
+                if result is NIL:
+                    return None
+                return result
+            return call(function, frame, paren)
+        return run
+
+    def visit_conditional_expr(self, e):
+        condition = self.test(e.condition)
+        then_branch = self.expression(e.then_branch)
+        else_branch = self.expression(e.else_branch)
+
+        def run(values, upvalues):
+            if condition(values, upvalues):
+                return then_branch(values, upvalues)
+            return else_branch(values, upvalues)
+        return run
+
+    def visit_get_expr(self, e):
+        object = self.expression(e.object)
+        name = e.name
+        symbol = name.symbol
+        cache = {}      # inline cache, see Interpreter.find_method
+        find_method = self.find_method
+
+        def run(values, upvalues):
+            instance = object(values, upvalues)
+            if type(instance) is LoxInstance:
+                fields = instance.fields
+                if symbol in fields:
+                    return fields[symbol]
+                method = cache.get(instance.klass)
+                if method is None:
+                    method = find_method(cache, instance.klass, name)
+                return method.bind(instance)
+            raise RuntimeException(name, "Only instances have properties.")
+        return run
+
+    def visit_grouping_expr(self, e):
+        return self.expression(e.expression)
+
+    def visit_hoisted_expr(self, e):
+        slot = e.slot
+        expression = self.expression(e.expression)
+
+        def run(values, upvalues):
+            value = values[slot]
+            if value is NOT_COMPUTED:
+                return expression(values, upvalues)
+            return value
+        return run
+
+    def visit_inline_expr(self, e):
+        """Evaluate the body of an inlined function in a frame holding
+        the arguments, unless the function's name no longer refers to
+        it, in which case make the call after all
+        """
+
+        callee = self.expression(e.call.callee)
+        arguments = self.arguments(e.call.arguments)
+        paren = e.call.paren
+        fn = e.function
+        body = self.inlined.get(fn)
+        if body is None:
+            enclosing = self.frame
+            self.frame = [False] * len(fn.params)
+            body = self.inlined[fn] = self.expression(e.body)
+            self.frame = enclosing
+        call = self.call
+
+        def run(values, upvalues):
+            function = callee(values, upvalues)
+            frame = arguments(values, upvalues)
+            if type(function) is CompiledFunction and function.declaration is fn:
+                return body(frame, upvalues)
+            return call(function, frame, paren)
+        return run
+
+    def visit_literal_expr(self, e):
+        value = e.value
+
+        def run(values, upvalues):
+            return value
+        return run
+
+    def visit_logical_expr(self, e):
+        if type(e.left) is expr.Logical:
+            chain, first = self.chain(e)
+            if len(chain) > CHAIN:
+                return self.logical_chain(chain, first)
+        left = self.expression(e.left)
+        right = self.expression(e.right)
+        if e.operator.tokentype == TokenType.OR:
+            def run(values, upvalues):
+                value = left(values, upvalues)
+                if value is not None and value is not False:
+                    return value
+                return right(values, upvalues)
+            return run
+
+        def run(values, upvalues):
+            value = left(values, upvalues)
+            if value is None or value is False:
+                return value
+            return right(values, upvalues)
+        return run
+
+    def logical_chain(self, chain, first):
+        """Compile a long chain of logical operators, as in a or b or c,
+        into a loop, like binary_chain
+        """
+        first = self.expression(first)
+        steps = [(e.operator.tokentype == TokenType.OR, self.expression(e.right))
+                 for e in chain]
+
+        def run(values, upvalues):
+            value = first(values, upvalues)
+            for is_or, right in steps:
+                if (value is not None and value is not False) != is_or:
+                    value = right(values, upvalues)
+            return value
+        return run
+
+    def visit_set_expr(self, e):
+        object = self.expression(e.object)
+        value = self.expression(e.value)
+        name = e.name
+        symbol = name.symbol
+
+        def run(values, upvalues):
+            instance = object(values, upvalues)
+            if type(instance) is not LoxInstance:
+                raise RuntimeException(name, "Only instances have fields.")
+            result = value(values, upvalues)
+            instance.fields[symbol] = result
+            return result
+        return run
+
+    def visit_super_expr(self, e):
+        superclass = self.read(e.depth, e.slot, e.keyword)
+        this = self.read(e.this_depth, e.this_slot, e.keyword)
+        method = e.method
+        cache = {}
+        find_method = self.find_method
+
+        def run(values, upvalues):
+            klass = superclass(values, upvalues)
+            found = cache.get(klass)
+            if found is None:
+                found = find_method(cache, klass, method)
+            return found.bind(this(values, upvalues))
+        return run
+
+    def visit_this_expr(self, e):
+        return self.read(e.depth, e.slot, e.keyword)
+
+    def visit_unary_expr(self, e):
+        right = self.expression(e.right)
+        token = e.operator
+        if token.tokentype == TokenType.BANG:
+            def run(values, upvalues):
+                value = right(values, upvalues)
+                return value is None or value is False
+            return run
+
+        if e.proven:
+            def run(values, upvalues):
+                return -right(values, upvalues)
+            return run
+
+        def run(values, upvalues):
+            value = right(values, upvalues)
+            if type(value) is float:
+                return -value
+            raise RuntimeException(token, "Operand must be a number")
+        return run
+
+    def visit_variable_expr(self, e):
+        return self.read(e.depth, e.slot, e.name)
+
+    def expression(self, e):
+        return self.expr_dispatch[e.kind](e)
+
+    def statement(self, s):
+        return self.stmt_dispatch[s.kind](s)
+
+    def sequence(self, statements):
+        """Compile statements that run one after the other
+
+        :param statements: list of statements
+        :return: closure that runs them until one returns
+        """
+        runs = tuple(self.statement(s) for s in statements)
+        if not runs:
+            return nothing
+        if len(runs) == 1:
+            return runs[0]
+        if len(runs) == 2:
+            first, second = runs
+
+            def run(values, upvalues):
+                result = first(values, upvalues)
+                if result is not None:
+                    return result
+                return second(values, upvalues)
+            return run
+
+        def run(values, upvalues):
+            for statement in runs:
+                result = statement(values, upvalues)
+                if result is not None:
+                    return result
+            return None
+        return run
+
+    def test(self, e):
+        """Compile an expression used as a condition
+
+        :param e: Expr
+        :return: closure returning whether the value is truthy
+        """
+        if isinstance(e, expr.Binary) and e.operator.tokentype in TESTS:
+            return self.expression(e)
+        if isinstance(e, expr.Unary) and e.operator.tokentype == TokenType.BANG:
+            return self.expression(e)
+        if isinstance(e, expr.Grouping):
+            return self.test(e.expression)
+        if isinstance(e, expr.Logical) and len(self.chain(e)[0]) <= CHAIN:
+            left = self.test(e.left)
+            right = self.test(e.right)
+            if e.operator.tokentype == TokenType.OR:
+                def run(values, upvalues):
+                    return left(values, upvalues) or right(values, upvalues)
+                return run
+
+            def run(values, upvalues):
+                return left(values, upvalues) and right(values, upvalues)
+            return run
+
+        expression = self.expression(e)
+
+        def run(values, upvalues):
+            value = expression(values, upvalues)
+            return value is not None and value is not False
+        return run
+
+    def chain(self, e):
+        """Split a left-associative chain of Binary or Logical nodes, as
+        in a + b + c
+
+        :param e: the chain's last node
+        :return: (nodes of the chain's kind, innermost first, the
+            leftmost operand)
+        """
+        chain = []
+        kind = type(e)
+        while type(e) is kind:
+            chain.append(e)
+            e = e.left
+        chain.reverse()
+        return chain, e
+
+    def read(self, depth, slot, name):
+        """Compile a read of the variable the resolver found at depth,
+        slot
+
+        :param name: token reported if a global is undefined
+        :return: closure returning its value
+        """
+        if depth is None:
+            globals_values = self.interpreter.globals.values
+            get = self.interpreter.globals.get
+            symbol = name.symbol
+
+            def run(values, upvalues):
+                if symbol < len(globals_values):
+                    value = globals_values[symbol]
+                    if value is not UNDEFINED:
+                        return value
+                return get(name)    # raises the undefined variable error
+            return run
+
+        if depth < 0:
+            def run(values, upvalues):
+                return upvalues[slot].value
+            return run
+
+        if self.frame[slot]:
+            def run(values, upvalues):
+                return values[slot].value   # captured by a closure
+            return run
+
+        def run(values, upvalues):
+            return values[slot]
+        return run
+
+    def arguments(self, nodes):
+        """Compile the arguments of a call
+
+        :param nodes: list of Expr
+        :return: closure returning a new list of their values, which
+            becomes the callee's frame
+        """
+        runs = tuple(self.expression(argument) for argument in nodes)
+        if not runs:
+            return no_arguments
+        if len(runs) == 1:
+            first, = runs
+
+            def run(values, upvalues):
+                return [first(values, upvalues)]
+            return run
+        if len(runs) == 2:
+            first, second = runs
+
+            def run(values, upvalues):
+                return [first(values, upvalues), second(values, upvalues)]
+            return run
+
+        def run(values, upvalues):
+            return [argument(values, upvalues) for argument in runs]
+        return run
+
+    def capture(self, fn):
+        """Compile the collection of the cells a function closes over,
+        from the frame it is declared in
+
+        :param fn: stmt.Function
+        :return: closure returning a list of Cell
+        """
+        upvalues = tuple(fn.upvalues)
+        if not upvalues:
+            return no_arguments
+
+        def run(values, enclosing):
+            return [enclosing[slot] if depth < 0 else values[slot]
+                    for depth, slot in upvalues]
+        return run
+
+    def function(self, fn, size):
+        """Compile a function's body. A lazily parsed body is parsed
+        and compiled the first time the function is called.
+
+        :param fn: stmt.Function
+        :param size: slots the caller fills, 'this' and the parameters
+        :return: closure that runs the body, given the frame and the
+            function's upvalues
+        """
+        if fn.body is not None:
+            return self.body(fn, size)
+        compiled = None
+
+        def run(values, upvalues):
+            nonlocal compiled
+            if compiled is None:
+                if fn.body is None:
+                    fn.body = fn.lazy.load(fn)
+                    fn.lazy = None
+                compiled = self.body(fn, size)
+            return compiled(values, upvalues)
+        return run
+
+    def body(self, fn, size):
+        enclosing = self.frame
+        self.frame = [slot in fn.cells for slot in range(size)]
+        body = self.sequence(fn.body)
+        self.frame = enclosing
+        cells = tuple(fn.cells)
+        if not cells:
+            return body
+
+        def run(values, upvalues):
+            for slot in cells:
+                values[slot] = Cell(values[slot])
+            return body(values, upvalues)
+        return run
+
+    def find_method(self, cache, klass, name):
+        """Look a method up and remember it in a site's inline cache
+
+        :param cache: dict of LoxClass to method
+        :param klass: LoxClass to start from
+        :param name: Token naming the method
+        :return: the unbound method
+        """
+        method = klass.find_method(name.symbol)
+        if method is None:
+            raise RuntimeException(name, f"Undefined property '{name.lexeme}'.")
+        if len(cache) < CACHE_SIZE:
+            cache[klass] = method
+        return method
+
+    def call(self, callee, arguments, paren):
+        """Call anything other than a plain compiled function"""
+        if not isinstance(callee, LoxCallable):
+            raise RuntimeException(paren, "Can only call functions and classes.")
+        if len(arguments) != callee.arity():
+            raise RuntimeException(
+                paren, f"Expected {callee.arity()} arguments but got {len(arguments)}.")
+        return callee.call(self.interpreter, arguments)
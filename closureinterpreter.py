@@ -0,0 +1,18 @@
+"""Interpreter that runs compiled closures"""
+
+from closurecompiler import ClosureCompiler
+from interpreter import Interpreter
+
+
+class ClosureInterpreter(Interpreter):
+    """Instead of walking the tree, compile each program into closures
+    with a ClosureCompiler and call them. Runtime state, output and
+    errors are those of the tree walker.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.compiler = ClosureCompiler(self)
+
+    def execute_all(self, statements, path=None):
+        self.compiler.compile(statements)(self.frame.values, [])
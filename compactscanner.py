@@ -0,0 +1,26 @@
+"""Compact scanner class"""
+
+from regexscanner import RegexScanner
+from tokenarray import TokenArray
+from tokentypes import TokenType
+
+
+class CompactScanner(RegexScanner):
+    """Regex scanner that records tokens in a TokenArray instead of a
+    list of Token objects. Lexemes stay in the source string until the
+    parser asks for them.
+    """
+
+    compact = True
+
+    def scan_tokens(self):
+        """Walk the master pattern over the source and record the type,
+        position and line of every lexeme it recognizes.
+
+        :return: TokenArray
+        """
+        self.tokens = TokenArray(self.source)
+        self.scan_source(self.source, len(self.source))
+        eof = TokenArray.type_ids[TokenType.EOF]
+        self.tokens.append(eof, len(self.source), 0, self.line)
+        return self.tokens
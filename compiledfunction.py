@@ -0,0 +1,33 @@
+"""Function compiled to closures"""
+
+from loxfunction import LoxFunction
+
+# What a compiled body returns for 'return nil;'. Falling off the end
+# of a body returns None, any other return its value.
+NIL = object()
+
+
+class CompiledFunction(LoxFunction):
+    """Runtime function whose body was compiled ahead of time. The code
+    is called with the new frame and the function's upvalues, so calls
+    need neither the interpreter's environment nor a Return exception.
+    """
+
+    def __init__(self, declaration, upvalues, is_initializer, code, instance=None):
+        super().__init__(declaration, upvalues, is_initializer, instance)
+        self.code = code                        # compiled body, shared by every closure of the declaration
+        self.count = len(declaration.params)    # number of parameters
+
+    def bind(self, instance):
+        return CompiledFunction(
+            self.declaration, self.upvalues, self.is_initializer, self.code, instance)
+
+    def call(self, interpreter, arguments):
+        # 'this' and the parameters take the first slots of the frame
+        values = arguments if self.instance is None else [self.instance, *arguments]
+        value = self.code(values, self.upvalues)
+        if self.is_initializer:
+            return self.instance
+        if value is NIL:
+            return None
+        return value
@@ -0,0 +1,118 @@
+"""Counted loops that the interpreter runs natively"""
+
+import operator
+
+import expr
+import stmt
+from tokentypes import TokenType
+
+# Comparisons a counted loop's condition may make, by token type
+COMPARISONS = {
+    TokenType.LESS: operator.lt,
+    TokenType.LESS_EQUAL: operator.le,
+    TokenType.GREATER: operator.gt,
+    TokenType.GREATER_EQUAL: operator.ge,
+}
+
+
+class CountedLoop:
+    """A while loop of the shape a for statement counting by a constant
+    step desugars to,
+
+        while (i < limit) { body; i = i + step; }
+
+    where i is a local of the frame the loop runs in and the body
+    doesn't assign it, the comparison is any of < <= > >=, the step is
+    a number literal added or subtracted, and the limit is a literal or
+    a variable, which can be read again at no cost.
+
+    The Interpreter runs such a loop with the counter in a Python float,
+    without evaluating the condition and the increment as trees, and
+    stores it in the counter's slot after every increment, where the
+    body and closures read it as usual.
+    """
+
+    def __init__(self, slot, compare, limit, step, body, increment):
+        self.slot = slot                # the counter's slot in the frame
+        self.compare = compare          # function of the counter and the limit
+        self.limit = limit              # Expr, None if the limit is a literal
+        self.bound = None               # the literal limit's value
+        if isinstance(limit, expr.Literal):
+            self.limit = None
+            self.bound = limit.value
+        self.step = step                # signed amount added to the counter
+        self.body = body                # statements before the increment
+        self.increment = increment      # stmt.Expression
+
+    @staticmethod
+    def match(s):
+        """Recognize a counted loop
+
+        :param s: stmt.While
+        :return: CountedLoop, or None if the loop has another shape
+        """
+        condition = s.condition
+        if not (isinstance(condition, expr.Binary)
+                and condition.operator.tokentype in COMPARISONS
+                and isinstance(condition.left, expr.Variable)
+                and condition.left.depth == 0):
+            return None
+        slot = condition.left.slot
+        limit = condition.right
+        if isinstance(limit, expr.Literal):
+            if type(limit.value) is not float:
+                return None
+        elif not isinstance(limit, (expr.Variable, expr.Hoisted)):
+            return None
+
+        block = s.body
+        if not isinstance(block, stmt.Block) or block.frame or not block.statements:
+            return None
+        increment = block.statements[-1]
+        if not isinstance(increment, stmt.Expression):
+            return None
+        assign = increment.expression
+        if not (isinstance(assign, expr.Assign) and assign.depth == 0 and assign.slot == slot):
+            return None
+        step = assign.value
+        if not (isinstance(step, expr.Binary)
+                and step.operator.tokentype in (TokenType.PLUS, TokenType.MINUS)
+                and isinstance(step.left, expr.Variable)
+                and step.left.depth == 0 and step.left.slot == slot
+                and isinstance(step.right, expr.Literal)
+                and type(step.right.value) is float):
+            return None
+        amount = step.right.value
+        if step.operator.tokentype == TokenType.MINUS:
+            amount = -amount
+
+        body = block.statements[:-1]
+        if CountedLoop.assigns(body, slot):
+            return None
+        return CountedLoop(slot, COMPARISONS[condition.operator.tokentype], limit,
+                           amount, body, increment)
+
+    @staticmethod
+    def assigns(value, slot):
+        """Whether a tree assigns the local in slot of the frame it runs
+        in. Nested functions and inlined bodies have frames of their
+        own, and reach the local only through its Cell.
+        """
+        stack = [value]
+        while stack:
+            value = stack.pop()
+            if isinstance(value, list):
+                stack.extend(value)
+            elif isinstance(value, stmt.Function):
+                continue
+            elif isinstance(value, stmt.Class):
+                stack.append(value.superclass)
+            elif isinstance(value, expr.Inline):
+                stack.append(value.call)
+            elif isinstance(value, expr.Assign):
+                if value.depth == 0 and value.slot == slot:
+                    return True
+                stack.append(value.value)
+            elif isinstance(value, (expr.Expr, stmt.Stmt)):
+                stack.extend(getattr(value, name) for name in value.fields)
+        return False
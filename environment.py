@@ -1,50 +1,25 @@
-"""Class to store bindings that map values to variable names"""
-
-from runtimeexception import RuntimeException
+"""Class to store the variables of a local scope"""
 
 
 class Environment:
-    """Environment class"""
-
-    def __init__(self, enclosing=None):
-        self.values = {}
-        self.enclosing = enclosing
+    """Frame of a function call. Values are kept in a list and found by
+    the slot number the resolver gave each variable. The scopes of the
+    blocks inside the function share the frame: a block's variables are
+    appended to it in declaration order and dropped when the block ends,
+    so running a block, or a loop body, allocates nothing.
 
-    def get(self, name):
-        """Look up a variable name
+    Locals of enclosing functions are reached through the function's
+    upvalues. A slot whose variable is captured by a closure holds a
+    Cell rather than the value.
+    """
 
-        :param name: Token
-        :return: Token.lexeme
-        """
-        if name.lexeme in self.values:
-            return self.values.get(name.lexeme, None)
-        if self.enclosing is not None:
-            return self.enclosing.get(name)
-        raise RuntimeException(name, f"Undefined variable '{name.lexeme}'.")
+    __slots__ = ("values",)
 
-    def assign(self, name, value):
-        if name.lexeme in self.values:
-            self.values[name.lexeme] = value
-            return
-        if self.enclosing is not None:
-            self.enclosing.assign(name, value)
-            return
-        raise RuntimeException(name, f"Undefined variable '{name.lexeme}'.")
+    def __init__(self, values=None):
+        self.values = [] if values is None else values
 
-    def define(self, name, value):
-        """Define variables by binding a name to a value. Reassigning
-        variables is allowed.
+    def define(self, symbol, value):
+        """Declare the next variable of the frame. The symbol is only
+        needed by the global environment.
         """
-        self.values[name] = value
-
-    def ancestor(self, distance):
-        environment = self
-        for _ in range(distance):
-            environment = environment.enclosing
-        return environment
-
-    def get_at(self, distance, name):
-        return self.ancestor(distance).values.get(name)
-
-    def assign_at(self, distance, name, value):
-        self.ancestor(distance).values[name.lexeme] = value
+        self.values.append(value)
@@ -4,6 +4,8 @@ from abc import ABC, abstractmethod
 
 class Expr(ABC):
 
+	__slots__ = ()
+
 	@abstractmethod
 	def accept(self, visitor):
 		pass
@@ -22,6 +24,10 @@ class Visitor(ABC):
 	def visit_call_expr(self, expr):
 		pass
 
+	@abstractmethod
+	def visit_conditional_expr(self, expr):
+		pass
+
 	@abstractmethod
 	def visit_get_expr(self, expr):
 		pass
@@ -30,6 +36,14 @@ class Visitor(ABC):
 	def visit_grouping_expr(self, expr):
 		pass
 
+	@abstractmethod
+	def visit_hoisted_expr(self, expr):
+		pass
+
+	@abstractmethod
+	def visit_inline_expr(self, expr):
+		pass
+
 	@abstractmethod
 	def visit_literal_expr(self, expr):
 		pass
@@ -58,110 +72,265 @@ class Visitor(ABC):
 	def visit_variable_expr(self, expr):
 		pass
 
+def dispatch_table(visitor):
+	"""Visitor methods indexed by Expr.kind"""
+	return [
+		visitor.visit_assign_expr,
+		visitor.visit_binary_expr,
+		visitor.visit_call_expr,
+		visitor.visit_conditional_expr,
+		visitor.visit_get_expr,
+		visitor.visit_grouping_expr,
+		visitor.visit_hoisted_expr,
+		visitor.visit_inline_expr,
+		visitor.visit_literal_expr,
+		visitor.visit_logical_expr,
+		visitor.visit_set_expr,
+		visitor.visit_super_expr,
+		visitor.visit_this_expr,
+		visitor.visit_unary_expr,
+		visitor.visit_variable_expr,
+	]
+
 class Assign(Expr):
 
+	__slots__ = ("name", "value", "depth", "slot", "line",)
+	fields = ("name", "value",)
+	extras = ("depth", "slot",)
+	kind = 0
+
 	def __init__(self, name, value):
 		self.name = name
 		self.value = value
+		self.depth = None
+		self.slot = None
+		self.line = name.line
 
 	def accept(self, visitor):
 		return visitor.visit_assign_expr(self)
 
 class Binary(Expr):
 
+	__slots__ = ("left", "operator", "right", "proven", "handler", "line",)
+	fields = ("left", "operator", "right",)
+	extras = ("proven", "handler",)
+	kind = 1
+
 	def __init__(self, left, operator, right):
 		self.left = left
 		self.operator = operator
 		self.right = right
+		self.proven = None
+		self.handler = None
+		self.line = operator.line
 
 	def accept(self, visitor):
 		return visitor.visit_binary_expr(self)
 
 class Call(Expr):
 
+	__slots__ = ("callee", "paren", "arguments", "line",)
+	fields = ("callee", "paren", "arguments",)
+	extras = ()
+	kind = 2
+
 	def __init__(self, callee, paren, arguments):
 		self.callee = callee
 		self.paren = paren
 		self.arguments = arguments
+		self.line = paren.line
 
 	def accept(self, visitor):
 		return visitor.visit_call_expr(self)
 
+class Conditional(Expr):
+
+	__slots__ = ("condition", "then_branch", "else_branch", "line",)
+	fields = ("condition", "then_branch", "else_branch",)
+	extras = ()
+	kind = 3
+
+	def __init__(self, condition, then_branch, else_branch):
+		self.condition = condition
+		self.then_branch = then_branch
+		self.else_branch = else_branch
+		self.line = condition.line if condition is not None else None
+
+	def accept(self, visitor):
+		return visitor.visit_conditional_expr(self)
+
 class Get(Expr):
 
+	__slots__ = ("object", "name", "cache", "line",)
+	fields = ("object", "name",)
+	extras = ("cache",)
+	kind = 4
+
 	def __init__(self, object, name):
 		self.object = object
 		self.name = name
+		self.cache = None
+		self.line = name.line
 
 	def accept(self, visitor):
 		return visitor.visit_get_expr(self)
 
 class Grouping(Expr):
 
+	__slots__ = ("expression", "line",)
+	fields = ("expression",)
+	extras = ()
+	kind = 5
+
 	def __init__(self, expression):
 		self.expression = expression
+		self.line = expression.line if expression is not None else None
 
 	def accept(self, visitor):
 		return visitor.visit_grouping_expr(self)
 
+class Hoisted(Expr):
+
+	__slots__ = ("expression", "slot", "line",)
+	fields = ("expression",)
+	extras = ("slot",)
+	kind = 6
+
+	def __init__(self, expression):
+		self.expression = expression
+		self.slot = None
+		self.line = expression.line if expression is not None else None
+
+	def accept(self, visitor):
+		return visitor.visit_hoisted_expr(self)
+
+class Inline(Expr):
+
+	__slots__ = ("call", "body", "function", "line",)
+	fields = ("call", "body",)
+	extras = ("function",)
+	kind = 7
+
+	def __init__(self, call, body):
+		self.call = call
+		self.body = body
+		self.function = None
+		self.line = None
+
+	def accept(self, visitor):
+		return visitor.visit_inline_expr(self)
+
 class Literal(Expr):
 
+	__slots__ = ("value", "line",)
+	fields = ("value",)
+	extras = ()
+	kind = 8
+
 	def __init__(self, value):
 		self.value = value
+		self.line = None
 
 	def accept(self, visitor):
 		return visitor.visit_literal_expr(self)
 
 class Logical(Expr):
 
+	__slots__ = ("left", "operator", "right", "line",)
+	fields = ("left", "operator", "right",)
+	extras = ()
+	kind = 9
+
 	def __init__(self, left, operator, right):
 		self.left = left
 		self.operator = operator
 		self.right = right
+		self.line = operator.line
 
 	def accept(self, visitor):
 		return visitor.visit_logical_expr(self)
 
 class Set(Expr):
 
+	__slots__ = ("object", "name", "value", "line",)
+	fields = ("object", "name", "value",)
+	extras = ()
+	kind = 10
+
 	def __init__(self, object, name, value):
 		self.object = object
 		self.name = name
 		self.value = value
+		self.line = name.line
 
 	def accept(self, visitor):
 		return visitor.visit_set_expr(self)
 
 class Super(Expr):
 
+	__slots__ = ("keyword", "method", "depth", "slot", "this_depth", "this_slot", "cache", "line",)
+	fields = ("keyword", "method",)
+	extras = ("depth", "slot", "this_depth", "this_slot", "cache",)
+	kind = 11
+
 	def __init__(self, keyword, method):
 		self.keyword = keyword
 		self.method = method
+		self.depth = None
+		self.slot = None
+		self.this_depth = None
+		self.this_slot = None
+		self.cache = None
+		self.line = keyword.line
 
 	def accept(self, visitor):
 		return visitor.visit_super_expr(self)
 
 class This(Expr):
 
+	__slots__ = ("keyword", "depth", "slot", "line",)
+	fields = ("keyword",)
+	extras = ("depth", "slot",)
+	kind = 12
+
 	def __init__(self, keyword):
 		self.keyword = keyword
+		self.depth = None
+		self.slot = None
+		self.line = keyword.line
 
 	def accept(self, visitor):
 		return visitor.visit_this_expr(self)
 
 class Unary(Expr):
 
+	__slots__ = ("operator", "right", "proven", "handler", "line",)
+	fields = ("operator", "right",)
+	extras = ("proven", "handler",)
+	kind = 13
+
 	def __init__(self, operator, right):
 		self.operator = operator
 		self.right = right
+		self.proven = None
+		self.handler = None
+		self.line = operator.line
 
 	def accept(self, visitor):
 		return visitor.visit_unary_expr(self)
 
 class Variable(Expr):
 
+	__slots__ = ("name", "depth", "slot", "line",)
+	fields = ("name",)
+	extras = ("depth", "slot",)
+	kind = 14
+
 	def __init__(self, name):
 		self.name = name
+		self.depth = None
+		self.slot = None
+		self.line = name.line
 
 	def accept(self, visitor):
 		return visitor.visit_variable_expr(self)
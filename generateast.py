@@ -2,15 +2,55 @@
 
 import sys
 
-def define_type(lines, basename, classname, fields):
+# Fields holding the token a node's line number is taken from, in
+# order of preference. Nodes without one borrow the line of the child
+# in CHILD_LINE_FIELDS, and nodes with neither have no line.
+TOKEN_LINE_FIELDS = ("name", "keyword", "operator", "paren")
+CHILD_LINE_FIELDS = ("expression", "condition")
+
+
+def parse_fields(expr_type):
+    """Split a type description into its constructor fields and the
+    extra slots that passes fill in after construction
+    ("Name : field, field | extra, extra")
+    """
+    fields = expr_type.split(":")[1]
+    extras = ""
+    if "|" in fields:
+        fields, extras = fields.split("|")
+    fields = [f.strip() for f in fields.split(",") if f.strip()]
+    extras = [f.strip() for f in extras.split(",") if f.strip()]
+    return fields, extras
+
+
+def line_source(fields):
+    """Expression the generated constructor uses to cache the line"""
+    for name in TOKEN_LINE_FIELDS:
+        if name in fields:
+            return f"{name}.line"
+    for name in CHILD_LINE_FIELDS:
+        if name in fields:
+            return f"{name}.line if {name} is not None else None"
+    return "None"
+
+
+def define_type(lines, basename, classname, kind, fields, extras):
     """Write each expression class (flat class structure)"""
 
+    def names(items):
+        return "".join(f'"{name}", ' for name in items).rstrip()
+
     lines.append(f"class {classname}({basename}):\n\n"
-                 f"\tdef __init__(self, {fields}):\n")
-    fields = fields.split(", ")
-    for field in fields:
-        name = field.split(" ")[0]
+                 f"\t__slots__ = ({names(fields + extras + ['line'])})\n"
+                 f"\tfields = ({names(fields)})\n"
+                 f"\textras = ({names(extras)})\n"
+                 f"\tkind = {kind}\n\n"
+                 f"\tdef __init__(self, {', '.join(fields)}):\n")
+    for name in fields:
         lines.append(f"\t\tself.{name} = {name}\n")
+    for name in extras:
+        lines.append(f"\t\tself.{name} = None\n")
+    lines.append(f"\t\tself.line = {line_source(fields)}\n")
     lines.append("\n")
     lines.append("\tdef accept(self, visitor):\n"
                  f"\t\treturn visitor.visit_{classname.lower()}_{basename.lower()}(self)"
@@ -27,6 +67,20 @@ def define_visitor(lines, basename, types):
                      "\t\tpass\n\n")
 
 
+def define_dispatch(lines, basename, types):
+    """Create a function that lists a visitor's methods by node kind,
+    so visitors can call table[node.kind](node) instead of going
+    through accept()
+    """
+    lines.append("def dispatch_table(visitor):\n"
+                 f"\t\"\"\"Visitor methods indexed by {basename}.kind\"\"\"\n"
+                 "\treturn [\n")
+    for expr_type in types:
+        typename = expr_type.split(":")[0].strip()
+        lines.append(f"\t\tvisitor.visit_{typename.lower()}_{basename.lower()},\n")
+    lines.append("\t]\n\n")
+
+
 def define_ast(output_dir, basename, types):
     """Generate code for syntax tree"""
 
@@ -41,6 +95,8 @@ def define_ast(output_dir, basename, types):
             "\n",
             f"class {basename}(ABC):\n",
             "\n",
+            "\t__slots__ = ()\n",
+            "\n",
             "\t@abstractmethod\n",
             "\tdef accept(self, visitor):\n",
             "\t\tpass"
@@ -48,10 +104,11 @@ def define_ast(output_dir, basename, types):
             "\n"
         ]
         define_visitor(lines, basename, types)
-        for expr_type in types:
+        define_dispatch(lines, basename, types)
+        for kind, expr_type in enumerate(types):
             classname = expr_type.split(":")[0].strip()
-            fields = expr_type.split(":")[1].strip()
-            define_type(lines, basename, classname, fields)
+            fields, extras = parse_fields(expr_type)
+            define_type(lines, basename, classname, kind, fields, extras)
         ast.writelines(lines)
 
 
@@ -64,29 +121,32 @@ def main():
     else:
         output_dir = args[0]
         expr_list = [
-            "Assign   : name, value",
-            "Binary   : left, operator, right",
+            "Assign   : name, value | depth, slot",
+            "Binary   : left, operator, right | proven, handler",
             "Call     : callee, paren, arguments",
-            "Get      : object, name",
+            "Conditional : condition, then_branch, else_branch",
+            "Get      : object, name | cache",
             "Grouping : expression",
+            "Hoisted  : expression | slot",
+            "Inline   : call, body | function",
             "Literal  : value",
             "Logical  : left, operator, right",
             "Set      : object, name, value",
-            "Super    : keyword, method",
-            "This     : keyword",
-            "Unary    : operator, right",
-            "Variable : name"
+            "Super    : keyword, method | depth, slot, this_depth, this_slot, cache",
+            "This     : keyword | depth, slot",
+            "Unary    : operator, right | proven, handler",
+            "Variable : name | depth, slot"
         ]
         stmt_list = [
-            "Block      : statements",
-            "Class      : name, superclass, methods",
+            "Block      : statements | frame",
+            "Class      : name, superclass, methods | captured",
             "Expression : expression",
-            "Function   : name, params, body",
+            "Function   : name, params, body | lazy, upvalues, cells, captured",
             "If         : condition, then_branch, else_branch",
             "Print      : expression",
             "Return     : keyword, value",
-            "Var        : name, initializer",
-            "While      : condition, body"
+            "Var        : name, initializer | captured",
+            "While      : condition, body | hoisted, counted"
         ]
         define_ast(output_dir, "Expr", expr_list)
         define_ast(output_dir, "Stmt", stmt_list)
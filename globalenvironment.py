@@ -0,0 +1,57 @@
+"""Class to store global variables"""
+
+from runtimeexception import RuntimeException
+from symboltable import SymbolTable
+
+# Marks a global slot whose name has not been defined (yet).
+UNDEFINED = object()
+
+
+class GlobalEnvironment:
+    """Outermost scope. Every global lives in the slot given by its
+    SymbolTable id, so a lookup is a list index and a check against
+    UNDEFINED. Since the ids are fixed as soon as a name is scanned, a
+    global can be used in code that runs before its definition, and
+    gets bound whenever the definition executes.
+    """
+
+    def __init__(self):
+        self.values = []
+
+    def get(self, name):
+        """Look up a variable name
+
+        :param name: Token
+        :return: value bound to the name
+        """
+        symbol = name.symbol
+        if symbol < len(self.values):
+            value = self.values[symbol]
+            if value is not UNDEFINED:
+                return value
+        raise RuntimeException(name, f"Undefined variable '{name.lexeme}'.")
+
+    def assign(self, name, value):
+        symbol = name.symbol
+        if symbol < len(self.values) and self.values[symbol] is not UNDEFINED:
+            self.values[symbol] = value
+            return
+        raise RuntimeException(name, f"Undefined variable '{name.lexeme}'.")
+
+    def reserve(self):
+        """Give every name interned so far a slot, so that code can
+        index the values directly and only check for UNDEFINED
+        """
+        missing = len(SymbolTable.names) - len(self.values)
+        if missing > 0:
+            self.values.extend([UNDEFINED] * missing)
+
+    def define(self, symbol, value):
+        """Define variables by binding a name to a value. Reassigning
+        variables is allowed.
+        """
+        if symbol >= len(self.values):
+            # Make room for every name interned so far, not just this one
+            size = max(symbol + 1, len(SymbolTable.names))
+            self.values.extend([UNDEFINED] * (size - len(self.values)))
+        self.values[symbol] = value
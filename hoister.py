@@ -0,0 +1,299 @@
+"""Class that moves loop-invariant expressions out of loops"""
+
+import expr
+import stmt
+
+NOT_COMPUTED = object()   # temporary whose expression raised an error
+
+OPERATORS = (expr.Binary, expr.Conditional, expr.Grouping, expr.Logical, expr.Unary)
+
+
+class Hoister:
+    """Loop-invariant code motion. Within a while loop, an operator
+    expression whose inputs can't change while the loop runs is
+    evaluated once, before the loop, into a temporary, and the loop
+    reads the temporary instead. Inputs are literals and variables:
+
+    - a local of the frame the loop runs in, declared before the loop
+      and not assigned in it
+    - a global or an upvalue not assigned in the loop
+
+    and when the loop makes calls, which may run closures that assign
+    anything they can reach, only locals no closure captured qualify.
+    Operators have no side effects, but they can fail. A temporary whose
+    expression raises holds NOT_COMPUTED, and the loop evaluates the
+    expression in place, so the error happens where it did before.
+
+    Temporaries take the frame slots right after the locals in use when
+    the loop starts, which the While's `hoisted` expressions fill before
+    the first iteration. Locals declared inside the loop move up to make
+    room. A loop in top-level code, outside any block, gets a block of
+    its own to hold them.
+    """
+
+    def __init__(self):
+        self.frame = None       # captured flag of each slot in use, None outside any frame
+        self.hoisted = 0        # expressions hoisted so far
+
+    def hoist(self, statements):
+        """Hoist invariants out of the loops of a resolved program
+
+        :param statements: list of statements, changed in place
+        :return: None
+        """
+        for i, s in enumerate(statements):
+            statements[i] = self.statement(s)
+
+    def hoist_deferred(self, fn, body, size):
+        """Hoist invariants out of the loops of a lazily parsed function
+        body once it is loaded
+
+        :param fn: stmt.Function the body belongs to
+        :param body: resolved list of statements, changed in place
+        :param size: slots the caller fills, 'this' and the parameters
+        :return: None
+        """
+        enclosing = self.frame
+        self.frame = [slot in fn.cells for slot in range(size)]
+        self.hoist(body)
+        self.frame = enclosing
+
+    def statement(self, s):
+        """Hoist out of the loops in a statement
+
+        :return: the statement, or the block that replaces it
+        """
+        if isinstance(s, stmt.Block):
+            if self.frame is None:
+                self.frame = []
+                self.hoist(s.statements)
+                self.frame = None
+            else:
+                size = len(self.frame)
+                self.hoist(s.statements)
+                del self.frame[size:]
+        elif isinstance(s, stmt.Var):
+            self.declare(s.captured)
+        elif isinstance(s, stmt.Function):
+            self.declare(s.captured)
+            self.function(s, len(s.params))
+        elif isinstance(s, stmt.Class):
+            self.declare(s.captured)
+            for method in s.methods:
+                self.function(method, len(method.params) + 1)   # 'this' first
+        elif isinstance(s, stmt.If):
+            s.then_branch = self.statement(s.then_branch)
+            if s.else_branch is not None:
+                s.else_branch = self.statement(s.else_branch)
+        elif isinstance(s, stmt.While):
+            return self.loop(s)
+        return s
+
+    def declare(self, captured):
+        if self.frame is not None:
+            self.frame.append(bool(captured))
+
+    def function(self, fn, size):
+        if fn.body is None:
+            return      # parsed lazily, hoisted when it's loaded
+        enclosing = self.frame
+        self.frame = [slot in fn.cells for slot in range(size)]
+        self.hoist(fn.body)
+        self.frame = enclosing
+
+    def loop(self, s):
+        top = self.frame is None
+        if top:
+            self.frame = []
+        base = len(self.frame)
+        assigned, calls = self.effects(s)
+
+        def invariant(e, known):
+            """Whether e is invariant, given the answer for its operands
+            in known, by id
+            """
+            if isinstance(e, (expr.Literal, expr.Hoisted)):
+                return True
+            if isinstance(e, (expr.Variable, expr.This)):
+                key = (e.depth, e.slot)
+                if key in assigned:
+                    return False
+                if e.depth is not None and e.depth >= 0:
+                    return e.slot < base and not (calls and self.frame[e.slot])
+                return not calls
+            if isinstance(e, OPERATORS):
+                return all(known[id(child)] for child in self.children(e))
+            return False
+
+        temps = []
+
+        def hoist(e):
+            hoisted = expr.Hoisted(e)
+            hoisted.slot = base + len(temps)
+            temps.append(e)
+            return hoisted
+
+        def extract(root):
+            # Invariance is found from the leaves up, then the largest
+            # invariant operators are hoisted from the root down. Both
+            # walks keep their own stack, so that long operator chains
+            # don't exhaust the Python one.
+            known = {}
+            stack = [(root, False)]
+            while stack:
+                e, visited = stack.pop()
+                if visited:
+                    known[id(e)] = invariant(e, known)
+                else:
+                    stack.append((e, True))
+                    stack.extend((child, False) for child in self.children(e))
+            if isinstance(root, OPERATORS) and known[id(root)]:
+                return hoist(root)
+
+            def replace(e):
+                if isinstance(e, OPERATORS) and known[id(e)]:
+                    return hoist(e)
+                stack.append(e)
+                return e
+            stack = [root]
+            while stack:
+                self.replace_children(stack.pop(), replace)
+            return root
+
+        s.condition = extract(s.condition)
+        self.expressions(s.body, extract)
+        if not temps:
+            if top:
+                self.frame = None
+            s.body = self.statement(s.body)
+            if not top:
+                del self.frame[base:]
+            return s
+
+        self.renumber(s, base, len(temps))
+        s.hoisted = temps
+        self.hoisted += len(temps)
+        self.frame.extend(False for _ in temps)
+        if top:
+            # The loop's blocks now share the frame of the block below
+            for node in self.nodes(s.body):
+                if isinstance(node, stmt.Block):
+                    node.frame = False
+        s.body = self.statement(s.body)
+        del self.frame[base:]
+        if top:
+            self.frame = None
+            block = stmt.Block([s])
+            block.frame = True
+            return block
+        return s
+
+    def effects(self, s):
+        """What a loop may change while it runs
+
+        :param s: stmt.While
+        :return: (set of (depth, slot) of the variables it assigns,
+            whether it makes calls)
+        """
+        assigned = set()
+        calls = False
+        for node in self.nodes([s.condition, s.body]):
+            if isinstance(node, expr.Assign):
+                assigned.add((node.depth, node.slot))
+            elif isinstance(node, (expr.Call, expr.Inline)):
+                calls = True
+        return assigned, calls
+
+    def expressions(self, s, replace):
+        """Apply replace to each expression a statement evaluates in the
+        current frame, leaving nested functions out
+        """
+        if isinstance(s, stmt.Block):
+            for statement in s.statements:
+                self.expressions(statement, replace)
+        elif isinstance(s, (stmt.Expression, stmt.Print)):
+            s.expression = replace(s.expression)
+        elif isinstance(s, stmt.Return):
+            if s.value is not None:
+                s.value = replace(s.value)
+        elif isinstance(s, stmt.Var):
+            if s.initializer is not None:
+                s.initializer = replace(s.initializer)
+        elif isinstance(s, stmt.Class):
+            if s.superclass is not None:
+                s.superclass = replace(s.superclass)
+        elif isinstance(s, stmt.If):
+            s.condition = replace(s.condition)
+            self.expressions(s.then_branch, replace)
+            if s.else_branch is not None:
+                self.expressions(s.else_branch, replace)
+        elif isinstance(s, stmt.While):
+            s.condition = replace(s.condition)
+            self.expressions(s.body, replace)
+
+    def children(self, e):
+        """The operands of an expression that replace_children replaces"""
+        if isinstance(e, expr.Hoisted):
+            return []
+        if isinstance(e, expr.Inline):
+            e = e.call
+        children = []
+        for name in e.fields:
+            child = getattr(e, name)
+            if isinstance(child, expr.Expr):
+                children.append(child)
+            elif isinstance(child, list):
+                children.extend(child)
+        return children
+
+    def replace_children(self, e, replace):
+        if isinstance(e, expr.Hoisted):
+            return      # shared with the loop it was hoisted out of
+        if isinstance(e, expr.Inline):
+            e = e.call      # the body runs in a frame of its own
+        for name in e.fields:
+            child = getattr(e, name)
+            if isinstance(child, expr.Expr):
+                setattr(e, name, replace(child))
+            elif isinstance(child, list):
+                child[:] = [replace(item) for item in child]
+
+    def renumber(self, s, base, count):
+        """Move the slots from base up by count in a loop, making room
+        for its temporaries
+        """
+        for node in self.nodes([s.condition, s.body]):
+            if isinstance(node, (expr.Assign, expr.This, expr.Variable)):
+                if node.depth == 0 and node.slot >= base:
+                    node.slot += count
+            elif isinstance(node, expr.Super):
+                if node.depth == 0 and node.slot >= base:
+                    node.slot += count
+                if node.this_depth == 0 and node.this_slot >= base:
+                    node.this_slot += count
+            elif isinstance(node, stmt.Function):
+                node.upvalues = [
+                    (depth, slot + count if depth == 0 and slot >= base else slot)
+                    for depth, slot in node.upvalues]
+
+    def nodes(self, value):
+        """Every node of a tree that runs in the current frame. Nested
+        functions are included, but not their bodies.
+        """
+        stack = [value]
+        while stack:
+            value = stack.pop()
+            if isinstance(value, list):
+                stack.extend(value)
+            elif isinstance(value, stmt.Function):
+                yield value
+            elif isinstance(value, stmt.Class):
+                yield value
+                stack.append(value.superclass)
+                stack.extend(value.methods)
+            elif isinstance(value, expr.Inline):
+                yield value
+                stack.append(value.call)
+            elif isinstance(value, (expr.Expr, stmt.Stmt)):
+                yield value
+                stack.extend(getattr(value, name) for name in value.fields)
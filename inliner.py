@@ -0,0 +1,201 @@
+"""Class that inlines calls to small global functions"""
+
+import expr
+import stmt
+
+
+class Inliner:
+    """Replaces calls to small global functions by the function's body.
+    A function qualifies when its body is nothing but if statements and
+    returns, which turn into a single expression, and when that
+    expression has at most `threshold` nodes. It must also:
+
+    - be declared once, at the top level, and its name never assigned
+    - not be recursive, directly or through other inlined functions
+    - not close over anything, which a global function with no nested
+      functions never does
+    - be parsed already, lazily parsed bodies can't be inlined
+
+    A call is inlined if its callee is the function's name and it passes
+    the right number of arguments. The Inline node still evaluates the
+    name and falls back to the call when it doesn't hold the function,
+    so calls made before the declaration runs, or after the name is
+    redeclared in the prompt, behave as before.
+
+    The inlined expression keeps the function's slots: it runs in a
+    frame holding the arguments, as the function would.
+    """
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.functions = {}     # symbol -> stmt.Function that can be inlined
+        self.bodies = {}        # symbol -> its body as an expression
+        self.inlined = 0        # call sites inlined so far
+
+    def inline(self, statements):
+        """Inline calls throughout a resolved program. Functions found
+        in earlier programs, in the prompt or a stream, stay inlinable
+        until they are redeclared.
+
+        :param statements: list of statements
+        :return: None
+        """
+        declared = {}
+        for s in statements:
+            if isinstance(s, (stmt.Class, stmt.Function, stmt.Var)):
+                declared.setdefault(s.name.symbol, []).append(s)
+        assigned = self.assigned(statements)
+        for symbol in list(self.functions):
+            if symbol in declared or symbol in assigned:
+                del self.functions[symbol]
+                del self.bodies[symbol]
+
+        candidates = {}
+        for symbol, declarations in declared.items():
+            fn = declarations[0]
+            if (len(declarations) == 1 and isinstance(fn, stmt.Function)
+                    and symbol not in assigned and fn.body is not None
+                    and not fn.upvalues and not fn.cells
+                    and self.as_expression(fn.body) is not None):
+                candidates[symbol] = fn
+        for fn in self.order(candidates):
+            # Callees come first, so their calls in fn are inlined
+            # before fn's own body is measured.
+            self.rewrite(fn.body)
+            body = self.as_expression(fn.body)
+            if body is not None and self.size(body) <= self.threshold:
+                self.functions[fn.name.symbol] = fn
+                self.bodies[fn.name.symbol] = body
+        self.rewrite(statements)
+
+    def inline_deferred(self, body):
+        """Inline calls in a lazily parsed function body once it is
+        loaded, to the functions found inlinable so far
+
+        :param body: resolved list of statements, changed in place
+        :return: None
+        """
+        self.rewrite(body)
+
+    def order(self, candidates):
+        """Candidates that don't reach themselves through the names they
+        mention, each after the candidates it mentions
+
+        :param candidates: symbol -> stmt.Function
+        :return: list of stmt.Function
+        """
+        mentions = {symbol: self.globals_in(fn.body) & candidates.keys()
+                    for symbol, fn in candidates.items()}
+        recursive = set()
+        for symbol in candidates:
+            seen = set()
+            stack = list(mentions[symbol])
+            while stack:
+                other = stack.pop()
+                if other == symbol:
+                    recursive.add(symbol)
+                    break
+                if other not in seen:
+                    seen.add(other)
+                    stack.extend(mentions[other])
+
+        ordered = []
+        visited = set()
+
+        def visit(symbol):
+            visited.add(symbol)
+            for other in mentions[symbol]:
+                if other not in visited and other not in recursive:
+                    visit(other)
+            ordered.append(candidates[symbol])
+
+        for symbol in candidates:
+            if symbol not in visited and symbol not in recursive:
+                visit(symbol)
+        return ordered
+
+    def as_expression(self, statements):
+        """The value a function body returns, as an expression
+
+        :param statements: rest of the body from some point on
+        :return: Expr, or None if the body does more than return
+        """
+        if not statements:
+            return expr.Literal(None)
+        s, rest = statements[0], statements[1:]
+        if isinstance(s, stmt.Return):
+            return s.value if s.value is not None else expr.Literal(None)
+        if isinstance(s, stmt.Block):
+            return self.as_expression(s.statements + rest)
+        if isinstance(s, stmt.If):
+            then_branch = self.as_expression([s.then_branch] + rest)
+            if s.else_branch is not None:
+                else_branch = self.as_expression([s.else_branch] + rest)
+            else:
+                else_branch = self.as_expression(rest)
+            if then_branch is None or else_branch is None:
+                return None
+            return expr.Conditional(s.condition, then_branch, else_branch)
+        return None
+
+    def rewrite(self, value):
+        """Replace the calls to inlinable functions in a tree"""
+        stack = [value]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, list):
+                for i, item in enumerate(node):
+                    node[i] = self.inlined_call(item)
+                stack.extend(node)
+            elif isinstance(node, expr.Inline):
+                # The body was rewritten with its function
+                stack.append(node.call.arguments)
+            elif isinstance(node, (expr.Expr, stmt.Stmt)):
+                for name in node.fields:
+                    child = self.inlined_call(getattr(node, name))
+                    setattr(node, name, child)
+                    stack.append(child)
+
+    def inlined_call(self, node):
+        if not isinstance(node, expr.Call):
+            return node
+        callee = node.callee
+        if not isinstance(callee, expr.Variable) or callee.depth is not None:
+            return node
+        fn = self.functions.get(callee.name.symbol)
+        if fn is None or len(fn.params) != len(node.arguments):
+            return node
+        inline = expr.Inline(node, self.bodies[callee.name.symbol])
+        inline.function = fn
+        self.inlined += 1
+        return inline
+
+    def assigned(self, statements):
+        """Symbols of every name assigned in a tree. A lazily parsed
+        body may assign any name it mentions.
+        """
+        symbols = set()
+        for node in self.nodes(statements):
+            if isinstance(node, expr.Assign):
+                symbols.add(node.name.symbol)
+            elif isinstance(node, stmt.Function) and node.body is None:
+                symbols.update(node.lazy.symbols)
+        return symbols
+
+    def globals_in(self, statements):
+        return {node.name.symbol for node in self.nodes(statements)
+                if isinstance(node, expr.Variable) and node.depth is None}
+
+    def size(self, e):
+        return sum(1 for _ in self.nodes(e))
+
+    def nodes(self, value):
+        """Every node of a tree, including inlined bodies"""
+        stack = [value]
+        while stack:
+            value = stack.pop()
+            if isinstance(value, list):
+                stack.extend(value)
+            elif isinstance(value, (expr.Expr, stmt.Stmt)):
+                yield value
+                stack.extend(getattr(value, name) for name in value.fields)
@@ -2,32 +2,123 @@
 
 import clock
 import expr
+import operator
+import parser
 import stmt
+from cell import Cell
+from countedloop import CountedLoop
 from environment import Environment
+from globalenvironment import UNDEFINED, GlobalEnvironment
+from hoister import NOT_COMPUTED
 from loxcallable import LoxCallable
 from loxclass import LoxClass
 from loxfunction import LoxFunction
 from loxinstance import LoxInstance
 from returnvalue import Return
 from runtimeexception import RuntimeException
+from symboltable import CLOCK, INIT
 from tokentypes import TokenType
 
+# Classes whose methods an inline cache remembers
+CACHE_SIZE = 4
+
+
+def proven(function):
+    """Handler of a Binary node whose operand types were proven"""
+    def handler(e, left, right):
+        return function(left, right)
+    return handler
+
+
+def numbers(function, fallback):
+    """Handler of a Binary node that has seen only numbers"""
+    def handler(e, left, right):
+        if type(left) is float and type(right) is float:
+            return function(left, right)
+        # Something else turned up, so stop guessing
+        e.handler = fallback
+        return fallback(e, left, right)
+    return handler
+
+
+def strings(function, fallback):
+    """Handler of a Binary node that has seen only strings"""
+    def handler(e, left, right):
+        if type(left) is str and type(right) is str:
+            return function(left, right)
+        e.handler = fallback
+        return fallback(e, left, right)
+    return handler
+
+
+def number(function, fallback):
+    """Handler of a Unary node that has seen only numbers"""
+    def handler(e, right):
+        if type(right) is float:
+            return function(right)
+        e.handler = fallback
+        return fallback(e, right)
+    return handler
+
+
+def negation(e, right):
+    return right is None or right is False
+
+
+def minus(e, right):
+    return -right
+
 
 class Interpreter(expr.Visitor, stmt.Visitor):
     """Using the visitor pattern, execute the syntax tree itself"""
 
+    function_class = LoxFunction    # runtime representation of functions
+
     def __init__(self):
-        self.globals = Environment()     # fixed reference to outermost global scope
+        self.globals = GlobalEnvironment()     # fixed reference to outermost global scope
         self.environment = self.globals              # keeps track of current environment
-        self.globals.define("clock", clock.Clock())  # add 'clock' key:val to the global environment
-        self.locals = {}
-
-    def interpret(self, statements):
+        self.frame = Environment()                   # locals of blocks in top-level code
+        self.upvalues = []                           # cells the running function closed over
+        self.globals.define(CLOCK, clock.Clock())  # add 'clock' to its slot in the global environment
+        self.expr_dispatch = expr.dispatch_table(self)  # visit methods by node kind
+        self.stmt_dispatch = stmt.dispatch_table(self)
+        # Operators whose operand types were proven, without the checks
+        self.unchecked = {
+            TokenType.MINUS: operator.sub,
+            TokenType.SLASH: operator.truediv,
+            TokenType.STAR: operator.mul,
+            TokenType.PLUS: operator.add,
+            TokenType.GREATER: operator.gt,
+            TokenType.GREATER_EQUAL: operator.ge,
+            TokenType.LESS: operator.lt,
+            TokenType.LESS_EQUAL: operator.le,
+        }
+        # Handlers of Binary and Unary nodes, see specialize_binary
+        self.proven_handlers = {
+            tokentype: proven(function) for tokentype, function in self.unchecked.items()}
+        self.number_handlers = {
+            TokenType.PLUS: numbers(operator.add, self.checked_plus)}
+        for tokentype, function in self.unchecked.items():
+            self.number_handlers.setdefault(tokentype, numbers(function, self.checked_binary))
+        self.string_plus = strings(operator.add, self.checked_plus)
+        self.number_minus = number(operator.neg, self.checked_minus)
+
+    def interpret(self, statements, path=None):
+        """Run a resolved program
+
+        :param statements: list of statements
+        :param path: script the program was read from, when engines
+            that compile it may cache the result next to it
+        :return: None
+        """
         try:
-            for s in statements:
-                self.execute(s)
+            self.execute_all(statements, path)
         except RuntimeError as e:
             RuntimeException(e)
+        except parser.ParseError:
+            # A lazily parsed function body had errors, which have
+            # already been reported.
+            pass
 
     def visit_print_stmt(self, s):
         value = self.evaluate(s.expression)
@@ -44,24 +135,102 @@ class Interpreter(expr.Visitor, stmt.Visitor):
         value = None
         if s.initializer is not None:
             value = self.evaluate(s.initializer)
-        self.environment.define(s.name.lexeme, value)
+        if s.captured:
+            value = Cell(value)
+        self.environment.define(s.name.symbol, value)
         return None
 
     def visit_while_stmt(self, s):
         """Execute the while statment body until the condition is no
         longer true
         """
+        hoisted = s.hoisted
+        if hoisted is not None:
+            # Loop invariants go in temporaries at the top of the frame
+            values = self.environment.values
+            base = len(values)
+            for e in hoisted:
+                try:
+                    values.append(self.evaluate(e))
+                except (RuntimeException, ArithmeticError):
+                    # Raised again by the loop, if it gets that far
+                    values.append(NOT_COMPUTED)
+        self.loop(s)
+        if hoisted is not None:
+            del values[base:]
+        return None
+
+    def loop(self, s):
+        """Run the body of a while statement while its condition holds"""
+        counted = s.counted
+        if counted is None:
+            counted = s.counted = CountedLoop.match(s) or False
+        if counted and self.count(counted):
+            return
         while self.is_truthy(self.evaluate(s.condition)):
             self.execute(s.body)
-        return None
+
+    def count(self, loop):
+        """Run a counted loop with its counter in a Python float
+
+        :param loop: CountedLoop
+        :return: True once the loop is over, False if the counter or the
+            limit isn't a number, in which case the loop goes on as a
+            plain while loop from the current iteration
+        """
+        values = self.environment.values
+        base = len(values)
+        slot = loop.slot
+        cell = values[slot]
+        if type(cell) is Cell:
+            value = cell.value
+        else:
+            value = cell
+            cell = None
+        compare = loop.compare
+        limit = loop.limit
+        bound = loop.bound
+        step = loop.step
+        body = loop.body
+        execute = self.execute
+        while True:
+            if type(value) is not float:
+                return False
+            if limit is not None:
+                bound = self.evaluate(limit)
+                if type(bound) is not float:
+                    return False
+            if not compare(value, bound):
+                return True
+            for statement in body:
+                execute(statement)
+            del values[base:]
+            if cell is None:
+                value += step
+                values[slot] = value
+            else:
+                # A closure may have assigned the counter
+                value = cell.value
+                if type(value) is not float:
+                    execute(loop.increment)     # raises the operand error
+                    return False
+                value += step
+                cell.value = value
 
     def visit_assign_expr(self, e):
         value = self.evaluate(e.value)
-        distance = self.locals.get(e, None)
-        if distance:
-            self.environment.assign_at(distance, e.name, value)
-        else:
+        depth = e.depth
+        if depth is None:
             self.globals.assign(e.name, value)
+        elif depth < 0:
+            self.upvalues[e.slot].value = value
+        else:
+            values = self.environment.values
+            current = values[e.slot]
+            if type(current) is Cell:
+                current.value = value
+            else:
+                values[e.slot] = value
         return value
 
     def visit_expression_stmt(self, s):
@@ -73,11 +242,33 @@ class Interpreter(expr.Visitor, stmt.Visitor):
         convert it to its runtime representation
         """
 
-        function = LoxFunction(s, self.environment, False)
-        # Bind fn to a var in current environment
-        self.environment.define(s.name.lexeme, function)
+        if s.captured:
+            # The function may capture itself, so its cell must exist
+            # before the closure is made
+            cell = Cell(None)
+            self.environment.define(s.name.symbol, cell)
+            cell.value = self.function_class(s, self.capture(s), False)
+        else:
+            function = self.function_class(s, self.capture(s), False)
+            # Bind fn to a var in current environment
+            self.environment.define(s.name.symbol, function)
         return None
 
+    def capture(self, fn):
+        """Collect the cells a function closes over, from the scope it
+        is being declared in
+
+        :param fn: stmt.Function
+        :return: list of Cell
+        """
+        cells = []
+        for depth, slot in fn.upvalues:
+            if depth < 0:
+                cells.append(self.upvalues[slot])
+            else:
+                cells.append(self.environment.values[slot])
+        return cells
+
     def visit_if_stmt(self, s):
         """Execute if branch if it evaluates to True. Otherwise 
         execute the else branch (if there is one)
@@ -89,22 +280,60 @@ class Interpreter(expr.Visitor, stmt.Visitor):
             self.execute(s.else_branch)
         return None
 
+    def visit_conditional_expr(self, e):
+        if self.is_truthy(self.evaluate(e.condition)):
+            return self.evaluate(e.then_branch)
+        return self.evaluate(e.else_branch)
+
+    def visit_hoisted_expr(self, e):
+        value = self.environment.values[e.slot]
+        if value is NOT_COMPUTED:
+            return self.evaluate(e.expression)
+        return value
+
+    def visit_inline_expr(self, e):
+        """Evaluate the body of an inlined function in a frame of its
+        own, as a call would, but without the call. If the function's
+        name no longer refers to it, make the call after all.
+        """
+
+        call = e.call
+        callee = self.evaluate(call.callee)
+        if type(callee) is not self.function_class or callee.declaration is not e.function:
+            return self.call(callee, call)
+        arguments = [self.evaluate(argument) for argument in call.arguments]
+        previous = self.environment
+        self.environment = Environment(arguments)
+        try:
+            return self.evaluate(e.body)
+        finally:
+            self.environment = previous
+
     def visit_literal_expr(self, e):
         """Evaluate literal expressions"""
 
         return e.value
 
     def visit_logical_expr(self, e):
-        """Evaluate logical expressions"""
+        """Evaluate logical expressions. A chain of them, as in
+        a or b or c, is evaluated in a loop, like a chain of binary
+        operators.
+        """
 
-        left = self.evaluate(e.left)
-        if e.operator.tokentype == TokenType.OR:
-            if self.is_truthy(left):
-                return left
-        else:
-            if not self.is_truthy(left):
-                return left
-        return self.evaluate(e.right)
+        chain = []
+        while type(e) is expr.Logical:
+            chain.append(e)
+            e = e.left
+        value = self.evaluate(e)
+        for e in reversed(chain):
+            if e.operator.tokentype == TokenType.OR:
+                if self.is_truthy(value):
+                    continue
+            else:
+                if not self.is_truthy(value):
+                    continue
+            value = self.evaluate(e.right)
+        return value
 
     def visit_set_expr(self, e):
         object = self.evaluate(e.object)
@@ -113,18 +342,40 @@ class Interpreter(expr.Visitor, stmt.Visitor):
                 e.name, "Only instances have fields."
             )
         value = self.evaluate(e.value)
-        object.set(e.name, value)
+        object.fields[e.name.symbol] = value
         return value
 
     def visit_super_expr(self, e):
-        distance = self.locals.get(e)
-        superclass = self.environment.get_at(distance, "super")
-        object = self.environment.get_at(distance - 1, "this")
-        method = superclass.find_method(e.method.lexeme)
+        superclass = self.read(e.depth, e.slot)
+        object = self.read(e.this_depth, e.this_slot)
+        cache = e.cache
+        if cache is not None:
+            method = cache.get(superclass)
+            if method is not None:
+                return method.bind(object)
+        return self.find_method(e, superclass, e.method).bind(object)
+
+    def find_method(self, e, klass, name):
+        """Look a method up in a class and its superclasses, and
+        remember it in the inline cache of the Get or Super node that
+        needs it. Classes never change once created, so the entries
+        stay valid. A cache holds the methods of at most CACHE_SIZE
+        classes; sites seeing more look the others up every time.
+
+        :param e: Get or Super
+        :param klass: LoxClass to start from
+        :param name: Token naming the method
+        :return: the unbound method
+        """
+        method = klass.find_method(name.symbol)
         if method is None:
-            raise RuntimeException(e.method,
-                f"Undefined property '{e.method.lexeme}'.")
-        return method.bind(object)
+            raise RuntimeException(name, f"Undefined property '{name.lexeme}'.")
+        cache = e.cache
+        if cache is None:
+            cache = e.cache = {}
+        if len(cache) < CACHE_SIZE:
+            cache[klass] = method
+        return method
 
     def visit_this_expr(self, e):
         return self.lookup_variable(e.keyword, e)
@@ -135,28 +386,64 @@ class Interpreter(expr.Visitor, stmt.Visitor):
         return self.evaluate(e.expression)
 
     def visit_unary_expr(self, e):
-        """Evaluate unary expressions"""
+        """Evaluate unary expressions with the handler the node was
+        specialized to the first time it ran
+        """
 
         right = self.evaluate(e.right)
+        handler = e.handler
+        if handler is None:
+            handler = e.handler = self.specialize_unary(e, right)
+        return handler(e, right)
 
-        unary_map = {
-            TokenType.BANG: lambda right: not self.is_truthy(right),
-            TokenType.MINUS: lambda right, op=e.operator: (
-                -float(right) if self.check_number_operand(op, right) else None
-            ),
-        }
+    def specialize_unary(self, e, right):
+        """Pick the handler of a Unary node from its operator and the
+        type of its first operand
 
-        return unary_map.get(e.operator.tokentype, None)(right)
+        :return: function taking the node and the operand's value
+        """
+        if e.operator.tokentype == TokenType.BANG:
+            return negation
+        if e.proven:
+            return minus
+        if type(right) is float:
+            return self.number_minus
+        return self.checked_minus
+
+    def checked_minus(self, e, right):
+        self.check_number_operand(e.operator, right)
+        return -right
 
     def visit_variable_expr(self, e):
         return self.lookup_variable(e.name, e)
 
     def lookup_variable(self, name, e):
-        distance = self.locals.get(e, None)         # Python dict built-in get()
-        if distance is not None:                    # Looking for an int, not a boolean
-            return self.environment.get_at(distance, name.lexeme)
+        depth = e.depth                             # None for globals
+        if depth is not None:
+            if depth < 0:
+                return self.upvalues[e.slot].value
+            value = self.environment.values[e.slot]
+            if type(value) is Cell:                 # captured by a closure
+                return value.value
+            return value
         else:
-            return self.globals.get(name)           # Environment method get(), not python's
+            # Global slot, which is the symbol id
+            values = self.globals.values
+            slot = e.slot
+            if slot < len(values):
+                value = values[slot]
+                if value is not UNDEFINED:
+                    return value
+            return self.globals.get(name)           # raises the undefined variable error
+
+    def read(self, depth, slot):
+        """Value of a local or upvalue the resolver found at depth, slot"""
+        if depth < 0:
+            return self.upvalues[slot].value
+        value = self.environment.values[slot]
+        if type(value) is Cell:
+            return value.value
+        return value
 
     def check_number_operand(self, operator, operand):
         if isinstance(operand, float):
@@ -205,13 +492,15 @@ class Interpreter(expr.Visitor, stmt.Visitor):
         implementation
         """
 
-        return e.accept(self)
+        return self.expr_dispatch[e.kind](e)
 
     def execute(self, statement):
-        statement.accept(self)
+        self.stmt_dispatch[statement.kind](statement)
 
-    def resolve(self, e, depth):
-        self.locals[e] = depth
+    def execute_all(self, statements, path=None):
+        """Run a program's top-level statements"""
+        for s in statements:
+            self.execute(s)
 
     def execute_block(self, statements, environment):
         previous = self.environment
@@ -223,7 +512,22 @@ class Interpreter(expr.Visitor, stmt.Visitor):
             self.environment = previous
 
     def visit_block_stmt(self, s):
-        self.execute_block(s.statements, Environment(self.environment))
+        """Run a block in the current frame. Its variables are appended
+        to the frame and dropped again when it ends.
+        """
+
+        if s.frame:
+            try:
+                self.execute_block(s.statements, self.frame)
+            finally:
+                self.frame.values.clear()
+            return None
+        values = self.environment.values
+        base = len(values)
+        dispatch = self.stmt_dispatch
+        for statement in s.statements:
+            dispatch[statement.kind](statement)
+        del values[base:]
         return None
 
     def visit_class_stmt(self, s):
@@ -233,19 +537,32 @@ class Interpreter(expr.Visitor, stmt.Visitor):
             if not isinstance(superclass, LoxClass):
                 raise RuntimeException(
                     s.superclass.name, "Superclass must be a class.")
-        self.environment.define(s.name.lexeme, None)
+        # The class's slot is taken before the one holding 'super'. When
+        # methods capture the class, they capture its cell before the
+        # class exists.
+        environment = self.environment
+        slot = len(environment.values)
+        cell = Cell(None) if s.captured else None
+        environment.define(s.name.symbol, cell)
         if s.superclass:
-            self.environment = Environment(self.environment)
-            self.environment.define("super", superclass)
+            if environment is self.globals:
+                self.environment = self.frame
+            self.environment.values.append(Cell(superclass))
         methods = {}
         for method in s.methods:
-            fn = LoxFunction(
-                method, self.environment, method.name.lexeme == "init")
-            methods[method.name.lexeme] = fn
+            fn = self.function_class(
+                method, self.capture(method), method.name.symbol == INIT)
+            methods[method.name.symbol] = fn
         klass = LoxClass(s.name.lexeme, superclass, methods)
         if superclass:
-            self.environment = self.environment.enclosing
-        self.environment.assign(s.name, klass)
+            self.environment.values.pop()
+            self.environment = environment
+        if cell is not None:
+            cell.value = klass
+        elif environment is self.globals:
+            environment.define(s.name.symbol, klass)
+        else:
+            environment.values[slot] = klass
         return None
 
     def handle_arithmetic_operator(self, left, right, op):
@@ -260,62 +577,78 @@ class Interpreter(expr.Visitor, stmt.Visitor):
         )
 
     def visit_binary_expr(self, e):
-        """Evaluate binary expressions"""
+        """Evaluate binary expressions with the handler the node was
+        specialized to the first time it ran
+        """
 
+        if type(e.left) is expr.Binary:
+            return self.binary_chain(e)
         left = self.evaluate(e.left)
         right = self.evaluate(e.right)
-
-        binary_map = {
-            TokenType.MINUS: lambda left, right, op=e.operator: (
-                float(left) - float(right)
-                if self.check_number_operands(op, left, right)
-                else None
-            ),
-            TokenType.SLASH: lambda left, right, op=e.operator: (
-                float(left) / float(right)
-                if self.check_number_operands(op, left, right)
-                else None
-            ),
-            TokenType.STAR: lambda left, right, op=e.operator: (
-                float(left) * float(right)
-                if self.check_number_operands(op, left, right)
-                else None
-            ),
-            TokenType.PLUS: lambda left, right, op=e.operator: self.handle_arithmetic_operator(
-                left, right, op
-            ),
-            TokenType.GREATER: lambda left, right, op=e.operator: (
-                float(left) > float(right)
-                if self.check_number_operands(op, left, right)
-                else None
-            ),
-            TokenType.GREATER_EQUAL: lambda left, right, op=e.operator: (
-                float(left) >= float(right)
-                if self.check_number_operands(op, left, right)
-                else None
-            ),
-            TokenType.LESS: lambda left, right, op=e.operator: (
-                float(left) < float(right)
-                if self.check_number_operands(op, left, right)
-                else None
-            ),
-            TokenType.LESS_EQUAL: lambda left, right, op=e.operator: (
-                float(left) <= float(right)
-                if self.check_number_operands(op, left, right)
-                else None
-            ),
-            TokenType.BANG_EQUAL: lambda left, right: not self.is_equal(
-                left, right
-            ),
-            TokenType.EQUAL_EQUAL: lambda left, right: self.is_equal(
-                left, right
-            ),
-        }
-
-        return binary_map.get(e.operator.tokentype, None)(left, right)
+        handler = e.handler
+        if handler is None:
+            handler = e.handler = self.specialize_binary(e, left, right)
+        return handler(e, left, right)
+
+    def binary_chain(self, e):
+        """Evaluate a left-associative chain of operators, as in
+        a + b + c, in a loop rather than by recursing into each left
+        operand, so that its length isn't bound by the Python stack
+        """
+        chain = []
+        while type(e) is expr.Binary:
+            chain.append(e)
+            e = e.left
+        left = self.evaluate(e)
+        for e in reversed(chain):
+            right = self.evaluate(e.right)
+            handler = e.handler
+            if handler is None:
+                handler = e.handler = self.specialize_binary(e, left, right)
+            left = handler(e, left, right)
+        return left
+
+    def specialize_binary(self, e, left, right):
+        """Pick the handler of a Binary node from its operator and the
+        types of its first operands. A handler specialized for numbers
+        or strings puts the checked one in its place the first time
+        other operands turn up.
+
+        :return: function taking the node and the operands' values
+        """
+        tokentype = e.operator.tokentype
+        if tokentype == TokenType.EQUAL_EQUAL:
+            return self.equal
+        if tokentype == TokenType.BANG_EQUAL:
+            return self.not_equal
+        if e.proven:
+            return self.proven_handlers[tokentype]
+        if type(left) is float and type(right) is float:
+            return self.number_handlers[tokentype]
+        if tokentype == TokenType.PLUS:
+            if type(left) is str and type(right) is str:
+                return self.string_plus
+            return self.checked_plus
+        return self.checked_binary
+
+    def equal(self, e, left, right):
+        return self.is_equal(left, right)
+
+    def not_equal(self, e, left, right):
+        return not self.is_equal(left, right)
+
+    def checked_plus(self, e, left, right):
+        return self.handle_arithmetic_operator(left, right, e.operator)
+
+    def checked_binary(self, e, left, right):
+        self.check_number_operands(e.operator, left, right)
+        return self.unchecked[e.operator.tokentype](left, right)
 
     def visit_call_expr(self, e):
-        callee = self.evaluate(e.callee)
+        return self.call(self.evaluate(e.callee), e)
+
+    def call(self, callee, e):
+        """Call what the callee of a Call node evaluated to"""
         arguments = []
         for argument in e.arguments:
             arguments.append(self.evaluate(argument))
@@ -329,7 +662,22 @@ class Interpreter(expr.Visitor, stmt.Visitor):
         return function.call(self, arguments)
 
     def visit_get_expr(self, e):
+        """Read a field, or bind a method found through the node's
+        inline cache. Fields shadow methods, so they are looked at
+        first, on every access.
+        """
         object = self.evaluate(e.object)
+        if type(object) is LoxInstance:
+            fields = object.fields
+            symbol = e.name.symbol
+            if symbol in fields:
+                return fields[symbol]
+            cache = e.cache
+            if cache is not None:
+                method = cache.get(object.klass)
+                if method is not None:
+                    return method.bind(object)
+            return self.find_method(e, object.klass, e.name).bind(object)
         if isinstance(object, LoxInstance):
             return object.get(e.name)
         raise RuntimeException(
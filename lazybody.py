@@ -0,0 +1,65 @@
+"""Deferred function body"""
+
+import lox
+import parser
+import tokenclass
+from resolver import Resolver
+from tokentypes import TokenType
+
+
+class LazyBody:
+    """Body of a function that was only brace-matched when the program
+    was parsed. It holds the tokens between the braces, the names they
+    mention and, once the declaration has been resolved, the resolver
+    state the body needs. The body is parsed and resolved the first
+    time the function runs.
+    """
+
+    def __init__(self, tokens, start, end, symbols):
+        self.tokens = tokens      # token source, list or TokenArray
+        self.start = start        # first token after the opening brace
+        self.end = end            # position of the closing brace
+        self.symbols = symbols    # ids of every name used in the body
+        self.outer = None
+        self.fn_type = None
+        self.cls_type = None
+
+    def defer(self, outer, fn_type, cls_type):
+        """Record the resolver state at the point where the body would
+        have been resolved. Only the outer locals visible at that point
+        are kept, so names declared later in an enclosing block stay
+        invisible to the body, as they would be if it had been resolved
+        right away.
+
+        :param outer: symbol -> upvalue index of the outer locals the
+            body may use
+        :param fn_type: Resolver.FunctionType of the function
+        :param cls_type: Resolver.ClassType of the enclosing class
+        :return: None
+        """
+        self.outer = outer
+        self.fn_type = fn_type
+        self.cls_type = cls_type
+
+    def load(self, fn):
+        """Parse and resolve the body
+
+        :param fn: stmt.Function the body belongs to
+        :return: list of statements
+        :raise parser.ParseError: if the body has errors; they have
+            already been reported
+        """
+        tokens = [self.tokens[i] for i in range(self.start, self.end + 1)]
+        tokens.append(tokenclass.Token(TokenType.EOF, "", None, tokens[-1].line))
+        body = parser.Parser(tokens, lazy=True).block()
+        if not lox.Lox.had_error:
+            Resolver().resolve_deferred(fn, body)
+        if lox.Lox.had_error:
+            raise parser.ParseError()
+        if lox.Lox.optimize:
+            size = len(fn.params)
+            if self.fn_type in (Resolver.FunctionType.METHOD,
+                                Resolver.FunctionType.INITIALIZER):
+                size += 1   # 'this' first
+            body = lox.Lox.optimize_deferred(fn, body, size)
+        return body
@@ -5,17 +5,64 @@ interactive prompt.
 
 Usage
 -----
-script : python3 lox.py <filename>
-prompt : python3 lox.py
+script : python3 lox.py [options] <filename>
+prompt : python3 lox.py [options]
+
+Options
+-------
+--scanner {char,regex,compact}
+                       : scanning engine used by the front end
+--stream               : run each top-level declaration as soon as it
+                         is parsed instead of reading the whole file.
+                         Scans with the regex scanner
+--no-cache             : don't read or write resolved programs in
+                         __loxcache__
+--lazy                 : only brace-match function bodies up front and
+                         parse them the first time they are called.
+                         Misplaced 'return', 'this' and 'super' are
+                         still reported up front, other errors in a
+                         body when it first runs
+--optimize             : fold constants, prune dead branches, inline
+                         small functions, hoist loop invariants and
+                         drop the operand checks that type inference
+                         proves unneeded before running the program
+--inline-threshold N   : largest function body, in nodes, that
+                         --optimize inlines; 0 turns inlining off
+--stats                : report what the optimizer did, and which
+                         functions the tiered engine compiled, on stderr
+--engine {tree,closure,python,vm,tiered}
+                       : execution engine; closure compiles the program
+                         into Python closures before running it, python
+                         translates it into Python source and runs that,
+                         vm compiles it to bytecode for a stack machine,
+                         tiered walks the tree and compiles functions to
+                         closures once they are hot
+--tier-threshold N     : calls after which the tiered engine compiles a
+                         function
+--tier-loop-threshold N: loop iterations in its body after which the
+                         tiered engine compiles a function
 """
 
+import argparse
 import parser
 import sys
 
+from closureinterpreter import ClosureInterpreter
+from compactscanner import CompactScanner
+from hoister import Hoister
+from inliner import Inliner
 from interpreter import Interpreter
+from optimizer import Optimizer
+from programcache import ProgramCache
+from pythoninterpreter import PythonInterpreter
+from regexscanner import RegexScanner
 from resolver import Resolver
 from scanner import Scanner
+from tieredinterpreter import CALL_THRESHOLD, LOOP_THRESHOLD, TieredInterpreter
+from tokenbuffer import TokenBuffer
 from tokentypes import TokenType
+from typeinference import TypeInference
+from vm import VM
 
 
 class Lox:
@@ -26,17 +73,89 @@ class Lox:
     had_error = False
     had_runtime_error = False
 
+    scanners = {
+        "char": Scanner,
+        "regex": RegexScanner,
+        "compact": CompactScanner,
+    }
+    scanner_cls = Scanner
+    engines = {
+        "tree": Interpreter,
+        "closure": ClosureInterpreter,
+        "python": PythonInterpreter,
+        "vm": VM,
+        "tiered": TieredInterpreter,
+    }
+    stream = False
+    use_cache = True
+    lazy = False
+    optimize = False
+    inline_threshold = 16
+    stats = False
+    passes = None   # optimization passes of the program running, which
+                    # lazily parsed bodies go through when they load
+
     @classmethod
     def main(cls):
         """Determine how user wants to run Lox
 
         :return: None
         """
-        if len(cls.args) > 1:
-            print("Usage: python3 Lox.py [script]")
-            sys.exit(1)
-        elif len(cls.args) == 1:
-            cls.run_file(cls.args[0])
+        arg_parser = argparse.ArgumentParser(
+            prog="python3 lox.py", description="Run Lox programs.")
+        arg_parser.add_argument("script", nargs="?")
+        arg_parser.add_argument(
+            "--scanner", choices=cls.scanners,
+            help="scanning engine used by the front end (default: char)")
+        arg_parser.add_argument(
+            "--stream", action="store_true",
+            help="execute top-level declarations as they are parsed")
+        arg_parser.add_argument(
+            "--no-cache", dest="use_cache", action="store_false",
+            help="don't use the on-disk cache of resolved programs")
+        arg_parser.add_argument(
+            "--lazy", action="store_true",
+            help="parse function bodies the first time they are called")
+        arg_parser.add_argument(
+            "--optimize", action="store_true",
+            help="fold constants, prune dead branches, inline small "
+                 "functions, hoist loop invariants and skip the operand "
+                 "checks type inference proves unneeded")
+        arg_parser.add_argument(
+            "--inline-threshold", type=int, default=cls.inline_threshold,
+            metavar="N", help="largest function body, in nodes, to inline")
+        arg_parser.add_argument(
+            "--stats", action="store_true",
+            help="report what the optimizer did, and tier-ups, on stderr")
+        arg_parser.add_argument(
+            "--engine", choices=cls.engines, default="tree",
+            help="execution engine that runs the program")
+        arg_parser.add_argument(
+            "--tier-threshold", type=int, default=CALL_THRESHOLD, metavar="N",
+            help="calls after which the tiered engine compiles a function")
+        arg_parser.add_argument(
+            "--tier-loop-threshold", type=int, default=LOOP_THRESHOLD, metavar="N",
+            help="loop iterations after which the tiered engine compiles a function")
+        options = arg_parser.parse_args(cls.args)
+        if options.stream and options.scanner not in (None, "regex"):
+            arg_parser.error("--stream always scans with the regex scanner, "
+                             f"not --scanner {options.scanner}")
+
+        cls.scanner_cls = cls.scanners[options.scanner or "char"]
+        cls.stream = options.stream
+        cls.use_cache = options.use_cache
+        cls.lazy = options.lazy
+        cls.optimize = options.optimize
+        cls.inline_threshold = options.inline_threshold
+        cls.stats = options.stats
+        if options.engine == "tiered":
+            cls.interpreter = TieredInterpreter(
+                options.tier_threshold, options.tier_loop_threshold,
+                sys.stderr if options.stats else None)
+        else:
+            cls.interpreter = cls.engines[options.engine]()
+        if options.script is not None:
+            cls.run_file(options.script)
         else:
             cls.run_prompt()
 
@@ -50,8 +169,11 @@ class Lox:
         """
         try:
             with open(path, "r", encoding="utf-8") as reader:
-                all_bytes = reader.read()
-                cls.run(all_bytes)
+                if cls.stream:
+                    cls.run_stream(reader)
+                else:
+                    all_bytes = reader.read()
+                    cls.run(all_bytes, path)
                 if cls.had_error:  # May need to adjust this
                     sys.exit(1)
                 if cls.had_runtime_error:
@@ -79,23 +201,142 @@ class Lox:
             print("\nUser entered control-c, exiting...")
 
     @classmethod
-    def run(cls, source):
-        """Run the input through the scanner and print the tokens
+    def run(cls, source, path=None):
+        """Compile the source, or fetch it from the cache when it comes
+        from a file, and run it
 
         :param source: input from either file or interactive prompt
+        :param path: location of the file the source was read from
         :return: None
         """
-        scanner = Scanner(source)
+        cached = path is not None and cls.use_cache
+        statements = None
+        if cached:
+            statements = ProgramCache.load(path, source)
+        if statements is None:
+            statements = cls.compile(source)
+            if statements is None:
+                return
+            # A lazily parsed program is incomplete, so only cache
+            # fully parsed ones.
+            if cached and not cls.lazy:
+                ProgramCache.store(path, source, statements)
+        if cls.optimize:
+            # The cache holds the program as resolved, so it can be
+            # run with or without optimizing.
+            cls.start_passes()
+            statements = cls.optimize_program(statements)
+        # Engines that compile the program may cache it too, as long
+        # as it is complete
+        cls.interpreter.interpret(statements, path if cached and not cls.lazy else None)
+        if cls.optimize:
+            cls.report_stats()
+
+    @classmethod
+    def compile(cls, source):
+        """Run the input through the scanner, parser and resolver
+
+        :param source: Lox source code
+        :return: resolved statements, or None if there were errors
+        """
+        scanner = cls.scanner_cls(source)
         tokens = scanner.scan_tokens()
-        prsr = parser.Parser(tokens)
+        prsr = parser.Parser(tokens, cls.lazy)
         statements = prsr.parse()
         if cls.had_error:
-            return
-        resolver = Resolver(cls.interpreter)
+            return None
+        resolver = Resolver()
         resolver.resolve(statements)
         if cls.had_error:
-            return
-        cls.interpreter.interpret(statements)
+            return None
+        return statements
+
+    @classmethod
+    def run_stream(cls, reader):
+        """Scan, parse, resolve and execute a file one top-level
+        declaration at a time, so memory stays bounded and output
+        starts right away. Streaming needs the regex scanner, which is
+        the only one that can scan in chunks.
+
+        :param reader: file object to read the program from
+        :return: None
+        """
+        tokens = TokenBuffer(RegexScanner().scan_stream(reader))
+        prsr = parser.Parser(tokens, cls.lazy)
+        resolver = Resolver()
+        if cls.optimize:
+            cls.start_passes()
+        for declaration in prsr.parse_stream():
+            if declaration is None:
+                continue    # a syntax error, already reported
+            # Keep parsing and resolving after an error so the rest get
+            # reported, but stop running code.
+            resolver.resolve([declaration])
+            if cls.had_error:
+                continue
+            statements = [declaration]
+            if cls.optimize:
+                statements = cls.optimize_program(statements)
+            cls.interpreter.interpret(statements)
+        if cls.optimize:
+            cls.report_stats()
+
+    @classmethod
+    def start_passes(cls):
+        """Set up the optimization passes for a program about to run"""
+        cls.passes = (Optimizer(), Inliner(cls.inline_threshold),
+                      Hoister(), TypeInference())
+
+    @classmethod
+    def optimize_program(cls, statements):
+        """Run a resolved program through the optimization passes
+
+        :param statements: list of statements
+        :return: optimized list of statements
+        """
+        optimizer, inliner, hoister, types = cls.passes
+        statements = optimizer.optimize(statements)
+        inliner.inline(statements)
+        hoister.hoist(statements)
+        types.infer(statements)
+        return statements
+
+    @classmethod
+    def optimize_deferred(cls, fn, body, size):
+        """Run a lazily parsed function body through the same passes as
+        the program it belongs to, once it is loaded
+
+        :param fn: stmt.Function the body belongs to
+        :param body: resolved list of statements
+        :param size: slots the caller fills, 'this' and the parameters
+        :return: optimized list of statements
+        """
+        optimizer, inliner, hoister, types = cls.passes
+        body = optimizer.optimize_deferred(fn, body)
+        inliner.inline_deferred(body)
+        hoister.hoist_deferred(fn, body, size)
+        types.infer_deferred(fn, body)
+        return body
+
+    @classmethod
+    def report_stats(cls):
+        """Tell the user what the optimizer did, if they asked. It runs
+        after the program, so the bodies parsed lazily while it ran are
+        counted.
+
+        :return: None
+        """
+        if cls.stats:
+            optimizer, inliner, hoister, types = cls.passes
+            print(f"optimizer: {optimizer.eliminated} nodes eliminated",
+                  file=sys.stderr)
+            print(f"inliner: {inliner.inlined} calls inlined",
+                  file=sys.stderr)
+            print(f"hoister: {hoister.hoisted} expressions hoisted",
+                  file=sys.stderr)
+            share = types.proven / types.operations if types.operations else 0
+            print(f"types: {types.proven} of {types.operations} checked "
+                  f"operations proven ({share:.0%})", file=sys.stderr)
 
     @classmethod
     def error(cls, line, message):
@@ -104,6 +345,7 @@ class Lox:
     @classmethod
     def report(cls, line, where, message):
         print(f"[line {line}] Error {where} : {message}")
+        cls.had_error = True
 
     @classmethod
     def parse_error(cls, token, message):
@@ -119,4 +361,7 @@ class Lox:
 
 
 if __name__ == "__main__":
-    Lox.main()
+    # Go through the importable module so the scanner, parser and
+    # resolver report errors against the same Lox class we run.
+    import lox
+    lox.Lox.main()
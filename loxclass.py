@@ -2,6 +2,7 @@
 
 import loxcallable as lc
 import loxinstance as li
+from symboltable import INIT
 
 
 class LoxClass(lc.LoxCallable):
@@ -13,27 +14,28 @@ class LoxClass(lc.LoxCallable):
     def __init__(self, name, superclass, methods):
         self.name = name
         self.superclass = superclass
+        # Methods are keyed by the SymbolTable id of their name
         self.methods = methods          # TODO: this was supposed to be a cls property; may need to revisit
 
     def __str__(self):
         return self.name
 
-    def find_method(self, name):
-        if name in self.methods:
-            return self.methods[name]
+    def find_method(self, symbol):
+        if symbol in self.methods:
+            return self.methods[symbol]
         if self.superclass:
-            return self.superclass.find_method(name)
+            return self.superclass.find_method(symbol)
         return None
 
     def call(self, interpreter, arguments):
         instance = li.LoxInstance(self)
-        initializer = self.find_method("init")
+        initializer = self.find_method(INIT)
         if initializer:
             initializer.bind(instance).call(interpreter, arguments)
         return instance
 
     def arity(self):
-        initializer = self.find_method("init")
+        initializer = self.find_method(INIT)
         if not initializer:
             return 0
         return initializer.arity()
@@ -3,18 +3,23 @@
 import environment
 import loxcallable
 import returnvalue
+from cell import Cell
 
 
 class LoxFunction(loxcallable.LoxCallable):
-    def __init__(self, declaration, closure, is_initializer):
+    """Runtime function. It keeps only the cells of the outer locals its
+    body uses, not the scopes it was declared in. Methods are bound to
+    an instance, which their frame gets in slot 0 as 'this'.
+    """
+
+    def __init__(self, declaration, upvalues, is_initializer, instance=None):
         self.declaration = declaration
-        self.closure = closure
+        self.upvalues = upvalues
         self.is_initializer = is_initializer
+        self.instance = instance
 
     def bind(self, instance):
-        env = environment.Environment(self.closure)
-        env.define("this", instance)
-        return LoxFunction(self.declaration, env, self.is_initializer)
+        return LoxFunction(self.declaration, self.upvalues, self.is_initializer, instance)
 
     def to_string(self):
         return f"<fn {self.declaration.name.lexeme}>"
@@ -23,15 +28,24 @@ class LoxFunction(loxcallable.LoxCallable):
         return len(self.declaration.params)
 
     def call(self, interpreter, arguments):
-        env = environment.Environment(self.closure)
-        for i in range(len(self.declaration.params)):
-            env.define(self.declaration.params[i].lexeme, arguments[i])
+        declaration = self.declaration
+        if declaration.body is None:
+            declaration.body = declaration.lazy.load(declaration)
+            declaration.lazy = None
+        # 'this' and the parameters take the first slots of the frame
+        values = arguments if self.instance is None else [self.instance, *arguments]
+        for slot in declaration.cells:
+            values[slot] = Cell(values[slot])
+        previous = interpreter.upvalues
+        interpreter.upvalues = self.upvalues
         try:
-            interpreter.execute_block(self.declaration.body, env)
+            interpreter.execute_block(declaration.body, environment.Environment(values))
         except returnvalue.Return as r:
             if self.is_initializer:
-                return self.closure.get_at(0, "this")
+                return self.instance
             return r.value
+        finally:
+            interpreter.upvalues = previous
         if self.is_initializer:
-            return self.closure.get_at(0, "this")
+            return self.instance
         return None
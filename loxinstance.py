@@ -6,18 +6,18 @@ import runtimeexception as re
 class LoxInstance:
     def __init__(self, klass):
         self.klass = klass
-        self.fields = {}
+        self.fields = {}  # keyed by SymbolTable id
 
     def __str__(self):
         return f"{self.klass.name} instance"
 
     def get(self, name):
-        if name.lexeme in self.fields:
-            return self.fields[name.lexeme]
-        method = self.klass.find_method(name.lexeme)
+        if name.symbol in self.fields:
+            return self.fields[name.symbol]
+        method = self.klass.find_method(name.symbol)
         if method is not None:
             return method.bind(self)
         raise re.RuntimeException(name, f"Undefined property '{name.lexeme}'.")
 
     def set(self, name, value):
-        self.fields[name.lexeme] = value
+        self.fields[name.symbol] = value
@@ -0,0 +1,316 @@
+"""Class that performs an optimization pass over the syntax tree"""
+
+import expr
+import stmt
+from interpreter import Interpreter
+from runtimeexception import RuntimeException
+from tokentypes import TokenType
+
+NOT_CONSTANT = object()   # scope entry of a local whose value may change
+
+
+class Optimizer(expr.Visitor, stmt.Visitor):
+    """Rewrites a resolved program into one that does the same with less
+    work at runtime:
+
+    - operators whose operands are literals are evaluated once, here,
+      and replaced by their value. An operation that would fail is left
+      alone, so the error still happens when and where it would have.
+    - groupings are dropped, the tree already encodes precedence
+    - reads of locals that are initialized with a literal and never
+      assigned are replaced by the literal
+    - if and while statements whose condition is a literal lose the
+      branches that can never run
+
+    Each visit method returns the node that takes the place of the one
+    visited. Statement visits may return None to remove the statement.
+    The resolver's annotations stay valid because declarations are
+    never removed or reordered.
+    """
+
+    def __init__(self):
+        self.scopes = []            # per scope, symbol -> constant value or NOT_CONSTANT
+        self.assigned = set()       # symbols assigned anywhere in the program
+        self.eliminated = 0         # nodes removed so far
+        self.folder = Interpreter() # evaluates operators on literals
+        self.expr_dispatch = expr.dispatch_table(self)
+        self.stmt_dispatch = stmt.dispatch_table(self)
+
+    def optimize(self, statements):
+        """Optimize a resolved program
+
+        :param statements: list of statements
+        :return: optimized list of statements
+        """
+        before = self.count(statements)
+        statements = self.optimize_statements(statements)
+        self.eliminated += before - self.count(statements)
+        return statements
+
+    def optimize_deferred(self, fn, body):
+        """Optimize a lazily parsed function body once it is loaded.
+        Outer locals are out of sight by then, so only the body's own
+        locals are propagated, and only what the body assigns matters.
+
+        :param fn: stmt.Function the body belongs to
+        :param body: resolved list of statements
+        :return: optimized list of statements
+        """
+        assigned, self.assigned = self.assigned, set()
+        before = self.count(body)
+        body = self.optimize_function(fn.params, body)
+        self.eliminated += before - self.count(body)
+        self.assigned = assigned
+        return body
+
+    def visit_block_stmt(self, s):
+        self.begin_scope()
+        s.statements = self.optimize_statements(s.statements)
+        self.end_scope()
+        return s
+
+    def visit_class_stmt(self, s):
+        # The superclass stays a Variable, its name is needed to report
+        # that it isn't a class.
+        self.declare(s.name.symbol)
+        for method in s.methods:
+            method.body = self.optimize_function(method.params, method.body)
+        return s
+
+    def visit_expression_stmt(self, s):
+        s.expression = self.evaluate(s.expression)
+        if isinstance(s.expression, expr.Literal):
+            return None
+        return s
+
+    def visit_function_stmt(self, s):
+        self.declare(s.name.symbol)
+        s.body = self.optimize_function(s.params, s.body)
+        return s
+
+    def visit_if_stmt(self, s):
+        s.condition = self.evaluate(s.condition)
+        if isinstance(s.condition, expr.Literal):
+            if self.folder.is_truthy(s.condition.value):
+                return self.execute(s.then_branch)
+            if s.else_branch is not None:
+                return self.execute(s.else_branch)
+            return None
+        s.then_branch = self.branch(s.then_branch)
+        if s.else_branch is not None:
+            s.else_branch = self.execute(s.else_branch)
+        return s
+
+    def visit_print_stmt(self, s):
+        s.expression = self.evaluate(s.expression)
+        return s
+
+    def visit_return_stmt(self, s):
+        if s.value is not None:
+            s.value = self.evaluate(s.value)
+        return s
+
+    def visit_var_stmt(self, s):
+        value = None
+        if s.initializer is not None:
+            s.initializer = self.evaluate(s.initializer)
+            value = s.initializer
+        if value is None or isinstance(value, expr.Literal):
+            if s.name.symbol not in self.assigned:
+                self.declare(s.name.symbol, None if value is None else value.value)
+                return s
+        self.declare(s.name.symbol)
+        return s
+
+    def visit_while_stmt(self, s):
+        s.condition = self.evaluate(s.condition)
+        if (isinstance(s.condition, expr.Literal)
+                and not self.folder.is_truthy(s.condition.value)):
+            return None
+        s.body = self.branch(s.body)
+        return s
+
+    def visit_assign_expr(self, e):
+        e.value = self.evaluate(e.value)
+        return e
+
+    def visit_binary_expr(self, e):
+        # Chains such as a + b + c are walked down their left operands
+        # in a loop, so that their length isn't bound by the Python stack
+        chain = []
+        while type(e) is expr.Binary:
+            chain.append(e)
+            e = e.left
+        left = self.evaluate(e)
+        for e in reversed(chain):
+            e.left = left
+            e.right = self.evaluate(e.right)
+            left = e
+            if isinstance(e.left, expr.Literal) and isinstance(e.right, expr.Literal):
+                left = self.fold(e)
+        return left
+
+    def visit_call_expr(self, e):
+        e.callee = self.evaluate(e.callee)
+        e.arguments = [self.evaluate(argument) for argument in e.arguments]
+        return e
+
+    def visit_conditional_expr(self, e):
+        e.condition = self.evaluate(e.condition)
+        if isinstance(e.condition, expr.Literal):
+            if self.folder.is_truthy(e.condition.value):
+                return self.evaluate(e.then_branch)
+            return self.evaluate(e.else_branch)
+        e.then_branch = self.evaluate(e.then_branch)
+        e.else_branch = self.evaluate(e.else_branch)
+        return e
+
+    def visit_get_expr(self, e):
+        e.object = self.evaluate(e.object)
+        return e
+
+    def visit_grouping_expr(self, e):
+        return self.evaluate(e.expression)
+
+    def visit_hoisted_expr(self, e):
+        # The expression is shared with the loop's temporaries
+        return e
+
+    def visit_inline_expr(self, e):
+        # The body is shared with the function it was taken from
+        e.call = self.evaluate(e.call)
+        return e
+
+    def visit_literal_expr(self, e):
+        return e
+
+    def visit_logical_expr(self, e):
+        """A literal left operand decides whether the right one is
+        evaluated, and Lox's logical operators return an operand, so the
+        whole expression becomes one of the two
+        """
+
+        chain = []
+        while type(e) is expr.Logical:
+            chain.append(e)
+            e = e.left
+        left = self.evaluate(e)
+        for e in reversed(chain):
+            e.left = left
+            if isinstance(left, expr.Literal):
+                truthy = self.folder.is_truthy(left.value)
+                if truthy != (e.operator.tokentype == TokenType.OR):
+                    left = self.evaluate(e.right)
+                continue
+            e.right = self.evaluate(e.right)
+            left = e
+        return left
+
+    def visit_set_expr(self, e):
+        e.object = self.evaluate(e.object)
+        e.value = self.evaluate(e.value)
+        return e
+
+    def visit_super_expr(self, e):
+        return e
+
+    def visit_this_expr(self, e):
+        return e
+
+    def visit_unary_expr(self, e):
+        e.right = self.evaluate(e.right)
+        if isinstance(e.right, expr.Literal):
+            return self.fold(e)
+        return e
+
+    def visit_variable_expr(self, e):
+        symbol = e.name.symbol
+        for scope in reversed(self.scopes):
+            if symbol in scope:
+                value = scope[symbol]
+                if value is NOT_CONSTANT:
+                    return e
+                return expr.Literal(value)
+        return e    # global, or a local outside a deferred body
+
+    def evaluate(self, e):
+        return self.expr_dispatch[e.kind](e)
+
+    def execute(self, s):
+        return self.stmt_dispatch[s.kind](s)
+
+    def optimize_statements(self, statements):
+        optimized = []
+        dispatch = self.stmt_dispatch
+        for statement in statements:
+            statement = dispatch[statement.kind](statement)
+            if statement is not None:
+                optimized.append(statement)
+        return optimized
+
+    def optimize_function(self, params, body):
+        if body is None:
+            return None     # parsed lazily, optimized when it's loaded
+        self.begin_scope()
+        for param in params:
+            self.declare(param.symbol)
+        body = self.optimize_statements(body)
+        self.end_scope()
+        return body
+
+    def branch(self, s):
+        """Optimize a statement that another one runs. If it optimizes
+        away, an empty block takes its place.
+        """
+        s = self.execute(s)
+        if s is None:
+            s = stmt.Block([])
+            s.frame = not self.scopes
+        return s
+
+    def fold(self, e):
+        """Replace an operator on literals by its value
+
+        :param e: Binary or Unary whose operands are literals
+        :return: Literal, or e if evaluating it raises an error
+        """
+        try:
+            return expr.Literal(self.folder.evaluate(e))
+        except (RuntimeException, ArithmeticError):
+            # Evaluating picked a handler for the node, which the
+            # program cache can't store, so it is picked again at run time
+            e.handler = None
+            return e
+
+    def begin_scope(self):
+        self.scopes.append({})
+
+    def end_scope(self):
+        self.scopes.pop()
+
+    def declare(self, symbol, value=NOT_CONSTANT):
+        if self.scopes:
+            self.scopes[-1][symbol] = value
+
+    def count(self, statements):
+        """Count the nodes of a tree, noting on the way which symbols
+        are assigned. A lazily parsed body may assign any name it
+        mentions.
+
+        :param statements: list of statements
+        :return: int
+        """
+        count = 0
+        stack = [statements]
+        while stack:
+            value = stack.pop()
+            if isinstance(value, list):
+                stack.extend(value)
+            elif isinstance(value, (expr.Expr, stmt.Stmt)):
+                count += 1
+                if isinstance(value, expr.Assign):
+                    self.assigned.add(value.name.symbol)
+                elif isinstance(value, stmt.Function) and value.body is None:
+                    self.assigned.update(value.lazy.symbols)
+                stack.extend(getattr(value, name) for name in value.fields)
+        return count
@@ -1,8 +1,10 @@
 """Parser Class"""
 
 import expr
-from lox import Lox
+import lox
 import stmt
+from lazybody import LazyBody
+from scanner import Scanner
 from tokentypes import TokenType
 
 
@@ -11,11 +13,41 @@ class ParseError(Exception):
 
 
 class Parser:
-    """Recursive descent parser"""
-
-    def __init__(self, tokens):
+    """Recursive descent parser. Binary expressions are parsed by
+    precedence climbing over binary_rules.
+    """
+
+    LOWEST_PRECEDENCE = 1
+
+    # Binding power and node class for every binary operator, loosest
+    # first: or, and, equality, comparison, term, factor.
+    binary_rules = {
+        TokenType.OR: (1, expr.Logical),
+        TokenType.AND: (2, expr.Logical),
+        TokenType.BANG_EQUAL: (3, expr.Binary),
+        TokenType.EQUAL_EQUAL: (3, expr.Binary),
+        TokenType.GREATER: (4, expr.Binary),
+        TokenType.GREATER_EQUAL: (4, expr.Binary),
+        TokenType.LESS: (4, expr.Binary),
+        TokenType.LESS_EQUAL: (4, expr.Binary),
+        TokenType.MINUS: (5, expr.Binary),
+        TokenType.PLUS: (5, expr.Binary),
+        TokenType.SLASH: (6, expr.Binary),
+        TokenType.STAR: (6, expr.Binary),
+    }
+
+    unary_operators = {TokenType.BANG, TokenType.MINUS}
+
+    literals = {
+        TokenType.FALSE: False,
+        TokenType.TRUE: True,
+        TokenType.NIL: None,
+    }
+
+    def __init__(self, tokens, lazy=False):
         self.tokens = tokens
         self.current = 0
+        self.lazy = lazy  # brace-match function bodies instead of parsing them
 
     def parse(self):
         """Initial method to kick off the parser"""
@@ -28,6 +60,19 @@ class Parser:
         except ParseError:
             return None
 
+    def parse_stream(self):
+        """Parse one top-level declaration at a time so the caller can
+        run it before the rest of the program has been read. Tokens
+        behind the parser are released when the token source allows it.
+        """
+
+        release = getattr(self.tokens, "release", None)
+        while not self.is_at_end():
+            declaration = self.declaration()
+            if release is not None:
+                release(self.current - 1)
+            yield declaration
+
     def expression(self):
         """The top rule of our top-down parser"""
 
@@ -174,9 +219,51 @@ class Parser:
                     break
         self.consume(TokenType.RIGHT_PAREN, "Expect ')' after parameters.")
         self.consume(TokenType.LEFT_BRACE, f"Expect '{{' before {kind} body.")
+        if self.lazy:
+            function = stmt.Function(name, parameters, None)
+            function.lazy = self.skip_block()
+            return function
         body = self.block()
         return stmt.Function(name, parameters, body)
 
+    def skip_block(self):
+        """Step over a function body by matching braces, without
+        building any nodes. The body gets parsed when it first runs;
+        until then the resolver works from the names it mentions.
+
+        :return: LazyBody
+        """
+
+        tokens = self.tokens
+        tokentype_at = getattr(tokens, "tokentype", None)  # TokenArray
+        if tokentype_at is None:
+            tokentype_at = lambda index: tokens[index].tokentype
+        named = Scanner.named
+        symbols = set()
+        start = self.current
+        depth = 1
+        i = start
+        while True:
+            tokentype = tokentype_at(i)
+            if tokentype in named:
+                symbols.add(tokens[i].symbol)
+            elif tokentype == TokenType.RIGHT_BRACE:
+                depth -= 1
+                if depth == 0:
+                    break
+            elif tokentype == TokenType.LEFT_BRACE:
+                depth += 1
+            elif tokentype == TokenType.EOF:
+                self.current = i
+                raise self.error(self.peek(), "Expect '}' after block.")
+            i += 1
+        self.current = i + 1
+        if getattr(tokens, "release", None) is not None:
+            # A streamed token window drops these once we move on.
+            return LazyBody([tokens[j] for j in range(start, i + 1)], 0, i - start,
+                            symbols)
+        return LazyBody(tokens, start, i, symbols)
+
     def block(self):
         """Group statement within a set of {} together"""
 
@@ -192,7 +279,7 @@ class Parser:
         lookahead and no backtracking
         """
 
-        e = self.is_or()
+        e = self.binary(self.LOWEST_PRECEDENCE)
         if self.match([TokenType.EQUAL]):
             equals = self.previous()
             value = self.assignment()
@@ -207,85 +294,41 @@ class Parser:
             self.error(equals, "Invalid assignment target")
         return e
 
-    def is_or(self):
-        """Parse 'or' expressions"""
-
-        e = self.is_and()
-        while self.match([TokenType.OR]):
-            operator = self.previous()
-            right = self.is_and()
-            e = expr.Logical(e, operator, right)
-        return e
-
-    def is_and(self):
-        """Parse 'and' expressions"""
-
-        e = self.equality()
-        while self.match([TokenType.AND]):
-            operator = self.previous()
-            right = self.equality()
-            e = expr.Logical(e, operator, right)
-        return e
-
-    def equality(self):
-        """Determine if we're looking at an equality expression"""
-
-        e = self.comparison()
-
-        while self.match([TokenType.BANG_EQUAL, TokenType.EQUAL_EQUAL]):
-            operator = self.previous()
-            right = self.comparison()
-            e = expr.Binary(e, operator, right)
-        return e
-
-    def comparison(self):
-        """Determine if we're looking at a comparison expression"""
-
-        e = self.term()
-        while self.match(
-            [
-                TokenType.GREATER,
-                TokenType.GREATER_EQUAL,
-                TokenType.LESS,
-                TokenType.LESS_EQUAL,
-            ]
-        ):
-            operator = self.previous()
-            right = self.term()
-            e = expr.Binary(e, operator, right)
-        return e
-
-    def term(self):
-        """Determine if we're looking at addition or subtraction"""
+    def binary(self, min_precedence):
+        """Precedence climbing over the binary_rules table. Operators
+        at the same level are folded into a left-associative chain in
+        a loop, and we only recurse to parse a tighter-binding right
+        operand, so the depth is bounded by the number of precedence
+        levels rather than by the length of the expression.
 
-        e = self.factor()
-        while self.match([TokenType.MINUS, TokenType.PLUS]):
-            operator = self.previous()
-            right = self.factor()
-            e = expr.Binary(e, operator, right)
-        return e
-
-    def factor(self):
-        """Determine if we're looking at multiplication or division"""
+        :param min_precedence: loosest operator this call may consume
+        :return: Expr
+        """
 
         e = self.unary()
-        while self.match([TokenType.SLASH, TokenType.STAR]):
-            operator = self.previous()
-            right = self.unary()
-            e = expr.Binary(e, operator, right)
-        return e
+        rules = self.binary_rules
+        while True:
+            rule = rules.get(self.tokens[self.current].tokentype)
+            if rule is None or rule[0] < min_precedence:
+                return e
+            precedence, node = rule
+            operator = self.advance()
+            right = self.binary(precedence + 1)
+            e = node(e, operator, right)
 
     def unary(self):
         """Look at current token to see if its a unary expression
-        (! or -)
+        (! or -). Runs of prefix operators are collected in a loop and
+        applied innermost first.
         """
 
-        if self.match([TokenType.BANG, TokenType.MINUS]):
-            operator = self.previous()
-            right = self.unary()
-            return expr.Unary(operator, right)
-
-        return self.call()
+        operators = []
+        while self.tokens[self.current].tokentype in self.unary_operators:
+            operators.append(self.advance())
+        e = self.call()
+        for operator in reversed(operators):
+            e = expr.Unary(operator, e)
+        return e
 
     def finish_call(self, callee):
         arguments = []
@@ -304,9 +347,12 @@ class Parser:
 
         e = self.primary()
         while True:
-            if self.match([TokenType.LEFT_PAREN]):
+            tokentype = self.tokens[self.current].tokentype
+            if tokentype == TokenType.LEFT_PAREN:
+                self.advance()
                 e = self.finish_call(e)
-            if self.match([TokenType.DOT]):
+            elif tokentype == TokenType.DOT:
+                self.advance()
                 name = self.consume(
                     TokenType.IDENTIFIER, "Expect property name after '.'."
                 )
@@ -321,26 +367,28 @@ class Parser:
         level
         """
 
-        if self.match([TokenType.FALSE]):
-            return expr.Literal(False)
-        if self.match([TokenType.TRUE]):
-            return expr.Literal(True)
-        if self.match([TokenType.NIL]):
-            return expr.Literal(None)
-        if self.match([TokenType.NUMBER, TokenType.STRING]):
-            return expr.Literal(self.previous().literal)
-        if self.match([TokenType.SUPER]):
-            keyword = self.previous()
+        token = self.tokens[self.current]
+        tokentype = token.tokentype
+        if tokentype == TokenType.IDENTIFIER:
+            self.advance()
+            return expr.Variable(token)
+        if tokentype == TokenType.NUMBER or tokentype == TokenType.STRING:
+            self.advance()
+            return expr.Literal(token.literal)
+        if tokentype in self.literals:
+            self.advance()
+            return expr.Literal(self.literals[tokentype])
+        if tokentype == TokenType.SUPER:
+            keyword = self.advance()
             self.consume(TokenType.DOT, "Expect '.' after 'super'.")
             method = self.consume(
                 TokenType.IDENTIFIER, "Expect superclass method name."
             )
             return expr.Super(keyword, method)
-        if self.match([TokenType.THIS]):
-            return expr.This(self.previous())
-        if self.match([TokenType.IDENTIFIER]):
-            return expr.Variable(self.previous())
-        if self.match([TokenType.LEFT_PAREN]):
+        if tokentype == TokenType.THIS:
+            return expr.This(self.advance())
+        if tokentype == TokenType.LEFT_PAREN:
+            self.advance()
             e = self.expression()
             self.consume(TokenType.RIGHT_PAREN, "Expect ')' after expression.")
             return expr.Grouping(e)
@@ -401,7 +449,7 @@ class Parser:
     def error(self, token, message):
         """Report error if we see an unexpected token"""
 
-        Lox.parse_error(token, message)
+        lox.Lox.parse_error(token, message)
         return ParseError()
 
     def synchronize(self):
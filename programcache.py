@@ -0,0 +1,280 @@
+"""On-disk cache of resolved programs"""
+
+import hashlib
+import marshal
+import os
+import sys
+from array import array
+
+import expr
+import stmt
+import tokenclass
+from symboltable import SymbolTable
+from tokentypes import TokenType
+
+
+class ProgramCache:
+    """Stores the parsed and resolved form of a script next to it, in
+    the way CPython keeps bytecode in __pycache__. An entry is only used
+    if both the script and the interpreter are unchanged since it was
+    written; anything else counts as a miss and gets overwritten.
+
+    The syntax tree is flattened into post-order opcodes for a small
+    stack machine. Tokens are stored once in a table and literals in a
+    constant pool. Each node is stored with its extra slots, so
+    everything the resolver attached to it comes back with the node.
+    The whole entry is marshalled, so loading is one C-level unmarshal
+    plus a single pass that rebuilds the nodes.
+
+    Engines that compile programs to Python code objects keep those in
+    a second entry, found by a digest of the tree they were compiled
+    from, so optimizing the program or not gives different entries.
+    """
+
+    directory = "__loxcache__"
+    suffix = ".lxc"
+    magic = b"LXC1"
+    code_suffix = ".pyc"
+    code_magic = b"LXP1"
+
+    # Everything whose code decides what a cached program looks like.
+    # Their contents make up the interpreter version.
+    modules = [
+        "compactscanner.py", "environment.py", "expr.py", "parser.py",
+        "programcache.py", "regexscanner.py", "resolver.py", "scanner.py",
+        "stmt.py", "symboltable.py", "tokenarray.py", "tokenclass.py",
+        "tokentypes.py", "transpiler.py", "pythoninterpreter.py",
+    ]
+    _version = None
+
+    # Opcodes. Non-negative opcodes build the node class with that index.
+    NONE = -1
+    CONST = -2
+    TOKEN = -3
+    LIST = -4
+
+    node_classes = sorted(
+        (cls for module in (expr, stmt) for cls in vars(module).values()
+         if isinstance(cls, type) and issubclass(cls, (expr.Expr, stmt.Stmt))
+         and cls not in (expr.Expr, stmt.Stmt)),
+        key=lambda cls: (cls.__module__, cls.__name__))
+    node_ids = {cls: i for i, cls in enumerate(node_classes)}
+    node_fields = [cls.fields + cls.extras for cls in node_classes]
+    token_types = list(TokenType)
+    token_type_ids = {tokentype: i for i, tokentype in enumerate(token_types)}
+
+    @classmethod
+    def version(cls):
+        """Digest of the interpreter sources, computed once per run
+
+        :return: str
+        """
+        if cls._version is None:
+            digest = hashlib.sha256()
+            here = os.path.dirname(os.path.abspath(__file__))
+            for name in cls.modules:
+                with open(os.path.join(here, name), "rb") as f:
+                    digest.update(f.read())
+            cls._version = digest.hexdigest()
+        return cls._version
+
+    @classmethod
+    def path_for(cls, path, suffix=None):
+        head, tail = os.path.split(os.path.abspath(path))
+        return os.path.join(head, cls.directory, tail + (suffix or cls.suffix))
+
+    @classmethod
+    def source_hash(cls, source):
+        return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+    @classmethod
+    def load(cls, path, source):
+        """Look up the resolved program for a script
+
+        :param path: location of the script
+        :param source: current contents of the script
+        :return: list of statements, or None on a cache miss
+        """
+        try:
+            with open(cls.path_for(path), "rb") as f:
+                if f.read(len(cls.magic)) != cls.magic:
+                    return None
+                entry = marshal.load(f)
+            version, source_hash, names, code, consts, tokens = entry
+            if version != cls.version() or source_hash != cls.source_hash(source):
+                return None
+            if not SymbolTable.restore(names):
+                return None
+            return cls.decode(code, consts, tokens)
+        except (OSError, EOFError, ValueError, TypeError, IndexError, KeyError):
+            return None
+
+    @classmethod
+    def store(cls, path, source, statements):
+        """Save a resolved program. Failing to write the cache is not
+        an error, the program just gets compiled again next time.
+
+        :param path: location of the script
+        :param source: contents the program was compiled from
+        :param statements: resolved program
+        :return: None
+        """
+        cache_path = cls.path_for(path)
+        code, consts, tokens = cls.encode(statements)
+        entry = (cls.version(), cls.source_hash(source), SymbolTable.names,
+                 code, consts, tokens)
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(cls.magic)
+                marshal.dump(entry, f)
+            os.replace(tmp_path, cache_path)
+        except (OSError, ValueError):
+            pass
+
+    @classmethod
+    def tree_hash(cls, statements):
+        """Digest of a program's tree, annotations included"""
+        return hashlib.sha256(marshal.dumps(cls.encode(statements))).hexdigest()
+
+    @classmethod
+    def load_code(cls, path, statements):
+        """Look up the code object a program was compiled to
+
+        :param path: location of the script
+        :param statements: program as it is about to run
+        :return: code object, or None on a cache miss
+        """
+        try:
+            with open(cls.path_for(path, cls.code_suffix), "rb") as f:
+                if f.read(len(cls.code_magic)) != cls.code_magic:
+                    return None
+                entry = marshal.load(f)
+            version, tag, tree_hash, code = entry
+            if (version != cls.version() or tag != sys.implementation.cache_tag
+                    or tree_hash != cls.tree_hash(statements)):
+                return None
+            return code
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+
+    @classmethod
+    def store_code(cls, path, statements, code):
+        """Save the code object a program was compiled to. As with the
+        program itself, failing to write it is not an error.
+
+        :param path: location of the script
+        :param statements: program the code was compiled from
+        :param code: code object
+        :return: None
+        """
+        cache_path = cls.path_for(path, cls.code_suffix)
+        entry = (cls.version(), sys.implementation.cache_tag,
+                 cls.tree_hash(statements), code)
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(cls.code_magic)
+                marshal.dump(entry, f)
+            os.replace(tmp_path, cache_path)
+        except (OSError, ValueError):
+            pass
+
+    @classmethod
+    def encode(cls, statements):
+        """Flatten a statement list into post-order opcodes
+
+        :param statements: resolved program
+        :return: (opcode bytes, constants, token table)
+        """
+        code = []
+        consts = []
+        tokens = []
+        token_index = {}
+        Token = tokenclass.Token
+        stack = [(statements, False)]
+        while stack:
+            value, built = stack.pop()
+            if built:
+                if isinstance(value, list):
+                    code += (cls.LIST, len(value))
+                else:
+                    code.append(cls.node_ids[type(value)])
+            elif value is None:
+                code.append(cls.NONE)
+            elif isinstance(value, list):
+                stack.append((value, True))
+                stack.extend((item, False) for item in reversed(value))
+            elif isinstance(value, Token):
+                i = token_index.get(id(value))
+                if i is None:
+                    i = token_index[id(value)] = len(tokens)
+                    tokens.append((cls.token_type_ids[value.tokentype], value.lexeme,
+                                   value.literal, value.line, value.symbol))
+                code += (cls.TOKEN, i)
+            elif type(value) in cls.node_ids:
+                stack.append((value, True))
+                fields = cls.node_fields[cls.node_ids[type(value)]]
+                stack.extend((getattr(value, name), False) for name in reversed(fields))
+            else:
+                code += (cls.CONST, len(consts))
+                consts.append(value)
+        return array("i", code).tobytes(), consts, tokens
+
+    @classmethod
+    def decode(cls, data, consts, token_table):
+        """Rebuild the statement list from its opcodes
+
+        :return: list of statements
+        """
+        code = array("i")
+        code.frombytes(data)
+        Token = tokenclass.Token
+        types = cls.token_types
+        tokens = [Token(types[tokentype], lexeme, literal, line, symbol)
+                  for tokentype, lexeme, literal, line, symbol in token_table]
+        classes = cls.node_classes
+        arity = [len(fields) for fields in cls.node_fields]
+        NONE, CONST, TOKEN = cls.NONE, cls.CONST, cls.TOKEN
+
+        stack = []
+        push = stack.append
+        i = 0
+        n = len(code)
+        while i < n:
+            op = code[i]
+            i += 1
+            if op >= 0:
+                node_cls = classes[op]
+                k = arity[op]
+                args = stack[-k:]
+                del stack[-k:]
+                extras = node_cls.extras
+                if extras:
+                    n_fields = k - len(extras)
+                    node = node_cls(*args[:n_fields])
+                    for name, value in zip(extras, args[n_fields:]):
+                        setattr(node, name, value)
+                else:
+                    node = node_cls(*args)
+                push(node)
+            elif op == TOKEN:
+                push(tokens[code[i]])
+                i += 1
+            elif op == NONE:
+                push(None)
+            elif op == CONST:
+                push(consts[code[i]])
+                i += 1
+            else:
+                k = code[i]
+                i += 1
+                if k:
+                    items = stack[-k:]
+                    del stack[-k:]
+                    push(items)
+                else:
+                    push([])
+        return stack.pop()
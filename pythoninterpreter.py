@@ -0,0 +1,129 @@
+"""Interpreter that runs programs translated to Python"""
+
+from cell import Cell
+from compiledfunction import CompiledFunction
+from globalenvironment import UNDEFINED
+from hoister import NOT_COMPUTED
+from interpreter import Interpreter
+from loxcallable import LoxCallable
+from loxclass import LoxClass
+from loxinstance import LoxInstance
+from programcache import ProgramCache
+from runtimeexception import RuntimeException
+from transpiler import Transpiler, tables
+
+
+class PythonInterpreter(Interpreter):
+    """Translates each program into Python source with a Transpiler,
+    compiles that with compile() and runs it on CPython's own bytecode
+    loop. The code object is cached next to the script. Runtime state,
+    output and errors are those of the tree walker.
+
+    The generated module's globals are the helpers below, shared by
+    every program, and the T and F tables of its own program.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.runtime = {
+            "G": self.globals.values,
+            "UNDEFINED": UNDEFINED,
+            "NOT_COMPUTED": NOT_COMPUTED,
+            "Cell": Cell,
+            "CompiledFunction": CompiledFunction,
+            "LoxClass": LoxClass,
+            "LoxInstance": LoxInstance,
+            "RuntimeException": RuntimeException,
+            "_assign": self.assign_global,
+            "_call": self.call_value,
+            "_error": self.error,
+            "_get": self.get_property,
+            "_lazy": self.lazy,
+            "_store": self.store,
+            "_store_field": self.store_field,
+            "_stringify": self.stringify,
+            "_super": self.super_method,
+            "_undefined": self.globals.get,
+        }
+
+    def execute_all(self, statements, path=None):
+        code = None
+        if path is not None:
+            code = ProgramCache.load_code(path, statements)
+        if code is None:
+            source = Transpiler().transpile(statements)
+            code = compile(source, path or "<lox>", "exec")
+            if path is not None:
+                ProgramCache.store_code(path, statements, code)
+        # Every name in the program is interned by now
+        self.globals.reserve()
+        self.module(code, statements)["_main"]([], [])
+
+    def module(self, code, statements):
+        """Run a generated module's code
+
+        :param code: code object of the module
+        :param statements: tree it was generated from
+        :return: the module's namespace
+        """
+        tokens, functions = tables(statements)
+        namespace = dict(self.runtime, T=tokens, F=functions)
+        exec(code, namespace)
+        return namespace
+
+    def lazy(self, fn, size):
+        """Code of a function whose body hasn't been parsed. The body is
+        parsed and translated the first time the function is called.
+
+        :param fn: stmt.Function
+        :param size: slots the caller fills, 'this' and the parameters
+        :return: function taking the frame and the upvalues
+        """
+        code = None
+
+        def run(frame, upvalues):
+            nonlocal code
+            if code is None:
+                if fn.body is None:
+                    fn.body = fn.lazy.load(fn)
+                    fn.lazy = None
+                source, name = Transpiler().transpile_function(fn, size)
+                module = compile(source, f"<lox {fn.name.lexeme}>", "exec")
+                code = self.module(module, [fn])[name]
+            return code(frame, upvalues)
+        return run
+
+    def call_value(self, callee, arguments, paren):
+        """Call anything other than a plain compiled function"""
+        if not isinstance(callee, LoxCallable):
+            raise RuntimeException(paren, "Can only call functions and classes.")
+        if len(arguments) != callee.arity():
+            raise RuntimeException(
+                paren, f"Expected {callee.arity()} arguments but got {len(arguments)}.")
+        return callee.call(self, arguments)
+
+    def assign_global(self, name, value):
+        self.globals.assign(name, value)
+        return value
+
+    def store(self, cell, value):
+        cell.value = value
+        return value
+
+    def store_field(self, instance, symbol, value):
+        instance.fields[symbol] = value
+        return value
+
+    def get_property(self, object, name):
+        if isinstance(object, LoxInstance):
+            return object.get(name)
+        raise RuntimeException(name, "Only instances have properties.")
+
+    def super_method(self, superclass, object, method):
+        found = superclass.find_method(method.symbol)
+        if found is None:
+            raise RuntimeException(method, f"Undefined property '{method.lexeme}'.")
+        return found.bind(object)
+
+    def error(self, token, message):
+        raise RuntimeException(token, message)
@@ -0,0 +1,182 @@
+"""Regex driven scanner class"""
+
+import re
+
+import tokenclass as token
+
+import lox
+from scanner import Scanner
+from symboltable import SymbolTable
+from tokentypes import TokenType
+
+
+class RegexScanner:
+    """Alternative scanning engine that recognizes whole lexemes with a
+    single compiled master pattern. Produces the same tokens as
+    Scanner, but lets the regular expression engine do the per
+    character work.
+    """
+
+    # Order matters: the terminated string has to be tried before the
+    # unterminated one, and the catch-all error group has to come last.
+    pattern = re.compile(
+        r"""
+        (?P<skip>(?:[ \t\r]+|//[^\n]*)+)
+        |(?P<newline>\n+)
+        |(?P<number>[0-9]+(?:\.[0-9]+)?)
+        |(?P<identifier>[A-Za-z_][A-Za-z0-9_]*)
+        |(?P<string>"[^"]*")
+        |(?P<unterminated>"[^"]*)
+        |(?P<operator>[!=<>]=?|[(){},.\-+;*/])
+        |(?P<error>.)
+        """,
+        re.VERBOSE | re.DOTALL,
+    )
+
+    operators = {
+        "(": TokenType.LEFT_PAREN,
+        ")": TokenType.RIGHT_PAREN,
+        "{": TokenType.LEFT_BRACE,
+        "}": TokenType.RIGHT_BRACE,
+        ",": TokenType.COMMA,
+        ".": TokenType.DOT,
+        "-": TokenType.MINUS,
+        "+": TokenType.PLUS,
+        ";": TokenType.SEMICOLON,
+        "*": TokenType.STAR,
+        "/": TokenType.SLASH,
+        "!": TokenType.BANG,
+        "!=": TokenType.BANG_EQUAL,
+        "=": TokenType.EQUAL,
+        "==": TokenType.EQUAL_EQUAL,
+        "<": TokenType.LESS,
+        "<=": TokenType.LESS_EQUAL,
+        ">": TokenType.GREATER,
+        ">=": TokenType.GREATER_EQUAL,
+    }
+
+    keywords = Scanner.keywords
+    named = Scanner.named
+
+    # Whether self.tokens is a TokenArray, which scan_source fills with
+    # type ids and positions instead of Token objects
+    compact = False
+
+    def __init__(self, source=""):
+        self.source = source
+        self.tokens = []
+        self.line = 1
+
+    def scan_tokens(self):
+        """Walk the master pattern over the source and append a token
+        for every lexeme it recognizes.
+
+        :return: list of tokens
+        """
+        self.scan_source(self.source, len(self.source))
+        self.tokens.append(token.Token(TokenType.EOF, "", None, self.line))
+        return self.tokens
+
+    def scan_stream(self, reader, chunk_size=65536):
+        """Lazily scan a file object a chunk at a time. A lexeme that
+        runs up to the end of the buffered text might continue in the
+        next chunk, so it is carried over and rescanned.
+
+        :param reader: file object opened in text mode
+        :param chunk_size: number of characters read at a time
+        :return: generator of tokens
+        """
+        buffer = ""
+        while True:
+            chunk = reader.read(chunk_size)
+            buffer += chunk
+            # Deciding where a lexeme ends takes at most two characters
+            # of lookahead ("1.5", "<=", "//"), so hold back anything
+            # that ends in the last two until we know more.
+            limit = len(buffer) - 2 if chunk else len(buffer)
+            stop = self.scan_source(buffer, limit)
+            yield from self.tokens
+            self.tokens.clear()
+            buffer = buffer[stop:]
+            if not chunk:
+                break
+        yield token.Token(TokenType.EOF, "", None, self.line)
+
+    def scan_source(self, source, limit):
+        """Add a token for every lexeme in source that ends at or
+        before limit.
+
+        :param source: text to scan
+        :param limit: offset the last accepted lexeme may end at
+        :return: offset of the first lexeme that was not consumed
+        """
+        tokens = self.tokens
+        append = tokens.append
+        compact = self.compact
+        Token = token.Token
+        operators = self.operators
+        keywords = self.keywords
+        identifier = TokenType.IDENTIFIER
+        number = TokenType.NUMBER
+        string = TokenType.STRING
+        if compact:
+            type_ids = tokens.type_ids
+            operators = {k: type_ids[v] for k, v in operators.items()}
+            keywords = {k: type_ids[v] for k, v in keywords.items()}
+            identifier = type_ids[identifier]
+            number = type_ids[number]
+            string = type_ids[string]
+        symbols = SymbolTable.ids
+        names = SymbolTable.names
+        named = self.named
+        line = self.line
+
+        for m in self.pattern.finditer(source):
+            if m.end() > limit:
+                self.line = line
+                return m.start()
+            kind = m.lastgroup
+            if kind == "skip":
+                continue
+            if kind == "newline":
+                line += m.end() - m.start()
+            elif kind == "identifier":
+                text = m.group()
+                tokentype = keywords.get(text, identifier)
+                if compact:
+                    append(tokentype, m.start(), len(text), line)
+                elif tokentype in named:
+                    symbol = symbols.get(text)
+                    if symbol is None:
+                        symbol = SymbolTable.intern(text)
+                    append(Token(tokentype, names[symbol], None, line, symbol))
+                else:
+                    append(Token(tokentype, text, None, line))
+            elif kind == "operator":
+                text = m.group()
+                if compact:
+                    append(operators[text], m.start(), len(text), line)
+                else:
+                    append(Token(operators[text], text, None, line))
+            elif kind == "number":
+                if compact:
+                    start, end = m.span()
+                    append(number, start, end - start, line)
+                else:
+                    text = m.group()
+                    append(Token(number, text, float(text), line))
+            elif kind == "string":
+                text = m.group()
+                line += text.count("\n")
+                if compact:
+                    append(string, m.start(), len(text), line)
+                else:
+                    append(Token(string, text, text[1:-1], line))
+            elif kind == "unterminated":
+                line += m.group().count("\n")
+                lox.Lox.error(line, "Undetermined string.")
+            else:
+                lox.Lox.error(line, f"Unexpected character: {m.group()}")
+
+        self.line = line
+        return len(source)
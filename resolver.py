@@ -5,11 +5,27 @@ import lox
 import expr
 import stmt
 from enum import Enum
+from symboltable import INIT, SUPER, THIS
+from tokentypes import TokenType
 
 
 class Resolver(expr.Visitor, stmt.Visitor):
     """Implements expr and stmt visitors because we visit every node
-    in the syntax tree
+    in the syntax tree. Each local scope maps a symbol to the slot its
+    variable gets in the runtime Environment. Blocks don't get an
+    Environment of their own: all the scopes of a function share its
+    frame, and a block's variables take the slots after the ones in use
+    when it starts, which later blocks reuse once it ends. Every use of a
+    variable is annotated with where to find it:
+
+    - a local of the same function: depth 0 and its slot in the frame
+    - a local of an enclosing function: depth -1 and the index of the
+      upvalue the function reaches it through
+    - a global: depth None and its symbol id as the slot, which is
+      where GlobalEnvironment keeps it
+
+    Locals that some inner function uses are marked as captured, so the
+    runtime keeps them in a Cell that the closure can share.
     """
 
     class FunctionType(Enum):
@@ -23,14 +39,33 @@ class Resolver(expr.Visitor, stmt.Visitor):
         CLASS = "CLASS"
         SUBCLASS = "SUBCLASS"
 
+    class FunctionScope:
+        """Bookkeeping for the function whose body is being resolved"""
+
+        def __init__(self, node, start, enclosing, outer=None):
+            self.node = node            # stmt.Function, None for top-level code
+            self.start = start          # index of its outermost scope in scopes
+            self.enclosing = enclosing
+            self.upvalues = [] if node is None else node.upvalues
+            self.upvalue_index = {}     # (depth, slot) -> upvalue index
+            self.size = 0               # frame slots taken by the open scopes
+            self.outer = outer          # symbol -> upvalue index, for deferred bodies
+
     scopes = []
     current_fn = FunctionType.NONE
     current_cls = ClassType.NONE
 
-    def __init__(self, interpreter):
-        self.interpreter = interpreter
+    def __init__(self):
+        self.scopes = []
+        self.declarations = []   # per scope, symbol -> declaring Var/Function/Class
+        self.undefined = set()   # declared locals whose initializer is being resolved
+        self.deferred = False    # whether resolving a body that was parsed lazily
+        self.function = self.FunctionScope(None, 0, None)
+        self.stmt_dispatch = stmt.dispatch_table(self)
 
     def visit_block_stmt(self, s):
+        # Outside of any function, a block needs a frame to run in
+        s.frame = not self.scopes
         self.begin_scope()
         self.resolve(s.statements)
         self.end_scope()
@@ -39,26 +74,23 @@ class Resolver(expr.Visitor, stmt.Visitor):
     def visit_class_stmt(self, s):
         enclosing_cls = self.current_cls
         self.current_cls = self.ClassType.CLASS
-        self.declare(s.name)
+        self.declare(s.name, s)
         self.define(s.name)
-        if s.superclass and s.name.lexeme == s.superclass.name.lexeme:
+        if s.superclass and s.name.symbol == s.superclass.name.symbol:
             lox.Lox.error(s.superclass.name,
                 "A class can't inherit from itself.")
         if s.superclass:
             self.current_cls = self.ClassType.SUBCLASS
             self.resolve(s.superclass)
         if s.superclass:
+            # Always kept in a Cell at runtime, so it needs no marking
             self.begin_scope()
-            self.scopes[-1]["super"] = True
-        self.begin_scope()
-        # using last index instead of peek()
-        self.scopes[-1]["this"] = True
+            self.add_slot(SUPER)
         for method in s.methods:
             declaration = self.FunctionType.METHOD
-            if method.name.lexeme == "init":
+            if method.name.symbol == INIT:
                 declaration = self.FunctionType.INITIALIZER
             self.resolve_function(method, declaration)
-        self.end_scope()
         if s.superclass:
             self.end_scope()
         self.current_cls = enclosing_cls
@@ -69,7 +101,7 @@ class Resolver(expr.Visitor, stmt.Visitor):
         return None
 
     def visit_function_stmt(self, s):
-        self.declare(s.name)
+        self.declare(s.name, s)
         self.define(s.name)
         self.resolve_function(s, self.FunctionType.FUNCTION)
         return None
@@ -94,14 +126,12 @@ class Resolver(expr.Visitor, stmt.Visitor):
             lox.Lox.error(s.keyword, 
                 "Can't return from top level code.")
         if s.value is not None:
-            if self.current_fn == self.FunctionType.INITIALIZER:
-                lox.Lox.error(s.keyword,
-                    "Can't return a value from an initializer")
+            self.check_return_value(s.keyword)
             self.resolve(s.value)
         return None
 
     def visit_var_stmt(self, s):
-        self.declare(s.name)
+        self.declare(s.name, s)
         if s.initializer:
             self.resolve(s.initializer)
         self.define(s.name)
@@ -119,8 +149,12 @@ class Resolver(expr.Visitor, stmt.Visitor):
         return None
 
     def visit_binary_expr(self, e):
-        self.resolve(e.right)
-        self.resolve(e.left)
+        # Chains such as a + b + c are walked down their left operands
+        # in a loop, so that their length isn't bound by the Python stack
+        while type(e) is expr.Binary:
+            self.resolve(e.right)
+            e = e.left
+        self.resolve(e)
         return None
 
     def visit_call_expr(self, e):
@@ -129,6 +163,12 @@ class Resolver(expr.Visitor, stmt.Visitor):
             self.resolve(argument)
         return None
 
+    def visit_conditional_expr(self, e):
+        self.resolve(e.condition)
+        self.resolve(e.then_branch)
+        self.resolve(e.else_branch)
+        return None
+
     def visit_get_expr(self, e):
         self.resolve(e.object)
         return None
@@ -137,12 +177,26 @@ class Resolver(expr.Visitor, stmt.Visitor):
         self.resolve(e.expression)
         return None
 
+    def visit_hoisted_expr(self, e):
+        self.resolve(e.expression)
+        return None
+
+    def visit_inline_expr(self, e):
+        # The body was resolved with the function it was taken from
+        self.resolve(e.call)
+        return None
+
     def visit_literal_expr(self, e):
         return None
 
     def visit_logical_expr(self, e):
-        self.resolve(e.left)
-        self.resolve(e.right)
+        chain = []
+        while type(e) is expr.Logical:
+            chain.append(e)
+            e = e.left
+        self.resolve(e)
+        for e in reversed(chain):
+            self.resolve(e.right)
         return None
 
     def visit_set_expr(self, e):
@@ -151,19 +205,13 @@ class Resolver(expr.Visitor, stmt.Visitor):
         return None
 
     def visit_super_expr(self, e):
-        if self.current_cls == self.ClassType.NONE:
-            lox.Lox.error(e.keyword,
-                "Can't use 'super' outside of a class.")
-        elif self.current_cls != self.ClassType.SUBCLASS:
-            lox.Lox.error(e.keyword,
-                "can't use 'super' in a class with no superclass.")
-        self.resolve_local(e, e.keyword)
+        self.check_super(e.keyword)
+        e.depth, e.slot = self.lookup(SUPER)
+        e.this_depth, e.this_slot = self.lookup(THIS)
         return None
 
     def visit_this_expr(self, e):
-        if self.current_cls == self.ClassType.NONE:
-            lox.Lox.error(e.keyword,
-                "Can't use 'this' outisde of a class.")
+        if not self.check_this(e.keyword):
             return None
         self.resolve_local(e, e.keyword)
         return None
@@ -173,7 +221,8 @@ class Resolver(expr.Visitor, stmt.Visitor):
         return None
 
     def visit_variable_expr(self, e):
-        if self.scopes and self.scopes[-1].get(e.name.lexeme, None) == False:
+        symbol = e.name.symbol
+        if symbol in self.undefined and self.scopes and symbol in self.scopes[-1]:
             lox.Lox.error(e.name, 
                 "Can't read local variable in its own initializer.")
         self.resolve_local(e, e.name)
@@ -181,45 +230,270 @@ class Resolver(expr.Visitor, stmt.Visitor):
 
     def resolve(self, input):
         if isinstance(input, list):
+            dispatch = self.stmt_dispatch
             for statement in input:
-                statement.accept(self)
+                dispatch[statement.kind](statement)
         else:
             input.accept(self)
             
     def resolve_function(self, fn, fn_type):
         enclosing_fn = self.current_fn
         self.current_fn = fn_type
+        self.begin_function(fn, fn_type)
+        if fn.body is None:
+            self.defer(fn, fn_type)
+        else:
+            self.resolve(fn.body)
+        self.end_function()
+        self.current_fn = enclosing_fn
+
+    def begin_function(self, fn, fn_type, outer=None):
+        """Open the scope of a function's frame and declare what the
+        caller puts in it: 'this' for methods, then the parameters
+        """
+        fn.cells = []
+        if outer is None:
+            fn.upvalues = []
+        self.function = self.FunctionScope(
+            fn, len(self.scopes), self.function, outer)
         self.begin_scope()
+        if fn_type in (self.FunctionType.METHOD, self.FunctionType.INITIALIZER):
+            self.add_slot(THIS)
         for param in fn.params:
             self.declare(param)
             self.define(param)
-        self.resolve(fn.body)
+
+    def end_function(self):
         self.end_scope()
-        self.current_fn = enclosing_fn
+        self.function = self.function.enclosing
+
+    def defer(self, fn, fn_type):
+        """Prepare a function whose body hasn't been parsed. It can't be
+        resolved yet, but its upvalues are needed as soon as the function
+        is created. Any name in the body that refers to a local outside
+        the function is assumed to be used, and captured.
+        """
+        outer = {}
+        own = self.scopes[-1]
+        symbols = fn.lazy.symbols
+        if SUPER in symbols:
+            symbols = symbols | {THIS}   # super.method() binds 'this' too
+        for symbol in symbols:
+            if symbol in own:
+                continue
+            for i in range(len(self.scopes) - 2, -1, -1):
+                slot = self.scopes[i].get(symbol)
+                if slot is not None:
+                    outer[symbol] = self.upvalue(self.function, i, symbol, slot)
+                    break
+            else:
+                index = self.outer_upvalue(self.function, symbol)
+                if index is not None:
+                    outer[symbol] = index
+        fn.lazy.defer(outer, fn_type, self.current_cls)
+        if not self.deferred:
+            self.check_deferred(fn.lazy, fn_type)
+
+    def check_return_value(self, keyword):
+        if self.current_fn == self.FunctionType.INITIALIZER:
+            lox.Lox.error(keyword,
+                "Can't return a value from an initializer")
+
+    def check_super(self, keyword):
+        if self.current_cls == self.ClassType.NONE:
+            lox.Lox.error(keyword,
+                "Can't use 'super' outside of a class.")
+        elif self.current_cls != self.ClassType.SUBCLASS:
+            lox.Lox.error(keyword,
+                "can't use 'super' in a class with no superclass.")
+
+    def check_this(self, keyword):
+        """:return: whether 'this' may be used here"""
+        if self.current_cls == self.ClassType.NONE:
+            lox.Lox.error(keyword,
+                "Can't use 'this' outisde of a class.")
+            return False
+        return True
+
+    def check_deferred(self, lazy, fn_type):
+        """Report the errors resolving a deferred body will find about
+        where 'return', 'this' and 'super' are used, so that they stop
+        the program before it runs, as they do when the body is resolved
+        right away. Those only depend on the functions and classes
+        around each use, which a walk over the body's tokens follows by
+        their braces, without parsing them. Other errors in the body are
+        reported the first time it runs.
+
+        :param lazy: LazyBody of the function
+        :param fn_type: Resolver.FunctionType of the function
+        :return: None
+        """
+        symbols = lazy.symbols
+        if (fn_type != self.FunctionType.INITIALIZER and INIT not in symbols
+                and THIS not in symbols and SUPER not in symbols):
+            return      # nothing in the body can be misplaced
+        tokens = lazy.tokens
+        tokentype_at = getattr(tokens, "tokentype", None)  # TokenArray
+        if tokentype_at is None:
+            tokentype_at = lambda index: tokens[index].tokentype
+        enclosing_fn, enclosing_cls = self.current_fn, self.current_cls
+        self.current_fn = fn_type
+        in_class = False        # whether the innermost brace opened a class body
+        opening = None          # what the next brace opens, if a function or class
+        braces = []             # per open brace, what to restore when it closes
+        i = lazy.start
+        while i < lazy.end:
+            tokentype = tokentype_at(i)
+            if tokentype == TokenType.LEFT_BRACE:
+                braces.append((self.current_fn, self.current_cls, in_class))
+                in_class = False
+                if opening is not None:
+                    self.current_fn, self.current_cls, in_class = opening
+                    opening = None
+            elif tokentype == TokenType.RIGHT_BRACE:
+                self.current_fn, self.current_cls, in_class = braces.pop()
+            elif tokentype == TokenType.FUN:
+                opening = (self.FunctionType.FUNCTION, self.current_cls, False)
+            elif tokentype == TokenType.CLASS:
+                cls_type = self.ClassType.CLASS
+                if tokentype_at(i + 2) == TokenType.LESS:
+                    cls_type = self.ClassType.SUBCLASS
+                opening = (self.current_fn, cls_type, True)
+            elif (in_class and tokentype == TokenType.IDENTIFIER
+                    and tokentype_at(i + 1) == TokenType.LEFT_PAREN):
+                method_type = self.FunctionType.METHOD
+                if tokens[i].symbol == INIT:
+                    method_type = self.FunctionType.INITIALIZER
+                opening = (method_type, self.current_cls, False)
+            elif tokentype == TokenType.RETURN:
+                if tokentype_at(i + 1) != TokenType.SEMICOLON:
+                    self.check_return_value(tokens[i])
+            elif tokentype == TokenType.THIS:
+                self.check_this(tokens[i])
+            elif tokentype == TokenType.SUPER:
+                self.check_super(tokens[i])
+            i += 1
+        self.current_fn, self.current_cls = enclosing_fn, enclosing_cls
+
+    def resolve_deferred(self, fn, body):
+        """Resolve a lazily parsed function body, as it would have been
+        resolved where the function was declared
+
+        :param fn: stmt.Function the body belongs to
+        :param body: list of statements
+        :return: None
+        """
+        lazy = fn.lazy
+        # The enclosing body's check covered the functions in this one
+        self.deferred = True
+        self.current_fn = lazy.fn_type
+        self.current_cls = lazy.cls_type
+        self.function = None
+        self.begin_function(fn, lazy.fn_type, lazy.outer)
+        self.resolve(body)
+        self.end_function()
 
     def begin_scope(self):
         self.scopes.append({})
+        self.declarations.append({})
 
     def end_scope(self):
-        self.scopes.pop()
+        self.function.size -= len(self.scopes.pop())
+        self.declarations.pop()
+
+    def add_slot(self, symbol):
+        """Give a variable the next free slot of the function's frame"""
+        self.scopes[-1][symbol] = self.function.size
+        self.function.size += 1
 
-    def declare(self, name):
+    def declare(self, name, node=None):
         if not self.scopes: return
         # Using last index instead of peek()
         scope = self.scopes[-1]
-        if name.lexeme in scope:
+        if name.symbol in scope:
             lox.Lox.error(name,
                 "Already a variable with this name in this scope.")
-        scope[name.lexeme] = False
+            return
+        self.add_slot(name.symbol)
+        if node is not None:
+            self.declarations[-1][name.symbol] = node
+        self.undefined.add(name.symbol)
 
     def define(self, name):
         if not self.scopes: return
-        # Using last index instead of peek()
-        self.scopes[-1][name.lexeme] = True
+        self.undefined.discard(name.symbol)
 
     def resolve_local(self, e, name):
+        e.depth, e.slot = self.lookup(name.symbol)
+
+    def lookup(self, symbol):
+        """Find where a name used in the current scope lives
+
+        :param symbol: SymbolTable id of the name
+        :return: (depth, slot), see the class docstring
+        """
+        fn = self.function
         for i in range(len(self.scopes)-1, -1, -1):
-            if name.lexeme in self.scopes[i]:
-                self.interpreter.resolve(e, len(self.scopes) - 1 - i)
+            slot = self.scopes[i].get(symbol)
+            if slot is not None:
+                if i >= fn.start:
+                    return 0, slot
+                return -1, self.upvalue(fn, i, symbol, slot)
+        index = self.outer_upvalue(fn, symbol)
+        if index is not None:
+            return -1, index
+        return None, symbol
+
+    def upvalue(self, fn, i, symbol, slot):
+        """Index of the upvalue through which fn reaches a local of an
+        enclosing function, adding upvalues along the way as needed
+
+        :param fn: FunctionScope of the function using the variable
+        :param i: index of the variable's scope in scopes
+        :return: int
+        """
+        enclosing = fn.enclosing
+        if i >= enclosing.start:
+            # Local of the function fn is declared in, found in the
+            # frame the declaration runs in
+            self.capture(i, symbol, slot)
+            key = (0, slot)
+        else:
+            key = (-1, self.upvalue(enclosing, i, symbol, slot))
+        return self.add_upvalue(fn, key)
+
+    def outer_upvalue(self, fn, symbol):
+        """Inside a deferred body, names that aren't in any scope may
+        still be locals of functions around the deferred one, which it
+        captured when it was declared
+        """
+        if fn.outer is not None:
+            return fn.outer.get(symbol)
+        if fn.enclosing is None:
+            return None
+        index = self.outer_upvalue(fn.enclosing, symbol)
+        if index is None:
+            return None
+        return self.add_upvalue(fn, (-1, index))
+
+    def add_upvalue(self, fn, key):
+        index = fn.upvalue_index.get(key)
+        if index is None:
+            index = fn.upvalue_index[key] = len(fn.upvalues)
+            fn.upvalues.append(key)
+        return index
+
+    def capture(self, i, symbol, slot):
+        """Mark the local in scope i as captured by a closure"""
+        node = self.declarations[i].get(symbol)
+        if node is not None:
+            node.captured = True
+            return
+        # A parameter, or 'this', of the function whose frame this is
+        fn = self.function
+        while fn is not None:
+            if fn.start == i and fn.node is not None:
+                if slot not in fn.node.cells:
+                    fn.node.cells.append(slot)
                 return
-    
+            fn = fn.enclosing
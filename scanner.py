@@ -3,6 +3,7 @@
 import tokenclass as token
 
 import lox
+from symboltable import SymbolTable
 from tokentypes import TokenType
 
 
@@ -68,6 +69,10 @@ class Scanner:
         "while": TokenType.WHILE,
     }
 
+    # Token types whose lexemes are interned in the SymbolTable. Other
+    # keywords are never looked up by name.
+    named = {TokenType.IDENTIFIER, TokenType.THIS, TokenType.SUPER}
+
     def scan_tokens(self):
         """Take in the source code as a single string. Append tokens
         to the token list as we find them and return the list when
@@ -115,7 +120,12 @@ class Scanner:
         tokentype = self.keywords.get(text, None)
         if tokentype is None:
             tokentype = TokenType.IDENTIFIER
-        self.add_token(tokentype)
+        if tokentype not in self.named:
+            self.add_token(tokentype)
+            return
+        symbol = SymbolTable.intern(text)
+        self.tokens.append(token.Token(
+            tokentype, SymbolTable.names[symbol], None, self.line, symbol))
 
     def number(self):
         """Convert numeric characters into python floats
@@ -191,7 +201,7 @@ class Scanner:
         :return: None
         """
         if self.match("/"):
-            while self.peek() != "\n" and not self.is_at_end:
+            while self.peek() != "\n" and not self.is_at_end():
                 self.advance()
         else:
             self.add_token(TokenType.SLASH)
@@ -245,4 +255,4 @@ class Scanner:
         :return: None
         """
         text = self.source[self.start:self.current]
-        self.tokens.append(token.Token(tokentype, text, literal, None))
+        self.tokens.append(token.Token(tokentype, text, literal, self.line))
@@ -4,6 +4,8 @@ from abc import ABC, abstractmethod
 
 class Stmt(ABC):
 
+	__slots__ = ()
+
 	@abstractmethod
 	def accept(self, visitor):
 		pass
@@ -46,83 +48,160 @@ class Visitor(ABC):
 	def visit_while_stmt(self, stmt):
 		pass
 
+def dispatch_table(visitor):
+	"""Visitor methods indexed by Stmt.kind"""
+	return [
+		visitor.visit_block_stmt,
+		visitor.visit_class_stmt,
+		visitor.visit_expression_stmt,
+		visitor.visit_function_stmt,
+		visitor.visit_if_stmt,
+		visitor.visit_print_stmt,
+		visitor.visit_return_stmt,
+		visitor.visit_var_stmt,
+		visitor.visit_while_stmt,
+	]
+
 class Block(Stmt):
 
+	__slots__ = ("statements", "frame", "line",)
+	fields = ("statements",)
+	extras = ("frame",)
+	kind = 0
+
 	def __init__(self, statements):
 		self.statements = statements
+		self.frame = None
+		self.line = None
 
 	def accept(self, visitor):
 		return visitor.visit_block_stmt(self)
 
 class Class(Stmt):
 
+	__slots__ = ("name", "superclass", "methods", "captured", "line",)
+	fields = ("name", "superclass", "methods",)
+	extras = ("captured",)
+	kind = 1
+
 	def __init__(self, name, superclass, methods):
 		self.name = name
 		self.superclass = superclass
 		self.methods = methods
+		self.captured = None
+		self.line = name.line
 
 	def accept(self, visitor):
 		return visitor.visit_class_stmt(self)
 
 class Expression(Stmt):
 
+	__slots__ = ("expression", "line",)
+	fields = ("expression",)
+	extras = ()
+	kind = 2
+
 	def __init__(self, expression):
 		self.expression = expression
+		self.line = expression.line if expression is not None else None
 
 	def accept(self, visitor):
 		return visitor.visit_expression_stmt(self)
 
 class Function(Stmt):
 
+	__slots__ = ("name", "params", "body", "lazy", "upvalues", "cells", "captured", "line",)
+	fields = ("name", "params", "body",)
+	extras = ("lazy", "upvalues", "cells", "captured",)
+	kind = 3
+
 	def __init__(self, name, params, body):
 		self.name = name
 		self.params = params
 		self.body = body
+		self.lazy = None
+		self.upvalues = None
+		self.cells = None
+		self.captured = None
+		self.line = name.line
 
 	def accept(self, visitor):
 		return visitor.visit_function_stmt(self)
 
 class If(Stmt):
 
+	__slots__ = ("condition", "then_branch", "else_branch", "line",)
+	fields = ("condition", "then_branch", "else_branch",)
+	extras = ()
+	kind = 4
+
 	def __init__(self, condition, then_branch, else_branch):
 		self.condition = condition
 		self.then_branch = then_branch
 		self.else_branch = else_branch
+		self.line = condition.line if condition is not None else None
 
 	def accept(self, visitor):
 		return visitor.visit_if_stmt(self)
 
 class Print(Stmt):
 
+	__slots__ = ("expression", "line",)
+	fields = ("expression",)
+	extras = ()
+	kind = 5
+
 	def __init__(self, expression):
 		self.expression = expression
+		self.line = expression.line if expression is not None else None
 
 	def accept(self, visitor):
 		return visitor.visit_print_stmt(self)
 
 class Return(Stmt):
 
+	__slots__ = ("keyword", "value", "line",)
+	fields = ("keyword", "value",)
+	extras = ()
+	kind = 6
+
 	def __init__(self, keyword, value):
 		self.keyword = keyword
 		self.value = value
+		self.line = keyword.line
 
 	def accept(self, visitor):
 		return visitor.visit_return_stmt(self)
 
 class Var(Stmt):
 
+	__slots__ = ("name", "initializer", "captured", "line",)
+	fields = ("name", "initializer",)
+	extras = ("captured",)
+	kind = 7
+
 	def __init__(self, name, initializer):
 		self.name = name
 		self.initializer = initializer
+		self.captured = None
+		self.line = name.line
 
 	def accept(self, visitor):
 		return visitor.visit_var_stmt(self)
 
 class While(Stmt):
 
+	__slots__ = ("condition", "body", "hoisted", "counted", "line",)
+	fields = ("condition", "body",)
+	extras = ("hoisted", "counted",)
+	kind = 8
+
 	def __init__(self, condition, body):
 		self.condition = condition
 		self.body = body
+		self.hoisted = None
+		self.counted = None
+		self.line = condition.line if condition is not None else None
 
 	def accept(self, visitor):
 		return visitor.visit_while_stmt(self)
@@ -0,0 +1,52 @@
+"""Symbol table for identifiers"""
+
+
+class SymbolTable:
+    """Interns identifier lexemes. Every distinct identifier gets one
+    shared lexeme string and a small integer id, and scopes,
+    environments, fields and methods are keyed on that id instead of
+    on the string.
+    """
+
+    ids = {}
+    names = []
+
+    @classmethod
+    def intern(cls, name):
+        """Return the id for an identifier, assigning the next free id
+        the first time the identifier is seen
+
+        :param name: identifier lexeme
+        :return: int
+        """
+        symbol = cls.ids.get(name)
+        if symbol is None:
+            symbol = cls.ids[name] = len(cls.names)
+            cls.names.append(name)
+        return symbol
+
+    @classmethod
+    def name(cls, symbol):
+        return cls.names[symbol]
+
+    @classmethod
+    def restore(cls, names):
+        """Bring back the ids a saved program was compiled against.
+        This only works if every identifier interned so far got the
+        same id it had when the program was saved.
+
+        :param names: SymbolTable.names as it was when saved
+        :return: True if the saved ids are valid again
+        """
+        if names[:len(cls.names)] != cls.names:
+            return False
+        for name in names[len(cls.names):]:
+            cls.intern(name)
+        return True
+
+
+# Names the runtime refers to on its own.
+THIS = SymbolTable.intern("this")
+SUPER = SymbolTable.intern("super")
+INIT = SymbolTable.intern("init")
+CLOCK = SymbolTable.intern("clock")
@@ -1,4 +1,5 @@
 #!/bin/bash
+# Options are passed on to lox.py, e.g. ./testrunner.sh --lazy --engine vm
 
 echo " "
 echo "******************************************"
@@ -9,7 +10,16 @@ echo "******************************************"
 echo " "
 
 for file in ./tests/*.lox; do
-    output=$(python3 lox.py "$file")
+    output=$(python3 lox.py "$@" "$file")
     echo "$output"
     echo "---------------------------------------"
-done
\ No newline at end of file
+done
+
+# Lazily parsed functions whose parameters are captured, in the VM
+output=$(python3 lox.py --engine vm --lazy ./tests/capture.lox)
+echo "$output"
+echo "---------------------------------------"
+# Lazily parsed bodies go through the optimizer when they load
+output=$(python3 lox.py --no-cache --lazy --optimize --stats ./tests/loops.lox 2>&1)
+echo "$output"
+echo "---------------------------------------"
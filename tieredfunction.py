@@ -0,0 +1,36 @@
+"""Function that moves to compiled code once it is hot"""
+
+from compiledfunction import NIL
+from loxfunction import LoxFunction
+
+
+class TieredFunction(LoxFunction):
+    """Runtime function of the TieredInterpreter. Its calls are counted
+    against its declaration, and while the declaration is cold the body
+    is walked like any LoxFunction's. Once it is hot, calls run the body
+    the interpreter compiled for it, the way a CompiledFunction does.
+    """
+
+    def bind(self, instance):
+        return TieredFunction(self.declaration, self.upvalues, self.is_initializer, instance)
+
+    def call(self, interpreter, arguments):
+        declaration = self.declaration
+        code = interpreter.compiled.get(declaration)
+        if code is None:
+            code = interpreter.count_call(declaration, self.instance is not None)
+        if code is None:
+            previous = interpreter.running
+            interpreter.running = declaration
+            try:
+                return super().call(interpreter, arguments)
+            finally:
+                interpreter.running = previous
+        # 'this' and the parameters take the first slots of the frame
+        values = arguments if self.instance is None else [self.instance, *arguments]
+        value = code(values, self.upvalues)
+        if self.is_initializer:
+            return self.instance
+        if value is NIL:
+            return None
+        return value
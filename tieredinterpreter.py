@@ -0,0 +1,110 @@
+"""Interpreter that compiles the functions that get hot"""
+
+from cell import Cell
+from closurecompiler import ClosureCompiler
+from compiledfunction import NIL
+from interpreter import Interpreter
+from returnvalue import Return
+from tieredfunction import TieredFunction
+
+# Calls, and loop iterations run by its body, after which a function
+# is compiled. A loop is compiled too once it has run LOOP_THRESHOLD
+# iterations.
+CALL_THRESHOLD = 50
+LOOP_THRESHOLD = 1000
+
+
+class TieredInterpreter(Interpreter):
+    """Walks the tree like the Interpreter, but counts the calls of each
+    function declaration and the loop iterations its body runs. When
+    either reaches its threshold the body is compiled into closures by a
+    ClosureCompiler, and every later call of the function, from walked
+    or compiled code, runs those instead. Code that stays cold is never
+    compiled.
+
+    Loops in walked code, top-level code included, are counted too. A
+    loop that gets hot is compiled while it runs, and its remaining
+    iterations run compiled, in the frame the walker was using, as do
+    its later runs.
+    """
+
+    function_class = TieredFunction
+
+    def __init__(self, call_threshold=CALL_THRESHOLD, loop_threshold=LOOP_THRESHOLD, log=None):
+        super().__init__()
+        self.compiler = ClosureCompiler(self)
+        self.call_threshold = call_threshold
+        self.loop_threshold = loop_threshold
+        self.log = log              # file tier-up events are reported to, or None
+        self.calls = {}             # stmt.Function -> times it was called while cold
+        self.iterations = {}        # stmt.Function -> loop iterations its walked body ran
+        self.compiled = {}          # stmt.Function -> its compiled body
+        self.loop_counts = {}       # stmt.While -> iterations it ran while cold
+        self.loops = {}             # stmt.While -> its compiled loop
+        self.running = None         # declaration of the function being walked
+
+    def count_call(self, declaration, is_method):
+        """Count a call of a cold function, and compile it if that
+        makes it hot
+
+        :param declaration: stmt.Function
+        :param is_method: whether 'this' takes slot 0 of its frame
+        :return: the compiled body, or None while it is cold
+        """
+        calls = self.calls.get(declaration, 0) + 1
+        self.calls[declaration] = calls
+        iterations = self.iterations.get(declaration, 0)
+        if calls < self.call_threshold and iterations < self.loop_threshold:
+            return None
+        code = self.compiler.function(declaration, len(declaration.params) + is_method)
+        self.compiled[declaration] = code
+        if self.log is not None:
+            print(f"tier-up: {declaration.name.lexeme} (line {declaration.line}) "
+                  f"after {calls} calls, {iterations} loop iterations", file=self.log)
+        return code
+
+    def loop(self, s):
+        code = self.loops.get(s)
+        if code is None:
+            code = self.walk_loop(s)
+            if code is None:
+                return
+        values = self.environment.values
+        if self.environment is self.globals:
+            values = self.frame.values
+        result = code(values, self.upvalues)
+        if result is not None:
+            raise Return(None if result is NIL else result)
+
+    def walk_loop(self, s):
+        """Walk a loop until it ends or gets hot
+
+        :param s: stmt.While
+        :return: the compiled loop, to run the remaining iterations,
+            or None if the loop ended
+        """
+        running = self.running
+        start = count = self.loop_counts.get(s, 0)
+        try:
+            while self.is_truthy(self.evaluate(s.condition)):
+                self.execute(s.body)
+                count += 1
+                if count >= self.loop_threshold:
+                    return self.compile_loop(s, count)
+            return None
+        finally:
+            self.loop_counts[s] = count
+            if running is not None:
+                self.iterations[running] = self.iterations.get(running, 0) + count - start
+
+    def compile_loop(self, s, iterations):
+        """Compile a loop the walker is running, for the frame in use"""
+        frame = None
+        if self.environment is not self.globals:
+            frame = [type(value) is Cell for value in self.environment.values]
+        code = self.compiler.loop(s, frame)
+        self.loops[s] = code
+        if self.log is not None:
+            print(f"tier-up: loop (line {s.line}) after {iterations} iterations",
+                  file=self.log)
+        return code
@@ -0,0 +1,87 @@
+"""Compact token storage"""
+
+from array import array
+
+import tokenclass as token
+from scanner import Scanner
+from symboltable import SymbolTable
+from tokentypes import TokenType
+
+
+class TokenArray:
+    """Column store for tokens. Each token costs a type id, a start
+    offset, a length and a line number packed into arrays, instead of a
+    full Token object plus a copy of its lexeme. Token objects are only
+    built when somebody indexes into the array, and their lexemes are
+    sliced out of the original source at that point.
+    """
+
+    types = list(TokenType)
+    type_ids = {tokentype: i for i, tokentype in enumerate(types)}
+
+    named = Scanner.named
+
+    # Bound on the number of materialized tokens kept around. The parser
+    # only ever looks at the current and previous token, so this just
+    # saves rebuilding the same few tokens over and over.
+    cache_size = 64
+
+    def __init__(self, source):
+        self.source = source
+        self.kinds = array("B")
+        self.starts = array("I")
+        self.lengths = array("I")
+        self.lines = array("I")
+        self.cache = {}
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __getitem__(self, index):
+        """Build the Token at a position
+
+        :param index: token position
+        :return: Token
+        """
+        try:
+            return self.cache[index]
+        except KeyError:
+            if len(self.cache) >= self.cache_size:
+                self.cache.clear()
+            tok = self.cache[index] = self.materialize(index)
+            return tok
+
+    def append(self, type_id, start, length, line):
+        """Add a token
+
+        :param type_id: index of the token type in TokenArray.types
+        :param start: offset of the lexeme in the source
+        :param length: length of the lexeme
+        :param line: line the token was found on
+        :return: None
+        """
+        self.kinds.append(type_id)
+        self.starts.append(start)
+        self.lengths.append(length)
+        self.lines.append(line)
+
+    def tokentype(self, index):
+        return self.types[self.kinds[index]]
+
+    def lexeme(self, index):
+        start = self.starts[index]
+        return self.source[start:start + self.lengths[index]]
+
+    def materialize(self, index):
+        tokentype = self.types[self.kinds[index]]
+        lexeme = self.lexeme(index)
+        literal = None
+        symbol = None
+        if tokentype == TokenType.NUMBER:
+            literal = float(lexeme)
+        elif tokentype == TokenType.STRING:
+            literal = lexeme[1:-1]
+        elif tokentype in self.named:
+            symbol = SymbolTable.intern(lexeme)
+            lexeme = SymbolTable.names[symbol]
+        return token.Token(tokentype, lexeme, literal, self.lines[index], symbol)
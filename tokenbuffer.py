@@ -0,0 +1,36 @@
+"""Token buffer class"""
+
+
+class TokenBuffer:
+    """Sliding window over a lazily produced token stream. Indexes are
+    absolute, like positions in a token list, so the parser can use it
+    in place of one. Tokens the parser is done with can be released so
+    memory stays bounded no matter how long the stream is.
+    """
+
+    def __init__(self, tokens):
+        self.source = iter(tokens)
+        self.window = []
+        self.offset = 0
+
+    def __getitem__(self, index):
+        """Return the token at an absolute position, pulling more
+        tokens from the stream as needed
+
+        :param index: absolute token position
+        :return: Token
+        """
+        i = index - self.offset
+        while i >= len(self.window):
+            self.window.append(next(self.source))
+        return self.window[i]
+
+    def release(self, index):
+        """Forget every token before an absolute position
+
+        :param index: first token position that is still needed
+        :return: None
+        """
+        if index > self.offset:
+            del self.window[:index - self.offset]
+            self.offset = index
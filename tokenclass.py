@@ -4,11 +4,12 @@
 class Token:
     """Class that combines the lexeme along with its type"""
 
-    def __init__(self, tokentype, lexeme, literal, line):
+    def __init__(self, tokentype, lexeme, literal, line, symbol=None):
         self.tokentype = tokentype
         self.lexeme = lexeme
         self.literal = literal
         self.line = line
+        self.symbol = symbol  # SymbolTable id for identifiers
 
     def __str__(self):
         return f"{self.tokentype} {self.lexeme} {self.literal}"
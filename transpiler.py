@@ -0,0 +1,658 @@
+"""Class that translates the syntax tree into Python source code"""
+
+import math
+
+import expr
+import stmt
+import tokenclass
+from symboltable import INIT
+from tokentypes import TokenType
+
+# Operators on two numbers, by token type
+NUMERIC = {
+    TokenType.MINUS: "-",
+    TokenType.SLASH: "/",
+    TokenType.STAR: "*",
+    TokenType.GREATER: ">",
+    TokenType.GREATER_EQUAL: ">=",
+    TokenType.LESS: "<",
+    TokenType.LESS_EQUAL: "<=",
+}
+
+# Operators whose result is always a boolean
+TESTS = (TokenType.GREATER, TokenType.GREATER_EQUAL, TokenType.LESS,
+         TokenType.LESS_EQUAL, TokenType.EQUAL_EQUAL, TokenType.BANG_EQUAL)
+
+# Nodes that may change a variable when they are evaluated
+EFFECTS = (expr.Assign, expr.Call, expr.Inline, expr.Set)
+
+# Operators in a chain, as in a + b + c, past which it is written as a
+# flat sequence of steps rather than as nested expressions, which
+# CPython's parser only takes a couple of hundred levels deep
+CHAIN = 16
+
+
+def tables(statements):
+    """Tokens and function declarations a transpiled program refers to,
+    in the order the transpiler numbers them. The generated code only
+    holds their indexes, so a cached translation can be run again with
+    the tables of the same program loaded from the program cache.
+
+    :param statements: list of statements
+    :return: (list of Token, list of stmt.Function)
+    """
+    tokens = []
+    functions = []
+    seen = set()
+    stack = [statements]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, list):
+            stack.extend(reversed(value))
+        elif id(value) in seen:
+            continue
+        elif isinstance(value, tokenclass.Token):
+            seen.add(id(value))
+            tokens.append(value)
+        elif isinstance(value, (expr.Expr, stmt.Stmt)):
+            seen.add(id(value))
+            if isinstance(value, stmt.Function):
+                functions.append(value)
+            children = [getattr(value, name) for name in value.fields]
+            if isinstance(value, expr.Inline):
+                children.append(value.function)
+            elif isinstance(value, stmt.While) and value.hoisted is not None:
+                children.append(value.hoisted)
+            stack.extend(reversed(children))
+    return tokens, functions
+
+
+class Transpiler(expr.Visitor, stmt.Visitor):
+    """Turns a resolved program into the source of a Python module, for
+    CPython to compile and run.
+
+    Each Lox function becomes a module-level def taking the frame and
+    the upvalues, the calling convention of CompiledFunction. Globals
+    live in the global environment's list, G. Locals become Python
+    locals named after the variable and its slot. A captured local, as
+    in the other engines, is a Cell: Lox gives each run of a declaration
+    a new variable, even inside a loop, which Python's own closures
+    don't. A function's upvalues are unpacked into locals on entry.
+    Top-level code goes in a function too, so its locals are fast.
+
+    Expressions become Python expressions. Operand checks are inlined,
+    with assignment expressions holding operands that are needed twice,
+    and skipped where type inference proved them unneeded. Long operator
+    chains are written as flat steps, which CPython can parse at any
+    length. Tokens, for error messages, and declarations are reached
+    through the tables T and F that `tables` builds.
+    """
+
+    def __init__(self):
+        self.frame = None           # per slot, (Python name, captured), None outside any frame
+        self.lines = []             # lines of the def being written
+        self.indent = 1
+        self.defs = []              # sources of the finished defs
+        self.temps = 0              # temporaries and functions named so far
+        self.tokens = {}            # id(Token) -> index in T
+        self.functions = {}         # id(stmt.Function) -> index in F
+        self.expr_dispatch = expr.dispatch_table(self)
+        self.stmt_dispatch = stmt.dispatch_table(self)
+
+    def transpile(self, statements):
+        """Translate a resolved program
+
+        :param statements: list of statements
+        :return: source of a module whose _main(frame, upvalues) runs
+            the program
+        """
+        self.number(statements)
+        self.begin_def("_main")
+        self.execute_all(statements)
+        self.end_def()
+        return "\n".join(self.defs) + "\n"
+
+    def transpile_function(self, fn, size):
+        """Translate a function on its own, once its lazily parsed body
+        has been loaded
+
+        :param fn: stmt.Function with its body
+        :param size: slots the caller fills, 'this' and the parameters
+        :return: (source of a module, name of the def for fn)
+        """
+        self.number([fn])
+        name = self.function(fn, size)
+        return "\n".join(self.defs) + "\n", name
+
+    def visit_block_stmt(self, s):
+        if s.frame:
+            self.frame = []
+            self.execute_all(s.statements)
+            self.frame = None
+            return None
+        base = len(self.frame)
+        self.execute_all(s.statements)
+        del self.frame[base:]
+        return None
+
+    def visit_class_stmt(self, s):
+        superclass = None
+        if s.superclass is not None:
+            superclass = self.temp("s")
+            self.emit(f"{superclass} = {self.evaluate(s.superclass)}")
+            self.emit(f"if type({superclass}) is not LoxClass:")
+            self.emit(f"    _error({self.token(s.superclass.name)}, "
+                      "\"Superclass must be a class.\")")
+        top = self.frame is None
+        if top:
+            # 'super' goes in the top-level frame, as in the tree walker
+            self.frame = []
+            name = None
+            self.emit(f"G[{s.name.symbol}] = {'Cell(None)' if s.captured else 'None'}")
+        else:
+            name = self.declare(s.name.lexeme, s.captured)
+            self.emit(f"{name} = {'Cell(None)' if s.captured else 'None'}")
+        if superclass is not None:
+            slot = len(self.frame)
+            self.frame.append((f"super_{slot}", True))
+            self.emit(f"super_{slot} = Cell({superclass})")
+        methods = []
+        for method in s.methods:
+            code = self.function(method, len(method.params) + 1)   # 'this' first
+            methods.append(
+                f"{method.name.symbol}: CompiledFunction({self.declaration(method)}, "
+                f"{self.capture(method)}, {method.name.symbol == INIT}, {code})")
+        klass = (f"LoxClass({s.name.lexeme!r}, {superclass}, "
+                 f"{{{', '.join(methods)}}})")
+        if superclass is not None:
+            self.frame.pop()
+        if top:
+            self.frame = None
+            if s.captured:
+                self.emit(f"G[{s.name.symbol}].value = {klass}")
+            else:
+                self.emit(f"G[{s.name.symbol}] = {klass}")
+        elif s.captured:
+            self.emit(f"{name}.value = {klass}")
+        else:
+            self.emit(f"{name} = {klass}")
+        return None
+
+    def visit_expression_stmt(self, s):
+        e = s.expression
+        if isinstance(e, expr.Assign):
+            value = self.evaluate(e.value)
+            if e.depth is None:
+                self.emit(f"_v = {value}")
+                self.emit(f"if G[{e.name.symbol}] is UNDEFINED:")
+                self.emit(f"    _undefined({self.token(e.name)})")
+                self.emit(f"G[{e.name.symbol}] = _v")
+            else:
+                self.emit(f"{self.target(e.depth, e.slot)} = {value}")
+        elif isinstance(e, expr.Set):
+            instance = self.temp("o")
+            self.emit(f"{instance} = {self.evaluate(e.object)}")
+            self.emit(f"if type({instance}) is not LoxInstance:")
+            self.emit(f"    _error({self.token(e.name)}, \"Only instances have fields.\")")
+            self.emit(f"{instance}.fields[{e.name.symbol}] = {self.evaluate(e.value)}")
+        else:
+            self.emit(self.evaluate(e))
+        return None
+
+    def visit_function_stmt(self, s):
+        code = self.function(s, len(s.params))
+        if self.frame is None:
+            self.emit(f"G[{s.name.symbol}] = CompiledFunction("
+                      f"{self.declaration(s)}, {self.capture(s)}, False, {code})")
+            return None
+        name = self.declare(s.name.lexeme, s.captured)
+        if s.captured:
+            # The function may capture itself, so its cell must exist
+            # before the closure is made
+            self.emit(f"{name} = Cell(None)")
+            self.emit(f"{name}.value = CompiledFunction("
+                      f"{self.declaration(s)}, {self.capture(s)}, False, {code})")
+        else:
+            self.emit(f"{name} = CompiledFunction("
+                      f"{self.declaration(s)}, {self.capture(s)}, False, {code})")
+        return None
+
+    def visit_if_stmt(self, s):
+        self.emit(f"if {self.test(s.condition)}:")
+        self.block(s.then_branch)
+        if s.else_branch is not None:
+            self.emit("else:")
+            self.block(s.else_branch)
+        return None
+
+    def visit_print_stmt(self, s):
+        self.emit(f"print(_stringify({self.evaluate(s.expression)}))")
+        return None
+
+    def visit_return_stmt(self, s):
+        if s.value is None:
+            self.emit("return None")
+        else:
+            self.emit(f"return {self.evaluate(s.value)}")
+        return None
+
+    def visit_var_stmt(self, s):
+        value = "None"
+        if s.initializer is not None:
+            value = self.evaluate(s.initializer)
+        if s.captured:
+            value = f"Cell({value})"
+        if self.frame is None:
+            self.emit(f"G[{s.name.symbol}] = {value}")
+        else:
+            self.emit(f"{self.declare(s.name.lexeme, s.captured)} = {value}")
+        return None
+
+    def visit_while_stmt(self, s):
+        if s.hoisted is not None:
+            # Loop invariants go in temporaries, named after their slots
+            base = len(self.frame)
+            for i, e in enumerate(s.hoisted):
+                self.emit("try:")
+                self.emit(f"    _t{base + i} = {self.evaluate(e)}")
+                self.emit("except (RuntimeException, ArithmeticError):")
+                self.emit(f"    _t{base + i} = NOT_COMPUTED")
+            self.frame.extend((f"_t{base + i}", False) for i in range(len(s.hoisted)))
+        self.emit(f"while {self.test(s.condition)}:")
+        self.block(s.body)
+        if s.hoisted is not None:
+            del self.frame[base:]
+        return None
+
+    def visit_assign_expr(self, e):
+        value = self.evaluate(e.value)
+        if e.depth is None:
+            return f"_assign({self.token(e.name)}, {value})"
+        if e.depth < 0:
+            return f"_store(u{e.slot}, {value})"
+        name, captured = self.frame[e.slot]
+        if captured:
+            return f"_store({name}, {value})"
+        return f"({name} := {value})"
+
+    def visit_binary_expr(self, e):
+        if type(e.left) is expr.Binary:
+            chain, first = self.chain(e)
+            if len(chain) > CHAIN:
+                return self.binary_chain(chain, first)
+        return self.binary(e)
+
+    def binary(self, e, left=None):
+        """Python expression applying a Binary node's operator
+
+        :param e: the node
+        :param left: Python local already holding the left operand's
+            value, or None to evaluate the left operand here
+        """
+        tokentype = e.operator.tokentype
+        if tokentype == TokenType.EQUAL_EQUAL:
+            # Python's == on Lox values is Interpreter.is_equal
+            return f"({left or self.evaluate(e.left)} == {self.evaluate(e.right)})"
+        if tokentype == TokenType.BANG_EQUAL:
+            return f"({left or self.evaluate(e.left)} != {self.evaluate(e.right)})"
+        symbol = "+" if tokentype == TokenType.PLUS else NUMERIC[tokentype]
+        if e.proven:
+            return f"({left or self.evaluate(e.left)} {symbol} {self.evaluate(e.right)})"
+
+        if left is None:
+            left, left_value = self.operand(e.left, [e.right])
+        else:
+            left_value = left
+        right, right_value = self.operand(e.right, [])
+        error = self.token(e.operator)
+        if tokentype == TokenType.PLUS:
+            if isinstance(e.right, expr.Literal) and type(e.right.value) in (float, str):
+                check = f"type({left}) is {type(e.right.value).__name__}"
+            elif isinstance(e.left, expr.Literal) and type(e.left.value) in (float, str):
+                check = f"type({right}) is {type(e.left.value).__name__}"
+            else:
+                check = (f"type({left}) is type({right}) "
+                         f"and type({left_value}) in (float, str)")
+            return (f"({left_value} + {right_value} if {check} "
+                    f"else _error({error}, \"Operators must be two numbers or two strings\"))")
+        if self.is_number(e.right):
+            check = f"type({left}) is float"
+        elif self.is_number(e.left):
+            check = f"type({right}) is float"
+        else:
+            check = f"type({left}) is type({right}) is float"
+        return (f"({left_value} {symbol} {right_value} if {check} "
+                f"else _error({error}, \"Operands must be a numbers\"))")
+
+    def binary_chain(self, chain, first):
+        """Python expression for a long chain of binary operators. Each
+        operator's value goes in the same temporary in turn, one item of
+        a tuple per operator, so the code is no deeper for a longer chain.
+
+        :param chain: Binary nodes, innermost first
+        :param first: the chain's leftmost operand
+        """
+        value = self.temp("v")
+        steps = [f"({value} := {self.evaluate(first)})"]
+        steps += [f"({value} := {self.binary(e, value)})" for e in chain]
+        return f"({', '.join(steps)})[-1]"
+
+    def visit_call_expr(self, e):
+        callee = self.temp("c")
+        function = self.evaluate(e.callee)
+        arguments = f"[{', '.join(self.evaluate(argument) for argument in e.arguments)}]"
+        # A plain compiled function is called right here
+        fast = (f"{callee}.instance is None and {callee}.count == {len(e.arguments)}")
+        paren = self.token(e.paren)
+        if self.size(e.arguments) <= 8 and not self.has(e.arguments, (expr.Call, expr.Inline)):
+            # Small arguments without calls can be written out in both
+            # branches
+            return (f"({callee}.code({arguments}, {callee}.upvalues) "
+                    f"if type({callee} := {function}) is CompiledFunction and {fast} "
+                    f"else _call({callee}, {arguments}, {paren}))")
+        values = self.temp("a")
+        return (f"({callee}.code({values}, {callee}.upvalues) "
+                f"if (({callee} := {function}), ({values} := {arguments})) "
+                f"and type({callee}) is CompiledFunction and {fast} "
+                f"else _call({callee}, {values}, {paren}))")
+
+    def visit_conditional_expr(self, e):
+        return (f"({self.evaluate(e.then_branch)} if {self.test(e.condition)} "
+                f"else {self.evaluate(e.else_branch)})")
+
+    def visit_get_expr(self, e):
+        instance = self.temp("o")
+        symbol = e.name.symbol
+        return (f"({instance}.fields[{symbol}] "
+                f"if type({instance} := {self.evaluate(e.object)}) is LoxInstance "
+                f"and {symbol} in {instance}.fields "
+                f"else _get({instance}, {self.token(e.name)}))")
+
+    def visit_grouping_expr(self, e):
+        return self.evaluate(e.expression)
+
+    def visit_hoisted_expr(self, e):
+        return (f"(_t{e.slot} if _t{e.slot} is not NOT_COMPUTED "
+                f"else {self.evaluate(e.expression)})")
+
+    def visit_inline_expr(self, e):
+        """Evaluate the body of an inlined function with the arguments
+        in temporaries, unless the function's name no longer refers to
+        it, in which case make the call after all
+        """
+
+        call = e.call
+        callee = self.temp("c")
+        site = self.temps
+        names = [f"_i{site}a{k}" for k in range(len(call.arguments))]
+        bindings = [f"({callee} := {self.evaluate(call.callee)})"]
+        bindings += [f"({name} := {self.evaluate(argument)})"
+                     for name, argument in zip(names, call.arguments)]
+        enclosing = self.frame
+        self.frame = [(name, False) for name in names]
+        body = self.evaluate(e.body)
+        self.frame = enclosing
+        return (f"({body} if ({', '.join(bindings)},) "
+                f"and type({callee}) is CompiledFunction "
+                f"and {callee}.declaration is {self.declaration(e.function)} "
+                f"else _call({callee}, [{', '.join(names)}], {self.token(call.paren)}))")
+
+    def visit_literal_expr(self, e):
+        value = e.value
+        if isinstance(value, float) and not math.isfinite(value):
+            return f"float({str(value)!r})"
+        return repr(value)
+
+    def visit_logical_expr(self, e):
+        if type(e.left) is expr.Logical:
+            chain, first = self.chain(e)
+            if len(chain) > CHAIN:
+                return self.logical_chain(chain, first)
+        value = self.temp("v")
+        left = self.evaluate(e.left)
+        right = self.evaluate(e.right)
+        if e.operator.tokentype == TokenType.OR:
+            return (f"({value} if ({value} := {left}) is not None "
+                    f"and {value} is not False else {right})")
+        return (f"({right} if ({value} := {left}) is not None "
+                f"and {value} is not False else {value})")
+
+    def logical_chain(self, chain, first):
+        """Python expression for a long chain of logical operators, as in
+        a or b or c, written as flat steps like binary_chain. A step only
+        evaluates its right operand when the value so far doesn't decide
+        the outcome.
+        """
+        value = self.temp("v")
+        truthy = f"{value} is not None and {value} is not False"
+        steps = [f"({value} := {self.evaluate(first)})"]
+        for e in chain:
+            right = self.evaluate(e.right)
+            if e.operator.tokentype == TokenType.OR:
+                steps.append(f"({value} := {value} if {truthy} else {right})")
+            else:
+                steps.append(f"({value} := {right} if {truthy} else {value})")
+        return f"({', '.join(steps)})[-1]"
+
+    def visit_set_expr(self, e):
+        instance = self.temp("o")
+        return (f"(_store_field({instance}, {e.name.symbol}, {self.evaluate(e.value)}) "
+                f"if type({instance} := {self.evaluate(e.object)}) is LoxInstance "
+                f"else _error({self.token(e.name)}, \"Only instances have fields.\"))")
+
+    def visit_super_expr(self, e):
+        return (f"_super({self.read(e.depth, e.slot, e.keyword)}, "
+                f"{self.read(e.this_depth, e.this_slot, e.keyword)}, {self.token(e.method)})")
+
+    def visit_this_expr(self, e):
+        return self.read(e.depth, e.slot, e.keyword)
+
+    def visit_unary_expr(self, e):
+        right = self.evaluate(e.right)
+        if e.operator.tokentype == TokenType.BANG:
+            value = self.temp("v")
+            return f"(({value} := {right}) is None or {value} is False)"
+        if e.proven:
+            return f"(-{right})"
+        value = self.temp("v")
+        return (f"(-{value} if type({value} := {right}) is float "
+                f"else _error({self.token(e.operator)}, \"Operand must be a number\"))")
+
+    def visit_variable_expr(self, e):
+        return self.read(e.depth, e.slot, e.name)
+
+    def evaluate(self, e):
+        """Python expression for a Lox expression"""
+        return self.expr_dispatch[e.kind](e)
+
+    def execute(self, s):
+        self.stmt_dispatch[s.kind](s)
+
+    def execute_all(self, statements):
+        dispatch = self.stmt_dispatch
+        for statement in statements:
+            dispatch[statement.kind](statement)
+
+    def block(self, s):
+        """Write a statement as the indented body of a compound one"""
+        self.indent += 1
+        start = len(self.lines)
+        self.execute(s)
+        if len(self.lines) == start:
+            self.emit("pass")
+        self.indent -= 1
+
+    def emit(self, line):
+        self.lines.append("    " * self.indent + line)
+
+    def temp(self, prefix):
+        self.temps += 1
+        return f"_{prefix}{self.temps}"
+
+    def begin_def(self, name):
+        self.lines = [f"def {name}(frame, upvalues):"]
+        self.indent = 1
+
+    def end_def(self):
+        if len(self.lines) == 1:
+            self.emit("pass")
+        self.defs.append("\n".join(self.lines))
+
+    def function(self, fn, size):
+        """Write the def for a function
+
+        :param fn: stmt.Function
+        :param size: slots the caller fills, 'this' and the parameters
+        :return: name of the module-level def
+        """
+        self.temps += 1
+        name = f"{fn.name.lexeme}__fn{self.temps}"
+        if fn.body is None:
+            # Parsed, and translated, the first time it is called
+            self.defs.append(f"{name} = _lazy({self.declaration(fn)}, {size})")
+            return name
+
+        lines, indent, enclosing = self.lines, self.indent, self.frame
+        self.begin_def(name)
+        params = ["this"] * (size - len(fn.params)) + [param.lexeme for param in fn.params]
+        self.frame = [(f"{param}_{slot}", slot in fn.cells)
+                      for slot, param in enumerate(params)]
+        if fn.upvalues:
+            self.emit(f"{''.join(f'u{i}, ' for i in range(len(fn.upvalues)))}= upvalues")
+        if params:
+            self.emit(f"{''.join(f'{local}, ' for local, _ in self.frame)}= frame")
+        for slot in fn.cells:
+            local = self.frame[slot][0]
+            self.emit(f"{local} = Cell({local})")
+        self.execute_all(fn.body)
+        self.end_def()
+        self.lines, self.indent, self.frame = lines, indent, enclosing
+        return name
+
+    def capture(self, fn):
+        """Python list of the cells a function closes over, taken from
+        the frame it is declared in
+        """
+        cells = []
+        for depth, slot in fn.upvalues:
+            cells.append(f"u{slot}" if depth < 0 else self.frame[slot][0])
+        return f"[{', '.join(cells)}]"
+
+    def declare(self, lexeme, captured):
+        """Name the next local of the frame"""
+        name = f"{lexeme}_{len(self.frame)}"
+        self.frame.append((name, bool(captured)))
+        return name
+
+    def read(self, depth, slot, name):
+        """Python expression reading the variable the resolver found at
+        depth, slot
+        """
+        if depth is None:
+            return (f"(_g if (_g := G[{name.symbol}]) is not UNDEFINED "
+                    f"else _undefined({self.token(name)}))")
+        if depth < 0:
+            return f"u{slot}.value"
+        local, captured = self.frame[slot]
+        if captured:
+            return f"{local}.value"
+        return local
+
+    def target(self, depth, slot):
+        """Python assignment target for a local or upvalue"""
+        if depth < 0:
+            return f"u{slot}.value"
+        local, captured = self.frame[slot]
+        if captured:
+            return f"{local}.value"
+        return local
+
+    def test(self, e):
+        """Python expression that is true when a Lox expression's value
+        is truthy
+        """
+        if isinstance(e, expr.Binary) and e.operator.tokentype in TESTS:
+            return self.evaluate(e)
+        if isinstance(e, expr.Unary) and e.operator.tokentype == TokenType.BANG:
+            return self.evaluate(e)
+        if isinstance(e, expr.Grouping):
+            return self.test(e.expression)
+        if isinstance(e, expr.Logical) and len(self.chain(e)[0]) <= CHAIN:
+            operator = "or" if e.operator.tokentype == TokenType.OR else "and"
+            return f"({self.test(e.left)} {operator} {self.test(e.right)})"
+        value = self.temp("v")
+        return f"(({value} := {self.evaluate(e)}) is not None and {value} is not False)"
+
+    def chain(self, e):
+        """Split a left-associative chain of Binary or Logical nodes, as
+        in a + b + c
+
+        :param e: the chain's last node
+        :return: (nodes of the chain's kind, innermost first, the
+            leftmost operand)
+        """
+        chain = []
+        kind = type(e)
+        while type(e) is kind:
+            chain.append(e)
+            e = e.left
+        chain.reverse()
+        return chain, e
+
+    def operand(self, e, later):
+        """Write an operand that is both checked and used
+
+        :param e: the operand
+        :param later: expressions evaluated between the check and the use
+        :return: (Python expression evaluating it, Python expression for
+            its value afterwards)
+        """
+        if isinstance(e, expr.Literal):
+            value = self.evaluate(e)
+            return value, value
+        if (isinstance(e, (expr.Variable, expr.This)) and e.depth is not None
+                and not self.has(later, EFFECTS)):
+            value = self.evaluate(e)
+            return value, value
+        value = self.temp("v")
+        return f"({value} := {self.evaluate(e)})", value
+
+    def is_number(self, e):
+        return isinstance(e, expr.Literal) and type(e.value) is float
+
+    def has(self, value, kinds):
+        """Whether a tree holds a node of one of the given kinds"""
+        stack = [value]
+        while stack:
+            value = stack.pop()
+            if isinstance(value, list):
+                stack.extend(value)
+            elif isinstance(value, kinds):
+                return True
+            elif isinstance(value, (expr.Expr, stmt.Stmt)):
+                stack.extend(getattr(value, name) for name in value.fields)
+        return False
+
+    def size(self, value):
+        """Number of nodes in a tree"""
+        count = 0
+        stack = [value]
+        while stack:
+            value = stack.pop()
+            if isinstance(value, list):
+                stack.extend(value)
+            elif isinstance(value, (expr.Expr, stmt.Stmt)):
+                count += 1
+                stack.extend(getattr(value, name) for name in value.fields)
+        return count
+
+    def number(self, statements):
+        tokens, functions = tables(statements)
+        self.tokens = {id(token): i for i, token in enumerate(tokens)}
+        self.functions = {id(fn): i for i, fn in enumerate(functions)}
+
+    def token(self, token):
+        return f"T[{self.tokens[id(token)]}]"
+
+    def declaration(self, fn):
+        return f"F[{self.functions[id(fn)]}]"
@@ -0,0 +1,302 @@
+"""Class that infers the types of expressions"""
+
+import expr
+import stmt
+from tokentypes import TokenType
+
+NUMBER = frozenset(("number",))
+STRING = frozenset(("string",))
+BOOLEAN = frozenset(("boolean",))
+NIL = frozenset(("nil",))
+OBJECT = frozenset(("object",))   # functions, classes and instances
+ANY = NUMBER | STRING | BOOLEAN | NIL | OBJECT
+NOTHING = frozenset()
+
+ARITHMETIC = (TokenType.MINUS, TokenType.SLASH, TokenType.STAR)
+
+
+class TypeInference(expr.Visitor, stmt.Visitor):
+    """Works out which types each expression can evaluate to, and marks
+    the operators whose operands are always numbers, or for +, always
+    numbers or always strings, as `proven`. The interpreter skips the
+    operand checks of proven operators.
+
+    The type of a local is the union of the types of everything assigned
+    to it anywhere, so reading it is right wherever it happens. Those
+    unions depend on each other through the expressions assigned, so the
+    program is visited again until none of them grows. Parameters,
+    globals, calls and property reads can be anything.
+    """
+
+    def __init__(self):
+        self.scopes = []            # per scope, symbol -> declaration, or None if unknown
+        self.types = {}             # declaration -> types assigned to it
+        self.hoisted = {}           # hoisted expression -> its types
+        self.lazy = set()           # symbols lazily parsed bodies may assign
+        self.changed = False
+        self.operations = 0         # checked operators seen so far
+        self.proven = 0             # how many of them were proven
+        self.expr_dispatch = expr.dispatch_table(self)
+        self.stmt_dispatch = stmt.dispatch_table(self)
+
+    def infer(self, statements):
+        """Annotate a resolved program
+
+        :param statements: list of statements
+        :return: None
+        """
+        self.lazy_symbols(statements)
+        self.settle(statements)
+
+    def infer_deferred(self, fn, body):
+        """Annotate a lazily parsed function body once it is loaded.
+        Outer locals are out of sight by then, so like globals they can
+        be anything, and only what the body assigns matters.
+
+        :param fn: stmt.Function the body belongs to
+        :param body: resolved list of statements
+        :return: None
+        """
+        lazy, self.lazy = self.lazy, set()
+        self.lazy_symbols(body)
+        self.scopes.append({param.symbol: None for param in fn.params})
+        self.settle(body)
+        self.scopes.pop()
+        self.lazy = lazy
+
+    def settle(self, statements):
+        """Visit statements until the types of no local grow"""
+        operations, proven = self.operations, self.proven
+        self.changed = True
+        while self.changed:
+            # Only the last visit, with the final types, counts
+            self.changed = False
+            self.operations, self.proven = operations, proven
+            self.execute_all(statements)
+
+    def visit_block_stmt(self, s):
+        self.scopes.append({})
+        self.execute_all(s.statements)
+        self.scopes.pop()
+        return None
+
+    def visit_class_stmt(self, s):
+        self.declare(s.name.symbol, s, OBJECT)
+        for method in s.methods:
+            self.function(method)
+        return None
+
+    def visit_expression_stmt(self, s):
+        self.evaluate(s.expression)
+        return None
+
+    def visit_function_stmt(self, s):
+        self.declare(s.name.symbol, s, OBJECT)
+        self.function(s)
+        return None
+
+    def visit_if_stmt(self, s):
+        self.evaluate(s.condition)
+        self.execute(s.then_branch)
+        if s.else_branch is not None:
+            self.execute(s.else_branch)
+        return None
+
+    def visit_print_stmt(self, s):
+        self.evaluate(s.expression)
+        return None
+
+    def visit_return_stmt(self, s):
+        if s.value is not None:
+            self.evaluate(s.value)
+        return None
+
+    def visit_var_stmt(self, s):
+        types = NIL
+        if s.initializer is not None:
+            types = self.evaluate(s.initializer)
+        self.declare(s.name.symbol, s, types)
+        return None
+
+    def visit_while_stmt(self, s):
+        if s.hoisted is not None:
+            for e in s.hoisted:
+                self.hoisted[e] = self.evaluate(e)
+        self.evaluate(s.condition)
+        self.execute(s.body)
+        return None
+
+    def visit_assign_expr(self, e):
+        types = self.evaluate(e.value)
+        declaration = self.lookup(e.name.symbol)
+        if declaration is not None:
+            self.widen(declaration, types)
+        return types
+
+    def visit_binary_expr(self, e):
+        # Chains such as a + b + c are walked down their left operands
+        # in a loop, so that their length isn't bound by the Python stack
+        chain = []
+        while type(e) is expr.Binary:
+            chain.append(e)
+            e = e.left
+        left = self.evaluate(e)
+        for e in reversed(chain):
+            left = self.binary(e, left, self.evaluate(e.right))
+        return left
+
+    def binary(self, e, left, right):
+        """Types of a Binary node's value, given those of its operands,
+        noting whether the operands' types are proven
+
+        :return: set of types
+        """
+        tokentype = e.operator.tokentype
+        if tokentype in (TokenType.EQUAL_EQUAL, TokenType.BANG_EQUAL):
+            return BOOLEAN
+        self.operations += 1
+        if tokentype == TokenType.PLUS:
+            e.proven = ((left <= NUMBER and right <= NUMBER)
+                        or (left <= STRING and right <= STRING))
+            types = NOTHING
+            if NUMBER <= left and NUMBER <= right:
+                types |= NUMBER
+            if STRING <= left and STRING <= right:
+                types |= STRING
+        else:
+            e.proven = left <= NUMBER and right <= NUMBER
+            types = NOTHING
+            if NUMBER <= left and NUMBER <= right:
+                types = NUMBER if tokentype in ARITHMETIC else BOOLEAN
+        if e.proven:
+            self.proven += 1
+        return types
+
+    def visit_call_expr(self, e):
+        self.evaluate(e.callee)
+        for argument in e.arguments:
+            self.evaluate(argument)
+        return ANY
+
+    def visit_conditional_expr(self, e):
+        self.evaluate(e.condition)
+        return self.evaluate(e.then_branch) | self.evaluate(e.else_branch)
+
+    def visit_get_expr(self, e):
+        self.evaluate(e.object)
+        return ANY
+
+    def visit_grouping_expr(self, e):
+        return self.evaluate(e.expression)
+
+    def visit_hoisted_expr(self, e):
+        return self.hoisted.get(e.expression, ANY)
+
+    def visit_inline_expr(self, e):
+        # The body is visited with its function. If the name no longer
+        # holds that function, this is a call to anything.
+        for argument in e.call.arguments:
+            self.evaluate(argument)
+        return ANY
+
+    def visit_literal_expr(self, e):
+        value = e.value
+        if value is None:
+            return NIL
+        if isinstance(value, bool):
+            return BOOLEAN
+        if isinstance(value, float):
+            return NUMBER
+        if isinstance(value, str):
+            return STRING
+        return ANY
+
+    def visit_logical_expr(self, e):
+        chain = []
+        while type(e) is expr.Logical:
+            chain.append(e)
+            e = e.left
+        types = self.evaluate(e)
+        for e in reversed(chain):
+            types |= self.evaluate(e.right)
+        return types
+
+    def visit_set_expr(self, e):
+        self.evaluate(e.object)
+        return self.evaluate(e.value)
+
+    def visit_super_expr(self, e):
+        return OBJECT
+
+    def visit_this_expr(self, e):
+        return OBJECT
+
+    def visit_unary_expr(self, e):
+        right = self.evaluate(e.right)
+        if e.operator.tokentype == TokenType.BANG:
+            return BOOLEAN
+        self.operations += 1
+        e.proven = right <= NUMBER
+        if e.proven:
+            self.proven += 1
+        return NUMBER if NUMBER <= right else NOTHING
+
+    def visit_variable_expr(self, e):
+        declaration = self.lookup(e.name.symbol)
+        if declaration is None:
+            return ANY
+        return self.types.get(declaration, NOTHING)
+
+    def evaluate(self, e):
+        return self.expr_dispatch[e.kind](e)
+
+    def execute(self, s):
+        self.stmt_dispatch[s.kind](s)
+
+    def execute_all(self, statements):
+        dispatch = self.stmt_dispatch
+        for statement in statements:
+            dispatch[statement.kind](statement)
+
+    def function(self, fn):
+        if fn.body is None:
+            return      # parsed lazily, annotated when it's loaded
+        self.scopes.append({param.symbol: None for param in fn.params})
+        self.execute_all(fn.body)
+        self.scopes.pop()
+
+    def declare(self, symbol, declaration, types):
+        if not self.scopes:
+            return      # globals can be assigned from anywhere
+        if symbol in self.lazy:
+            self.scopes[-1][symbol] = None
+            return
+        self.scopes[-1][symbol] = declaration
+        self.widen(declaration, types)
+
+    def lookup(self, symbol):
+        """Declaration of the local a name refers to
+
+        :return: declaration, or None if its types are unknown
+        """
+        for scope in reversed(self.scopes):
+            if symbol in scope:
+                return scope[symbol]
+        return None
+
+    def widen(self, declaration, types):
+        known = self.types.get(declaration, NOTHING)
+        if not types <= known:
+            self.types[declaration] = known | types
+            self.changed = True
+
+    def lazy_symbols(self, statements):
+        stack = [statements]
+        while stack:
+            value = stack.pop()
+            if isinstance(value, list):
+                stack.extend(value)
+            elif isinstance(value, stmt.Function) and value.body is None:
+                self.lazy.update(value.lazy.symbols)
+            elif isinstance(value, (expr.Expr, stmt.Stmt)):
+                stack.extend(getattr(value, name) for name in value.fields)
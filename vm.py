@@ -0,0 +1,384 @@
+"""Stack-based virtual machine that runs bytecode"""
+
+import operator
+
+from bytecode import (
+    ADD, BOX, CALL, CHECK_INSTANCE, CHECK_SUPERCLASS, CLASS, CLOSURE, CONSTANT,
+    DEFINE_GLOBAL, DIVIDE, EQUAL, FALSE, GET_CELL, GET_GLOBAL, GET_LOCAL,
+    GET_PROPERTY, GET_SUPER, GET_UPVALUE, GREATER, GREATER_EQUAL, HOIST,
+    HOISTED, JUMP, JUMP_IF_FALSE, JUMP_IF_FALSE_OR_POP, JUMP_IF_TRUE_OR_POP,
+    LESS, LESS_EQUAL, MULTIPLY, NEGATE, NEGATE_UNCHECKED, NIL, NOT, NOT_EQUAL,
+    POP, PRINT, RETURN, SET_CELL, SET_GLOBAL, SET_LOCAL, SET_PROPERTY,
+    SET_UPVALUE, SUBTRACT, TRUE, TRUNCATE, UNCHECKED)
+from bytecodecompiler import BytecodeCompiler
+from cell import Cell
+from globalenvironment import UNDEFINED
+from hoister import NOT_COMPUTED
+from interpreter import Interpreter
+from loxcallable import LoxCallable
+from loxclass import LoxClass
+from loxinstance import LoxInstance
+from runtimeexception import RuntimeException
+from symboltable import INIT
+from vmfunction import VMFunction
+
+# Operators of UNCHECKED, by operand
+OPERATORS = (operator.add, operator.sub, operator.truediv, operator.mul,
+             operator.gt, operator.ge, operator.lt, operator.le)
+
+# Deepest nesting of calls a program may make
+FRAMES_MAX = 10000
+
+
+class VM(Interpreter):
+    """Compiles each program into bytecode with a BytecodeCompiler and
+    runs it in a single dispatch loop. Lox calls push a frame of the
+    VM's own instead of recursing in Python, and a frame's locals are
+    slots of one shared value stack. Runtime state, output and errors
+    are those of the tree walker.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.compiler = BytecodeCompiler()
+        self.stack = []     # values of every frame, and their temporaries
+
+    def execute_all(self, statements, path=None):
+        script = self.compiler.compile(statements)
+        # Every name in the program is interned by now
+        self.globals.reserve()
+        self.stack = []
+        self.run(script, 0, [])
+
+    def load(self, code):
+        """Compile the body of a function on its first call, parsing it
+        first if it was parsed lazily
+
+        :param code: Code of the function
+        """
+        fn = code.declaration
+        if fn.body is None:
+            fn.body = fn.lazy.load(fn)
+            fn.lazy = None
+            # Resolving the body found which slots are captured
+            code.cells = tuple(fn.cells)
+            code.upvalues = tuple(fn.upvalues)
+        self.compiler.body(code)
+        self.globals.reserve()
+
+    def call_function(self, function, arguments):
+        """Call a function from outside the dispatch loop
+
+        :param function: VMFunction
+        :param arguments: list of values
+        :return: the value it returns
+        """
+        stack = self.stack
+        base = len(stack)
+        if function.instance is not None:
+            stack.append(function.instance)
+        stack.extend(arguments)
+        code = function.code
+        if code.ops is None:
+            self.load(code)
+        for slot in code.cells:
+            stack[base + slot] = Cell(stack[base + slot])
+        try:
+            return self.run(code, base, function.upvalues)
+        finally:
+            del stack[base:]
+
+    def call(self, callee, arguments, paren):
+        """Call anything other than a function or a class with an
+        initializer
+        """
+        if not isinstance(callee, LoxCallable):
+            raise RuntimeException(paren, "Can only call functions and classes.")
+        if len(arguments) != callee.arity():
+            raise RuntimeException(
+                paren, f"Expected {callee.arity()} arguments but got {len(arguments)}.")
+        return callee.call(self, arguments)
+
+    def run(self, code, base, upvalues):
+        """Run code until the frame it starts in returns
+
+        :param code: Code, of a function or not
+        :param base: index on the stack of the frame's slot 0
+        :param upvalues: cells the function closed over
+        :return: the value returned
+        """
+        stack = self.stack
+        push = stack.append
+        pop = stack.pop
+        globals_values = self.globals.values
+        frames = []         # state of each calling frame
+        ops = code.ops
+        constants = code.constants
+        ip = 0
+        height = base       # stack height to go back to on return
+        while True:
+            instruction = ops[ip]
+            if instruction == GET_LOCAL:
+                push(stack[base + ops[ip + 1]])
+                ip += 2
+            elif instruction == CONSTANT:
+                push(constants[ops[ip + 1]])
+                ip += 2
+            elif instruction == GET_GLOBAL:
+                value = globals_values[ops[ip + 1]]
+                if value is UNDEFINED:
+                    self.globals.get(constants[ops[ip + 2]])    # raises
+                push(value)
+                ip += 3
+            elif instruction == SET_LOCAL:
+                stack[base + ops[ip + 1]] = stack[-1]
+                ip += 2
+            elif instruction == ADD:
+                b = pop()
+                a = stack[-1]
+                kind = type(a)
+                if kind is type(b) and (kind is float or kind is str):
+                    stack[-1] = a + b
+                else:
+                    raise RuntimeException(
+                        constants[ops[ip + 1]], "Operators must be two numbers or two strings")
+                ip += 2
+            elif instruction == SUBTRACT:
+                b = pop()
+                a = stack[-1]
+                if type(a) is float and type(b) is float:
+                    stack[-1] = a - b
+                else:
+                    raise RuntimeException(constants[ops[ip + 1]], "Operands must be a numbers")
+                ip += 2
+            elif instruction == LESS:
+                b = pop()
+                a = stack[-1]
+                if type(a) is float and type(b) is float:
+                    stack[-1] = a < b
+                else:
+                    raise RuntimeException(constants[ops[ip + 1]], "Operands must be a numbers")
+                ip += 2
+            elif instruction == UNCHECKED:
+                b = pop()
+                operand = ops[ip + 1]
+                if operand == 0:
+                    stack[-1] += b
+                elif operand == 1:
+                    stack[-1] -= b
+                elif operand == 6:
+                    stack[-1] = stack[-1] < b
+                else:
+                    stack[-1] = OPERATORS[operand](stack[-1], b)
+                ip += 2
+            elif instruction == JUMP_IF_FALSE:
+                value = pop()
+                if value is None or value is False:
+                    ip = ops[ip + 1]
+                else:
+                    ip += 2
+            elif instruction == JUMP:
+                ip = ops[ip + 1]
+            elif instruction == POP:
+                pop()
+                ip += 1
+            elif instruction == CALL:
+                count = ops[ip + 1]
+                callee = stack[-count - 1]
+                if type(callee) is LoxClass:
+                    initializer = callee.find_method(INIT)
+                    if initializer is not None:
+                        callee = initializer.bind(LoxInstance(callee))
+                if type(callee) is not VMFunction:
+                    arguments = stack[len(stack) - count:]
+                    del stack[len(stack) - count - 1:]
+                    push(self.call(callee, arguments, constants[ops[ip + 2]]))
+                    ip += 3
+                    continue
+                callee_code = callee.code
+                if callee_code.ops is None:
+                    self.load(callee_code)
+                if count != callee_code.arity:
+                    raise RuntimeException(
+                        constants[ops[ip + 2]],
+                        f"Expected {callee_code.arity} arguments but got {count}.")
+                if len(frames) == FRAMES_MAX:
+                    raise RuntimeException(constants[ops[ip + 2]], "Stack overflow.")
+                frames.append((ops, constants, ip + 3, base, upvalues, height))
+                if callee.instance is None:
+                    # The callee stays below the frame until it returns
+                    base = len(stack) - count
+                    height = base - 1
+                else:
+                    # 'this' takes the callee's place, in slot 0
+                    height = base = len(stack) - count - 1
+                    stack[base] = callee.instance
+                for slot in callee_code.cells:
+                    stack[base + slot] = Cell(stack[base + slot])
+                ops = callee_code.ops
+                constants = callee_code.constants
+                upvalues = callee.upvalues
+                ip = 0
+            elif instruction == RETURN:
+                result = pop()
+                if not frames:
+                    return result
+                del stack[height:]
+                push(result)
+                ops, constants, ip, base, upvalues, height = frames.pop()
+            elif instruction == GET_PROPERTY:
+                instance = stack[-1]
+                if type(instance) is not LoxInstance:
+                    raise RuntimeException(
+                        constants[ops[ip + 2]], "Only instances have properties.")
+                fields = instance.fields
+                symbol = ops[ip + 1]
+                if symbol in fields:
+                    stack[-1] = fields[symbol]
+                else:
+                    stack[-1] = instance.get(constants[ops[ip + 2]])
+                ip += 3
+            elif instruction == GET_CELL:
+                push(stack[base + ops[ip + 1]].value)
+                ip += 2
+            elif instruction == SET_CELL:
+                stack[base + ops[ip + 1]].value = stack[-1]
+                ip += 2
+            elif instruction == GET_UPVALUE:
+                push(upvalues[ops[ip + 1]].value)
+                ip += 2
+            elif instruction == SET_UPVALUE:
+                upvalues[ops[ip + 1]].value = stack[-1]
+                ip += 2
+            elif instruction == HOISTED:
+                value = stack[base + ops[ip + 1]]
+                if value is NOT_COMPUTED:
+                    value = self.run(constants[ops[ip + 2]], base, upvalues)
+                push(value)
+                ip += 3
+            elif MULTIPLY <= instruction <= LESS_EQUAL:
+                b = pop()
+                a = stack[-1]
+                if type(a) is not float or type(b) is not float:
+                    raise RuntimeException(constants[ops[ip + 1]], "Operands must be a numbers")
+                if instruction == MULTIPLY:
+                    stack[-1] = a * b
+                elif instruction == DIVIDE:
+                    stack[-1] = a / b
+                elif instruction == GREATER:
+                    stack[-1] = a > b
+                elif instruction == GREATER_EQUAL:
+                    stack[-1] = a >= b
+                else:
+                    stack[-1] = a <= b
+                ip += 2
+            elif instruction == EQUAL:
+                b = pop()
+                a = stack[-1]
+                stack[-1] = b is None if a is None else a == b
+                ip += 1
+            elif instruction == NOT_EQUAL:
+                b = pop()
+                a = stack[-1]
+                stack[-1] = b is not None if a is None else a != b
+                ip += 1
+            elif instruction == NOT:
+                value = stack[-1]
+                stack[-1] = value is None or value is False
+                ip += 1
+            elif instruction == NEGATE:
+                value = stack[-1]
+                if type(value) is not float:
+                    raise RuntimeException(constants[ops[ip + 1]], "Operand must be a number")
+                stack[-1] = -value
+                ip += 2
+            elif instruction == NEGATE_UNCHECKED:
+                stack[-1] = -stack[-1]
+                ip += 1
+            elif instruction == JUMP_IF_FALSE_OR_POP:
+                value = stack[-1]
+                if value is None or value is False:
+                    ip = ops[ip + 1]
+                else:
+                    pop()
+                    ip += 2
+            elif instruction == JUMP_IF_TRUE_OR_POP:
+                value = stack[-1]
+                if value is None or value is False:
+                    pop()
+                    ip += 2
+                else:
+                    ip = ops[ip + 1]
+            elif instruction == SET_GLOBAL:
+                symbol = ops[ip + 1]
+                if globals_values[symbol] is UNDEFINED:
+                    self.globals.assign(constants[ops[ip + 2]], stack[-1])    # raises
+                globals_values[symbol] = stack[-1]
+                ip += 3
+            elif instruction == DEFINE_GLOBAL:
+                globals_values[ops[ip + 1]] = pop()
+                ip += 2
+            elif instruction == CHECK_INSTANCE:
+                if type(stack[-1]) is not LoxInstance:
+                    raise RuntimeException(constants[ops[ip + 1]], "Only instances have fields.")
+                ip += 2
+            elif instruction == SET_PROPERTY:
+                value = pop()
+                stack[-1].fields[ops[ip + 1]] = value
+                stack[-1] = value
+                ip += 2
+            elif instruction == GET_SUPER:
+                this = pop()
+                method = constants[ops[ip + 1]]
+                found = pop().find_method(method.symbol)
+                if found is None:
+                    raise RuntimeException(method, f"Undefined property '{method.lexeme}'.")
+                push(found.bind(this))
+                ip += 2
+            elif instruction == NIL:
+                push(None)
+                ip += 1
+            elif instruction == TRUE:
+                push(True)
+                ip += 1
+            elif instruction == FALSE:
+                push(False)
+                ip += 1
+            elif instruction == PRINT:
+                print(self.stringify(pop()))
+                ip += 1
+            elif instruction == BOX:
+                stack[-1] = Cell(stack[-1])
+                ip += 1
+            elif instruction == TRUNCATE:
+                del stack[base + ops[ip + 1]:]
+                ip += 2
+            elif instruction == CLOSURE:
+                function_code = constants[ops[ip + 1]]
+                push(VMFunction(function_code, [upvalues[slot] if depth < 0 else stack[base + slot]
+                                                for depth, slot in function_code.upvalues]))
+                ip += 2
+            elif instruction == CHECK_SUPERCLASS:
+                if not isinstance(stack[-1], LoxClass):
+                    raise RuntimeException(constants[ops[ip + 1]], "Superclass must be a class.")
+                ip += 2
+            elif instruction == CLASS:
+                name, symbols, has_superclass = constants[ops[ip + 1]]
+                start = len(stack) - len(symbols)
+                methods = dict(zip(symbols, stack[start:]))
+                del stack[start:]
+                superclass = pop().value if has_superclass else None
+                push(LoxClass(name, superclass, methods))
+                ip += 2
+            elif instruction == HOIST:
+                mark = len(stack)
+                try:
+                    value = self.run(constants[ops[ip + 1]], base, upvalues)
+                except (RuntimeException, ArithmeticError):
+                    # Raised again by the loop, if it gets that far
+                    del stack[mark:]
+                    value = NOT_COMPUTED
+                push(value)
+                ip += 2
+            else:
+                raise ValueError(f"Unknown opcode {instruction}")
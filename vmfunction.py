@@ -0,0 +1,28 @@
+"""Function compiled to bytecode"""
+
+from loxcallable import LoxCallable
+
+
+class VMFunction(LoxCallable):
+    """Runtime function of the VM: the Code of its declaration and the
+    cells of the outer locals it closed over. Methods are bound to an
+    instance, which their frame gets in slot 0 as 'this'.
+    """
+
+    def __init__(self, code, upvalues, instance=None):
+        self.code = code                # shared by every closure of the declaration
+        self.upvalues = upvalues
+        self.instance = instance
+
+    def bind(self, instance):
+        return VMFunction(self.code, self.upvalues, instance)
+
+    def to_string(self):
+        return f"<fn {self.code.name}>"
+
+    def arity(self):
+        return self.code.arity
+
+    def call(self, interpreter, arguments):
+        # The VM calls its functions itself; this is for anything else
+        return interpreter.call_function(self, arguments)